@@ -0,0 +1,1112 @@
+"""
+Benchmarks du bulletin meteo (sans acces reseau).
+Lance : python bench_meteo.py [nom_du_bench ...]
+Sans argument, tous les benchmarks sont executes ; le code de sortie vaut 1
+si bout_en_bout ou demarrage regresse par rapport a bench_reference.json
+(--reference pour l'enregistrer), ou si l'archive d'un backfill repris
+differe de celle d'un backfill d'une traite, ou si l'agregat du mode serveur
+perd des villes ou leur qualite de l'air. Serveur de rejeu seul : python bench_meteo.py --servir
+[--fixtures DOSSIER] [--latence S] [--erreurs P].
+"""
+
+import argparse
+import calendar
+import contextlib
+import csv
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import meteo
+
+try:
+    import resource
+except ImportError:  # Windows : pas de pic de memoire residente
+    resource = None
+
+
+def villes_synthetiques(n: int) -> list[dict]:
+    """Genere n villes fictives reparties sur l'Europe de l'Ouest."""
+    rnd = random.Random(42)
+    return [
+        {
+            "nom": f"Station{i:05d}",
+            "region": "Synthetique",
+            "lat": round(rnd.uniform(42.0, 51.0), 4),
+            "lon": round(rnd.uniform(-4.0, 10.0), 4),
+            "altitude_info": "~0m",
+            "timezone": "Europe/Paris",
+        }
+        for i in range(n)
+    ]
+
+
+# ── Concurrence ───────────────────────────────────────────────────────────────
+
+def bench_concurrence(n: int = 40):
+    """Compare la recuperation sequentielle et parallele avec des latences simulees."""
+    rnd = random.Random(1)
+    latences = {v["nom"]: rnd.uniform(0.05, 0.30) for v in villes_synthetiques(n)}
+
+    def fetch_simule(villes, *args):
+        time.sleep(max(latences[v["nom"]] for v in villes))
+        return [{} for _ in villes]
+
+    villes = villes_synthetiques(n)
+    original = meteo.fetch_meteo_lot
+    meteo.fetch_meteo_lot = fetch_simule
+    try:
+        t0 = time.perf_counter()
+        for v in villes:
+            meteo.fetch_meteo(v)
+        sequentiel = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        list(meteo.fetch_villes(villes, concurrence=n, taille_lot=1))
+        parallele = time.perf_counter() - t0
+    finally:
+        meteo.fetch_meteo_lot = original
+
+    print(f"  {n} villes, latence max {max(latences.values()):.2f} s, "
+          f"somme {sum(latences.values()):.2f} s")
+    print(f"  sequentiel : {sequentiel:.2f} s")
+    print(f"  parallele  : {parallele:.2f} s")
+
+
+# ── Requetes groupees ─────────────────────────────────────────────────────────
+
+def bench_lots():
+    """Nombre de requetes necessaires selon la taille de la liste de stations."""
+    for n in (3, 100, 500, 2000):
+        lots = meteo.decouper_lots(villes_synthetiques(n))
+        print(f"  {n:>5} villes -> {len(lots):>3} requete(s)")
+
+
+# ── Decodage JSON / FlatBuffers ───────────────────────────────────────────────
+
+VARIABLES_HOURLY_BENCH = [
+    "temperature_2m", "relative_humidity_2m", "apparent_temperature", "precipitation",
+    "precipitation_probability", "cloud_cover", "wind_speed_10m", "wind_gusts_10m",
+    "wind_direction_10m", "weather_code",
+]
+
+
+def payload_synthetique(i: int, jours: int = 16) -> dict:
+    """Reponse JSON fictive avec `jours` jours de donnees horaires."""
+    rnd = random.Random(i)
+    debut = calendar.timegm((2026, 10, 17, 0, 0, 0))
+    heures = [debut + h * 3600 for h in range(jours * 24)]
+    fmt = lambda ts: datetime.utcfromtimestamp(ts).strftime("%Y-%m-%dT%H:%M")
+    jours_ts = heures[::24]
+    return {
+        "latitude": 46.52, "longitude": 6.62, "elevation": 500.0,
+        "utc_offset_seconds": 0, "timezone": "GMT",
+        "current": {"time": fmt(debut), "interval": 900,
+                    **{n: (rnd.randint(1, 99) if n in meteo.VARIABLES_ENTIERES
+                           else round(rnd.uniform(0, 30), 1)) for n in meteo.VARIABLES_CURRENT}},
+        "daily": {"time": [datetime.utcfromtimestamp(t).strftime("%Y-%m-%d") for t in jours_ts],
+                  **{n: ([fmt(t + 7 * 3600) for t in jours_ts] if n in meteo.VARIABLES_HORAIRES
+                         else [rnd.randint(1, 99) if n in meteo.VARIABLES_ENTIERES
+                               else round(rnd.uniform(0, 30), 1) for _ in jours_ts])
+                     for n in meteo.VARIABLES_DAILY}},
+        "hourly": {"time": [fmt(t) for t in heures],
+                   **{n: [rnd.randint(1, 99) if n in meteo.VARIABLES_ENTIERES
+                          else round(rnd.uniform(0, 30), 1) for _ in heures]
+                      for n in VARIABLES_HOURLY_BENCH}},
+    }
+
+
+def encoder_flatbuffers(payloads: list[dict]) -> bytes:
+    """Encode des payloads JSON au format flatbuffers d'Open-Meteo."""
+    import flatbuffers
+
+    def section(b, donnees, noms, serie, decalage):
+        def iso_ts(s, fmt="%Y-%m-%dT%H:%M"):
+            return calendar.timegm(datetime.strptime(s, fmt).timetuple()) - decalage
+
+        variables = []
+        for nom in noms:
+            valeurs = donnees[nom]
+            vec = None
+            if serie and nom in meteo.VARIABLES_HORAIRES:
+                b.StartVector(8, len(valeurs), 8)
+                for v in reversed(valeurs):
+                    b.PrependInt64(iso_ts(v))
+                vec = b.EndVector()
+            elif serie:
+                b.StartVector(4, len(valeurs), 4)
+                for v in reversed(valeurs):
+                    b.PrependFloat32(float("nan") if v is None else v)
+                vec = b.EndVector()
+            b.StartObject(7)
+            if vec is None:
+                b.PrependFloat32Slot(2, donnees[nom], 0.0)
+            else:
+                b.PrependUOffsetTRelativeSlot(4 if nom in meteo.VARIABLES_HORAIRES else 3, vec, 0)
+            variables.append(b.EndObject())
+        b.StartVector(4, len(variables), 4)
+        for v in reversed(variables):
+            b.PrependUOffsetTRelative(v)
+        vec = b.EndVector()
+        temps = donnees["time"]
+        if serie:
+            fmt = "%Y-%m-%d" if len(temps[0]) == 10 else "%Y-%m-%dT%H:%M"
+            ts = [iso_ts(t, fmt) for t in temps]
+            debut, pas = ts[0], (ts[1] - ts[0] if len(ts) > 1 else 86400)
+            fin = ts[-1] + pas
+        else:
+            debut, pas = iso_ts(temps), donnees["interval"]
+            fin = debut + pas
+        b.StartObject(4)
+        b.PrependInt64Slot(0, debut, 0)
+        b.PrependInt64Slot(1, fin, 0)
+        b.PrependInt32Slot(2, pas, 0)
+        b.PrependUOffsetTRelativeSlot(3, vec, 0)
+        return b.EndObject()
+
+    morceaux = []
+    for p in payloads:
+        b = flatbuffers.Builder(1024)
+        tz = b.CreateString(p["timezone"])
+        decalage = p["utc_offset_seconds"]
+        cur = section(b, p["current"], meteo.VARIABLES_CURRENT, False, decalage)
+        daily = section(b, p["daily"], meteo.VARIABLES_DAILY, True, decalage)
+        hourly = (section(b, p["hourly"], VARIABLES_HOURLY_BENCH, True, decalage)
+                  if "hourly" in p else None)
+        b.StartObject(16)
+        b.PrependFloat32Slot(0, p["latitude"], 0.0)
+        b.PrependFloat32Slot(1, p["longitude"], 0.0)
+        b.PrependFloat32Slot(2, p["elevation"], 0.0)
+        b.PrependInt32Slot(6, p["utc_offset_seconds"], 0)
+        b.PrependUOffsetTRelativeSlot(7, tz, 0)
+        b.PrependUOffsetTRelativeSlot(9, cur, 0)
+        b.PrependUOffsetTRelativeSlot(10, daily, 0)
+        if hourly is not None:
+            b.PrependUOffsetTRelativeSlot(11, hourly, 0)
+        b.FinishSizePrefixed(b.EndObject())
+        morceaux.append(bytes(b.Output()))
+    return b"".join(morceaux)
+
+
+def _mesurer(fonction):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    resultat = fonction()
+    duree = time.perf_counter() - t0
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultat, duree, pic
+
+
+def bench_decodage(n: int = 50):
+    """Temps de decodage et pic memoire JSON vs FlatBuffers (16 jours horaires)."""
+    if not all(importlib.util.find_spec(p) for p in ("flatbuffers", "openmeteo_sdk")):
+        print("  ignore : paquets flatbuffers / openmeteo-sdk absents")
+        return
+    payloads = [payload_synthetique(i) for i in range(n)]
+    brut_json = json.dumps(payloads).encode()
+    brut_fb = encoder_flatbuffers(payloads)
+
+    def lire(resultats):
+        # Meme acces que le bulletin : valeurs courantes et premier jour
+        for r in resultats:
+            _ = [r["current"][v] for v in meteo.VARIABLES_CURRENT]
+            _ = [r["daily"][v][0] for v in meteo.VARIABLES_DAILY]
+            _ = [r["hourly"][v][0] for v in VARIABLES_HOURLY_BENCH]
+        return resultats
+
+    _, t_json, m_json = _mesurer(lambda: lire(json.loads(brut_json)))
+    _, t_fb, m_fb = _mesurer(lambda: lire(meteo.decoder_flatbuffers(
+        brut_fb, hourly=VARIABLES_HOURLY_BENCH)))
+    print(f"  {n} villes, {len(brut_json) / 1e6:.1f} Mo JSON / {len(brut_fb) / 1e6:.1f} Mo flatbuffers")
+    print(f"  json        : {t_json * 1000:7.1f} ms, pic {m_json / 1e6:6.1f} Mo")
+    print(f"  flatbuffers : {t_fb * 1000:7.1f} ms, pic {m_fb / 1e6:6.1f} Mo")
+
+
+# ── Modele de donnees ─────────────────────────────────────────────────────────
+
+def bench_modele(n: int = 500):
+    """Memoire occupee par n reponses brutes (JSON) et par leurs Prevision."""
+    brut = json.dumps([{k: v for k, v in payload_synthetique(i, jours=1).items() if k != "hourly"}
+                       for i in range(n)])
+
+    tracemalloc.start()
+    payloads = json.loads(brut)
+    m_json = tracemalloc.get_traced_memory()[0]
+    previsions = [meteo.normaliser(p) for p in payloads]
+    del payloads
+    m_prev = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    for p in previsions:
+        j = p.jour(0)
+        _ = (p.actuel.temperature_2m, j.temperature_2m_max, j.temperature_2m_min, j.uv_index_max)
+    duree = time.perf_counter() - t0
+    print(f"  {n} villes : JSON {m_json / n / 1024:.1f} Ko/ville, "
+          f"Prevision {m_prev / n / 1024:.1f} Ko/ville")
+    print(f"  acces aux champs du rendu : {duree / n * 1e6:.1f} us/ville")
+
+
+def bench_horaire(n: int = 300, jours: int = 16):
+    """Memoire des series horaires de n villes sur 16 jours et cout d'une tranche."""
+    payloads = [payload_synthetique(i, jours=jours) for i in range(n)]
+
+    tracemalloc.start()
+    previsions = [meteo.normaliser(p) for p in payloads]
+    m_prev = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del payloads
+
+    t0 = time.perf_counter()
+    for p in previsions:
+        for j in range(jours):
+            for nom in meteo.PERIODES:
+                p.periode(nom, j).colonne("temperature_2m")
+    duree = time.perf_counter() - t0
+    tranches = n * jours * len(meteo.PERIODES)
+    print(f"  {n} villes x {jours} j x 24 h : Prevision {m_prev / 1e6:.1f} Mo "
+          f"({m_prev / n / 1024:.1f} Ko/ville)")
+    print(f"  {tranches} tranches extraites : {duree / tranches * 1e6:.2f} us/tranche (sans copie)")
+
+
+# ── Archive ───────────────────────────────────────────────────────────────────
+
+def bench_archive(annees: int = 80):
+    """Ajout de `annees` annees d'observations puis requetes de l'archive mmap."""
+    rnd = random.Random(0)
+    debut = date(1946, 1, 1)
+    journees = [(debut + timedelta(days=k),
+                 {c: round(rnd.uniform(-10, 30), 1) for c in meteo.CHAMPS_ARCHIVE})
+                for k in range(annees * 365)]
+    with tempfile.TemporaryDirectory() as dossier:
+        archive = meteo.ArchiveVille(villes_synthetiques(1)[0], dossier)
+        t0 = time.perf_counter()
+        archive.ajouter(journees)
+        t_ajout = time.perf_counter() - t0
+
+        fin = journees[-1][0]
+        t0 = time.perf_counter()
+        for _ in range(100):
+            archive.meme_jour(fin, annees=annees - 1)
+        t_meme = (time.perf_counter() - t0) / 100
+        t0 = time.perf_counter()
+        for _ in range(100):
+            archive.extremes(fin, 30)
+        t_ext = (time.perf_counter() - t0) / 100
+        taille = os.path.getsize(archive.donnees) + os.path.getsize(archive.index)
+
+    print(f"  {len(journees)} journees ajoutees en {t_ajout * 1000:.0f} ms, {taille / 1e6:.1f} Mo sur disque")
+    print(f"  meme jour sur {annees - 1} ans : {t_meme * 1000:.2f} ms")
+    print(f"  min/max des 30 derniers jours : {t_ext * 1000:.2f} ms")
+
+
+# ── Metriques derivees ────────────────────────────────────────────────────────
+
+def bench_metriques(n: int = 200, heures: int = 384):
+    """Metriques horaires de n stations : fonctions scalaires vs moteur NumPy."""
+    np = meteo._numpy()
+    if np is None:
+        print("  ignore : NumPy absent")
+        return
+    rnd = np.random.default_rng(0)
+    temp = np.round(rnd.uniform(-25, 40, (n, heures)), 1)
+    hum = rnd.integers(1, 101, (n, heures)).astype(float)
+    vent = np.round(rnd.uniform(0, 140, (n, heures)), 1)
+    direc = rnd.integers(0, 361, (n, heures)).astype(float)
+
+    t0 = time.perf_counter()
+    scalaire = [
+        (meteo.point_de_rosee(t, h), meteo.beaufort(v), meteo.direction_vent(d))
+        for t, h, v, d in zip(temp.ravel().tolist(), hum.ravel().tolist(),
+                              vent.ravel().tolist(), direc.ravel().tolist())
+    ]
+    t_scalaire = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    rosee = meteo.point_de_rosee_v(temp, hum)
+    forces = meteo.beaufort_v(vent)
+    secteurs = meteo.direction_vent_v(direc)
+    t_vect = time.perf_counter() - t0
+
+    vect = zip(rosee.ravel().tolist(),
+               (meteo.LIBELLES_BEAUFORT[f] for f in forces.ravel()),
+               (meteo.DIRECTIONS_VENT[d] for d in secteurs.ravel()))
+    identiques = all(a == b for a, b in zip(scalaire, vect))
+    print(f"  {n} stations x {heures} h = {temp.size} valeurs")
+    print(f"  scalaire  : {t_scalaire * 1000:7.1f} ms")
+    print(f"  vectorise : {t_vect * 1000:7.1f} ms  (resultats identiques : {identiques})")
+    if not identiques:
+        print("  REGRESSION moteur NumPy et fonctions scalaires divergent")
+        return False
+    return True
+
+
+def bench_regles(n: int = 20000):
+    """Moteur de recommandation : evaluation element par element vs vectorisee."""
+    np = meteo._numpy()
+    if np is None:
+        print("  ignore : NumPy absent")
+        return
+    rnd = np.random.default_rng(0)
+    cols = {
+        "t_min": np.round(rnd.uniform(-20, 25, n), 1), "t_max": np.round(rnd.uniform(-5, 38, n), 1),
+        "precip_prob": rnd.integers(0, 101, n).astype(float),
+        "pluie": np.round(rnd.uniform(0, 8, n), 1), "neige": np.round(rnd.uniform(-6, 8, n).clip(0), 1),
+        "vent_max": np.round(rnd.uniform(0, 60, n), 1), "rafales": np.round(rnd.uniform(0, 110, n), 1),
+        "uv": np.round(rnd.uniform(0, 10, n), 2), "ecart": np.round(rnd.uniform(0, 15, n), 1),
+        "proba_jour": rnd.integers(0, 101, n).astype(float),
+        "proba_soir": rnd.integers(0, 101, n).astype(float),
+    }
+    moteur = meteo.MOTEUR_RECOMMANDATION
+
+    t0 = time.perf_counter()
+    scalaire = moteur.classer({v: c.tolist() for v, c in cols.items()}, n)
+    t_scalaire = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    vect = moteur.classer(cols, n)
+    t_vect = time.perf_counter() - t0
+    identiques = all(list(a) == b.tolist() for a, b in zip(scalaire, vect))
+
+    t0 = time.perf_counter()
+    moteur.textes(cols, n)
+    t_textes = time.perf_counter() - t0
+    print(f"  {n} jeux de conditions, {sum(len(g) for g in moteur.groupes)} regles")
+    print(f"  classement scalaire  : {t_scalaire * 1000:7.1f} ms")
+    print(f"  classement vectorise : {t_vect * 1000:7.1f} ms  (resultats identiques : {identiques})")
+    print(f"  + assemblage des textes : {t_textes * 1000:7.1f} ms")
+    if not identiques:
+        print("  REGRESSION classements scalaire et vectorise differents")
+        return False
+    return True
+
+
+# ── Ecriture en flux ──────────────────────────────────────────────────────────
+
+def _flux_synthetique(n: int):
+    villes = villes_synthetiques(n)
+    for i, v in enumerate(villes):
+        p = payload_synthetique(i, jours=1)
+        del p["hourly"]
+        yield v, p
+
+
+def bench_flux():
+    """Pic memoire du rendu en flux vers un fichier selon le nombre de villes."""
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, "bulletin.txt")
+        for n in (100, 1000, 5000):
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            with meteo.EcritureAtomique(chemin) as f:
+                for morceau in meteo.generer_bulletin(_flux_synthetique(n)):
+                    f.write(morceau)
+            duree = time.perf_counter() - t0
+            pic = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            taille = os.path.getsize(chemin)
+            print(f"  {n:>5} villes : {duree:6.2f} s, fichier {taille / 1e6:6.1f} Mo, "
+                  f"pic memoire {pic / 1e6:5.2f} Mo")
+
+
+# ── Rendu incremental ─────────────────────────────────────────────────────────
+
+def bench_incremental(n: int = 2000, modifiees: int = 2):
+    """Rendu complet puis re-rendu quand seules quelques villes ont change."""
+    donnees = [(v, meteo.normaliser(p)) for v, p in _flux_synthetique(n)]
+    rendus = meteo.CacheRendu()
+
+    t0 = time.perf_counter()
+    "".join(meteo.generer_bulletin(donnees, rendus=rendus))
+    complet = time.perf_counter() - t0
+
+    for k in range(0, n, n // modifiees):
+        p = payload_synthetique(k, jours=1)
+        del p["hourly"]
+        p["current"]["temperature_2m"] += 1
+        donnees[k] = (donnees[k][0], meteo.normaliser(p))
+    t0 = time.perf_counter()
+    "".join(meteo.generer_bulletin(donnees, rendus=rendus))
+    partiel = time.perf_counter() - t0
+
+    print(f"  {n} villes : rendu complet {complet * 1000:.0f} ms, "
+          f"apres {modifiees} modification(s) {partiel * 1000:.0f} ms "
+          f"({rendus.succes} rendus reutilises)")
+
+
+# ── Rendu reparti ─────────────────────────────────────────────────────────────
+
+def bench_reparti(n: int = 4000, regions: int = 40):
+    """Debit du rendu d'un seul bulletin vs bulletins par region sur 1..N processus."""
+    donnees = [(v, meteo.normaliser(p)) for v, p in _flux_synthetique(n)]
+    for k, (v, _) in enumerate(donnees):
+        v["region"] = f"Region{k % regions:02d}"
+    with tempfile.TemporaryDirectory() as dossier:
+        t0 = time.perf_counter()
+        with meteo.EcritureAtomique(os.path.join(dossier, "bulletin.txt")) as f:
+            for morceau in meteo.generer_bulletin(donnees):
+                f.write(morceau)
+        reference = time.perf_counter() - t0
+        print(f"  un seul bulletin      : {n / reference:7.0f} villes/s")
+        coeurs = os.cpu_count() or 1
+        for processus in sorted({1, 2, 4, coeurs}):
+            t0 = time.perf_counter()
+            with meteo.EcritureAtomique(os.path.join(dossier, "bulletin.txt")) as f:
+                for morceau in meteo.generer_reparti(donnees, processus, dossier=dossier):
+                    f.write(morceau)
+            duree = time.perf_counter() - t0
+            print(f"  {processus:>2} processus          : {n / duree:7.0f} villes/s "
+                  f"(x{reference / duree:.1f}, {coeurs} coeur(s))")
+
+
+# ── Alertes ───────────────────────────────────────────────────────────────────
+
+def bench_alertes(n: int = 10000):
+    """Comparaison de n villes a leurs instantanes : premier passage puis sans changement."""
+    donnees = [(v, meteo.normaliser(p)) for v, p in _flux_synthetique(n)]
+    with tempfile.TemporaryDirectory() as dossier:
+        instantanes = meteo.Instantanes(os.path.join(dossier, "instantanes.json"))
+        for passage in ("premier passage", "sans changement"):
+            suivi = meteo.SuiviChangements(instantanes)
+            t0 = time.perf_counter()
+            for ville, prev in donnees:
+                suivi.observer(ville, prev)
+            observation = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            evenements = suivi.evaluer()
+            evaluation = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            instantanes.sauver()
+            sauvegarde = time.perf_counter() - t0
+            print(f"  {passage} : observation {observation * 1000:.0f} ms, evaluation "
+                  f"{evaluation * 1000:.0f} ms, sauvegarde {sauvegarde * 1000:.0f} ms, "
+                  f"{len(evenements)} evenement(s)")
+
+
+# Lever et coucher de reference (PyEphem, refraction standard, bord superieur),
+# a la minute UTC pres : (lat, lon, jour, lever, coucher)
+EPHEMERIDES_REFERENCE = [
+    (48.8566, 2.3522, "2024-06-21", "2024-06-21T03:47", "2024-06-21T19:58"),      # Paris
+    (46.5197, 6.6323, "2024-12-21", "2024-12-21T07:15", "2024-12-21T15:49"),      # Lausanne
+    (-33.8688, 151.2093, "2024-03-20", "2024-03-19T19:58", "2024-03-20T08:06"),   # Sydney
+    (-0.1807, -78.4678, "2024-09-22", "2024-09-22T11:03", "2024-09-22T23:10"),    # Quito
+    (64.1466, -21.9426, "2024-06-01", "2024-06-01T03:22", "2024-06-01T23:32"),    # Reykjavik
+    (-54.8019, -68.3030, "2024-07-15", "2024-07-15T12:47", "2024-07-15T20:32"),   # Ushuaia
+]
+
+
+def bench_astronomie(n: int = 10000, jours: int = 16):
+    """Soleil et Lune de n villes sur 16 jours : ville par ville, puis en un calcul NumPy."""
+    rnd = random.Random(0)
+    lats = [rnd.uniform(-60, 70) for _ in range(n)]
+    lons = [rnd.uniform(-180, 180) for _ in range(n)]
+    debut = calendar.timegm(date.today().timetuple())
+    dates = [debut + j * 86400 for j in range(jours)]
+
+    t0 = time.perf_counter()
+    scalaire = [meteo.ephemerides(lat, lon, dates) for lat, lon in zip(lats, lons)]
+    t_scalaire = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    vecteur = meteo.ephemerides_v([[v] for v in lats], [[v] for v in lons], dates)
+    t_vecteur = time.perf_counter() - t0
+
+    ecart = max(abs(a - b) for cle in ("sunrise", "sunset") for i, s in enumerate(scalaire)
+                for a, b in zip(s[cle], vecteur[cle][i].tolist()) if a == a)
+    print(f"  {n} villes x {jours} jours : scalaire {t_scalaire * 1000:.0f} ms, "
+          f"NumPy {t_vecteur * 1000:.0f} ms (x{t_scalaire / t_vecteur:.0f}), "
+          f"ecart max {ecart:.0f} s")
+
+    utc = lambda iso: calendar.timegm(datetime.fromisoformat(iso).timetuple())
+    erreurs = []
+    for lat, lon, jour, lever, coucher in EPHEMERIDES_REFERENCE:
+        e = meteo.ephemerides(lat, lon, [utc(jour)])
+        erreurs += [abs(e["sunrise"][0] - utc(lever)), abs(e["sunset"][0] - utc(coucher))]
+    hors_limite = sum(1 for x in erreurs if not x <= 60)
+    print(f"  {len(erreurs)} levers/couchers de reference : ecart max {max(erreurs):.0f} s")
+    if ecart > 0 or hors_limite:
+        print(f"  REGRESSION ecart scalaire/NumPy {ecart:.0f} s, "
+              f"{hors_limite} reference(s) a plus d'une minute")
+        return False
+    return True
+
+
+# ── Instrumentation ───────────────────────────────────────────────────────────
+
+def bench_instrumentation(n: int = 1000, appels: int = 1_000_000):
+    """Cout des mesures desactivees puis activees (etape vide et rendu complet)."""
+    mesures = meteo.Mesures()
+    resultats = {}
+    for actif in (False, True):
+        mesures.actif = actif
+        t0 = time.perf_counter()
+        for _ in range(appels):
+            with mesures.etape("vide"):
+                pass
+        resultats[actif] = (time.perf_counter() - t0) / appels
+
+    donnees = [(v, meteo.normaliser(p)) for v, p in _flux_synthetique(n)]
+    original = meteo.MESURES
+    durees = {}
+    try:
+        for actif in (False, True, False):
+            meteo.MESURES = meteo.Mesures()
+            meteo.MESURES.actif = actif
+            t0 = time.perf_counter()
+            meteo.construire_bulletin(donnees)
+            durees[actif] = time.perf_counter() - t0
+    finally:
+        meteo.MESURES = original
+    print(f"  etape vide : {resultats[False] * 1e9:.0f} ns desactivee, {resultats[True] * 1e9:.0f} ns activee")
+    print(f"  rendu de {n} villes : {durees[False] * 1000:.0f} ms sans mesures, "
+          f"{durees[True] * 1000:.0f} ms avec")
+
+
+def bench_registre(n: int = 50000, requetes: int = 1000):
+    """Chargement d'un registre CSV de n villes puis recherches par nom, region et proximite."""
+    villes = villes_synthetiques(n)
+    for i, v in enumerate(villes):
+        v["region"] = f"Region{i % 100:02d}, France"
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, "villes.csv")
+        with open(chemin, "w", newline="", encoding="utf-8") as f:
+            ecrivain = csv.DictWriter(f, fieldnames=list(villes[0]))
+            ecrivain.writeheader()
+            ecrivain.writerows(villes)
+        registre = meteo.RegistreVilles(chemin)
+        t0 = time.perf_counter()
+        len(registre)
+        chargement = time.perf_counter() - t0
+
+        rnd = random.Random(7)
+        t0 = time.perf_counter()
+        for _ in range(requetes):
+            registre.par_nom(f"Station{rnd.randrange(n):05d}")
+        par_nom = (time.perf_counter() - t0) / requetes
+        t0 = time.perf_counter()
+        for _ in range(requetes):
+            registre.par_region(f"region{rnd.randrange(100):02d}")
+        par_region = (time.perf_counter() - t0) / requetes
+        t0 = time.perf_counter()
+        for _ in range(requetes):
+            registre.plus_proches(rnd.uniform(42.0, 51.0), rnd.uniform(-4.0, 10.0), 5)
+        proches = (time.perf_counter() - t0) / requetes
+    print(f"  chargement de {n} villes : {chargement * 1000:.0f} ms")
+    print(f"  par nom : {par_nom * 1e6:.1f} us, par region : {par_region * 1e6:.0f} us, "
+          f"5 plus proches : {proches * 1e6:.0f} us (premiers appels compris)")
+
+
+# ── Serveur de rejeu ──────────────────────────────────────────────────────────
+
+def reponse_synthetique(lat: float, lon: float, requete: dict) -> dict:
+    """Reponse fictive d'Open-Meteo pour un point, avec les variables demandees."""
+    rnd = random.Random(f"{lat},{lon}")
+    valeur = lambda nom: rnd.randint(1, 99) if nom in meteo.VARIABLES_ENTIERES else round(rnd.uniform(0, 30), 1)
+    fmt = lambda ts: datetime.utcfromtimestamp(ts).strftime("%Y-%m-%dT%H:%M")
+    debut = calendar.timegm(date.today().timetuple())
+    jours = [debut + j * 86400 for j in range(int(requete.get("forecast_days", 7)))]
+    heures = [debut + h * 3600 for h in range(len(jours) * 24)]
+    noms = lambda section: [n for n in requete.get(section, "").split(",") if n]
+    reponse = {
+        "latitude": lat, "longitude": lon, "elevation": round(rnd.uniform(0, 2000)),
+        "utc_offset_seconds": 0, "timezone": "GMT",
+        "current": {"time": fmt(debut + 12 * 3600), "interval": 900,
+                    **{n: valeur(n) for n in noms("current")}},
+        "daily": {"time": [datetime.utcfromtimestamp(t).strftime("%Y-%m-%d") for t in jours],
+                  **{n: ([fmt(t + (7 if n == "sunrise" else 19) * 3600) for t in jours]
+                         if n in meteo.VARIABLES_HORAIRES else [valeur(n) for _ in jours])
+                     for n in noms("daily")}},
+    }
+    if noms("hourly"):
+        reponse["hourly"] = {"time": [fmt(t) for t in heures],
+                             **{n: [valeur(n) for _ in heures] for n in noms("hourly")}}
+    return reponse
+
+
+def reponse_archive_synthetique(lat: float, lon: float, requete: dict) -> dict:
+    """Reponse fictive de l'API archive : chaque jour ne depend que du point et de la date,
+    quelle que soit la tranche demandee."""
+    jour = date.fromisoformat(requete["start_date"])
+    fin = date.fromisoformat(requete["end_date"])
+    noms = [n for n in requete.get("daily", "").split(",") if n]
+    daily = {"time": [], **{n: [] for n in noms}}
+    while jour <= fin:
+        rnd = random.Random(f"{lat},{lon},{jour.toordinal()}")
+        daily["time"].append(jour.isoformat())
+        for n in noms:
+            daily[n].append(rnd.randint(0, 359) if n in meteo.VARIABLES_ENTIERES else round(rnd.uniform(-10, 30), 1))
+        jour += timedelta(days=1)
+    return {"latitude": lat, "longitude": lon, "utc_offset_seconds": 0, "timezone": "GMT", "daily": daily}
+
+
+def reponse_qualite_air_synthetique(lat: float, lon: float, requete: dict) -> dict:
+    """Reponse fictive de l'API de qualite de l'air pour un point (valeurs courantes)."""
+    rnd = random.Random(f"air,{lat},{lon}")
+    debut = calendar.timegm(date.today().timetuple())
+    noms = [n for n in requete.get("current", "").split(",") if n]
+    return {"latitude": lat, "longitude": lon, "utc_offset_seconds": 0, "timezone": "GMT",
+            "current": {"time": datetime.utcfromtimestamp(debut + 12 * 3600).strftime("%Y-%m-%dT%H:%M"),
+                        "interval": 3600,
+                        **{n: rnd.randint(1, 100) if n == "european_aqi" else round(rnd.uniform(0, 80), 1)
+                           for n in noms}}}
+
+
+def _servir(fixtures: str | None, latence: float, erreurs: float, port: int, pret):
+    """Boucle du serveur de rejeu (processus fils de ServeurRejeu)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qsl, urlsplit
+
+    enregistrees = meteo.lire_fixtures(fixtures) if fixtures else {}
+    rnd = random.Random()
+
+    class Gestionnaire(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _repondre(self, statut: int, type_contenu: str, corps: bytes):
+            self.send_response(statut)
+            self.send_header("Content-Type", type_contenu)
+            self.send_header("Content-Length", str(len(corps)))
+            self.end_headers()
+            # Client arrete en cours de reponse (bench backfill)
+            with contextlib.suppress(BrokenPipeError, ConnectionResetError):
+                self.wfile.write(corps)
+
+        def do_GET(self):
+            if latence:
+                time.sleep(latence * rnd.uniform(0.5, 1.5))
+            if rnd.random() < erreurs:
+                self._repondre(503, "text/plain", b"erreur injectee")
+                return
+            fixture = enregistrees.get(meteo.cle_fixture(self.path))
+            if fixture is not None:
+                self._repondre(*fixture)
+                return
+            morceaux = urlsplit(self.path)
+            requete = dict(parse_qsl(morceaux.query))
+            if morceaux.path.endswith("/archive") and "start_date" in requete:
+                corps = json.dumps(reponse_archive_synthetique(
+                    float(requete["latitude"]), float(requete["longitude"]), requete)).encode()
+                self._repondre(200, "application/json", corps)
+                return
+            synthetique = {"/forecast": reponse_synthetique,
+                           "/air-quality": reponse_qualite_air_synthetique}.get(morceaux.path[morceaux.path.rfind("/"):])
+            if synthetique is None or "latitude" not in requete:
+                self._repondre(404, "text/plain", b"aucune fixture pour cette requete")
+                return
+            points = [synthetique(float(lat), float(lon), requete)
+                      for lat, lon in zip(requete["latitude"].split(","), requete["longitude"].split(","))]
+            corps = json.dumps(points[0] if len(points) == 1 else points).encode()
+            self._repondre(200, "application/json", corps)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", port), Gestionnaire)
+    httpd.daemon_threads = True
+    pret.put(httpd.server_address[1])
+    with contextlib.suppress(KeyboardInterrupt):
+        httpd.serve_forever()
+
+
+class ServeurRejeu:
+    """Remplace Open-Meteo en local, dans un processus a part.
+
+    Sert les fixtures d'un dossier (meteo.py --enregistrer) ; une requete de
+    prevision, de qualite de l'air (mode serveur) ou d'archive (backfill)
+    sans fixture recoit une reponse synthetique. Chaque reponse est
+    retardee de `latence` secondes (+/- 50 %) et une proportion `erreurs`
+    des requetes recoit un 503. Le serveur tourne hors du processus mesure.
+    """
+
+    def __init__(self, fixtures: str | None = None, latence: float = 0.0, erreurs: float = 0.0,
+                 port: int = 0):
+        self.fixtures = fixtures
+        self.latence = latence
+        self.erreurs = erreurs
+        self.port = port
+
+    def __enter__(self):
+        pret = multiprocessing.Queue()
+        self._processus = multiprocessing.Process(
+            target=_servir, args=(self.fixtures, self.latence, self.erreurs, self.port, pret), daemon=True)
+        self._processus.start()
+        self.url = f"http://127.0.0.1:{pret.get(timeout=30)}"
+        return self
+
+    def __exit__(self, *exc):
+        self._processus.terminate()
+        self._processus.join()
+        return False
+
+
+# ── Coalescence entre processus ───────────────────────────────────────────────
+
+def _client_coalescence(url: str, dossier: str, n: int, coordonne: bool) -> tuple[float, int, int]:
+    """Un consommateur (cron, serveur...) qui recupere les memes n villes que les autres."""
+    meteo.API_URL = url
+    meteo.CACHE = meteo.CacheDisque(os.path.join(dossier, "cache"))
+    meteo.VOLS = meteo.VolsEnCours(os.path.join(dossier, "vols")) if coordonne else None
+    meteo.LIMITE_API = None
+    meteo.INDEX_GRILLE = meteo.IndexGrille(os.path.join(dossier, f"mailles{os.getpid()}.index"))
+    meteo.MESURES = meteo.Mesures()
+    meteo.MESURES.actif = True
+    t0 = time.perf_counter()
+    list(meteo.fetch_villes(villes_synthetiques(n)))
+    compteurs = meteo.MESURES.compteurs
+    demandees = n - compteurs.get("cache_succes", 0) - compteurs.get("requetes_partagees", 0)
+    return time.perf_counter() - t0, compteurs.get("requetes_http", 0), demandees
+
+
+def bench_coalescence(consommateurs: int = 4, n: int = 300, latence: float = 0.3):
+    """Processus qui demandent les memes villes en meme temps, sans puis avec VolsEnCours."""
+    with ServeurRejeu(latence=latence) as serveur:
+        for coordonne in (False, True):
+            with tempfile.TemporaryDirectory() as dossier, ProcessPoolExecutor(consommateurs) as pool:
+                futs = [pool.submit(_client_coalescence, serveur.url + "/v1/forecast", dossier, n, coordonne)
+                        for _ in range(consommateurs)]
+                resultats = [f.result() for f in futs]
+            print(f"  {'avec' if coordonne else 'sans'} coordination : "
+                  f"{sum(r[1] for r in resultats)} requete(s) vers l'API, {sum(r[2] for r in resultats)} "
+                  f"villes demandees pour {consommateurs} x {n}, "
+                  f"{max(r[0] for r in resultats):.2f} s au plus")
+
+
+# ── Backfill avec reprise ─────────────────────────────────────────────────────
+
+def _backfill(url: str, dossier: str, villes: list[dict], debut: date, fin: date) -> dict:
+    meteo.LIMITE_API = None
+    return meteo.backfill(villes, debut, fin, url, dossier, concurrence=4, debit=500.0)
+
+
+def _octets_archive(archive: meteo.ArchiveVille, debut: date, fin: date) -> bytes:
+    """Enregistrements bruts de debut a fin dans l'ordre des jours (l'ordre d'ajout,
+    lui, depend de l'arrivee des tranches)."""
+    taille = archive.ENREGISTREMENT.size
+    with open(archive.index, "rb") as f:
+        idx = f.read()
+    with open(archive.donnees, "rb") as f:
+        dat = f.read()
+    n0, n = archive.numero(debut), (fin - debut).days + 1
+    rangs = [int.from_bytes(idx[k * 4:k * 4 + 4], "little", signed=True) if k * 4 < len(idx) else 0
+             for k in range(n0, n0 + n)]
+    return b"".join(dat[(r - 1) * taille:r * taille] if r else b"\0" * taille for r in rangs)
+
+
+def bench_backfill(n: int = 10, annees: int = 6, latence: float = 0.05) -> bool:
+    """Backfill contre le serveur de rejeu : interrompu puis repris, compare octet par
+    octet a un backfill d'une traite."""
+    villes = villes_synthetiques(n)
+    fin = date(2020, 12, 31)
+    debut = fin.replace(year=fin.year - annees + 1, month=1, day=1)
+    with ServeurRejeu(latence=latence) as serveur, tempfile.TemporaryDirectory() as dossier:
+        url = serveur.url + "/v1/archive"
+        complet, repris = os.path.join(dossier, "complet"), os.path.join(dossier, "repris")
+        t0 = time.perf_counter()
+        bilan = _backfill(url, complet, villes, debut, fin)
+        duree = time.perf_counter() - t0
+        print(f"  d'une traite : {bilan['tranches']} tranches, {bilan['journees']} journees "
+              f"en {duree:.2f} s")
+
+        # Arret brutal (SIGTERM) du processus une fois une partie des tranches archivees
+        enfant = multiprocessing.Process(target=_backfill, args=(url, repris, villes, debut, fin), daemon=True)
+        enfant.start()
+        limite = time.monotonic() + 60
+        while time.monotonic() < limite and enfant.is_alive():
+            faites = 0
+            with contextlib.suppress(OSError):
+                faites = sum(1 for e in os.scandir(repris) if e.name.endswith(".reprise"))
+            if faites >= n // 2:
+                break
+            time.sleep(0.01)
+        enfant.terminate()
+        enfant.join()
+        t0 = time.perf_counter()
+        bilan = _backfill(url, repris, villes, debut, fin)
+        duree = time.perf_counter() - t0
+        print(f"  reprise : {bilan['sautees']} tranche(s) sautee(s), {bilan['tranches']} telechargee(s) "
+              f"en {duree:.2f} s")
+
+        differentes = [v["nom"] for v in villes
+                       if _octets_archive(meteo.ArchiveVille(v, complet), debut, fin)
+                       != _octets_archive(meteo.ArchiveVille(v, repris), debut, fin)]
+    if differentes or bilan["echecs"] or not bilan["sautees"]:
+        print(f"  ECHEC : {len(differentes)} archive(s) differente(s), {bilan['echecs']} echec(s), "
+              f"{bilan['sautees']} tranche(s) reprise(s)")
+        return False
+    print(f"  archives identiques octet par octet ({n} villes, {annees} ans)")
+    return True
+
+
+# ── Serveur d'agregation ──────────────────────────────────────────────────────
+
+def _agregat(n: int, url: str, dossier: str) -> tuple[float, float, list]:
+    """Deux rafraichissements de l'agregat du mode serveur, dans un processus neuf."""
+    meteo.API_URL = url + "/v1/forecast"
+    meteo.API_QUALITE_AIR_URL = url + "/v1/air-quality"
+    meteo.CACHE = None
+    meteo.LIMITE_API = None
+    meteo.INDEX_GRILLE = meteo.IndexGrille(os.path.join(dossier, f"mailles{n}.index"))
+    agregat = meteo.Agregat(villes_synthetiques(n))
+    t0 = time.perf_counter()
+    agregat.actualiser()
+    premier = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    agregat.actualiser()
+    return premier, time.perf_counter() - t0, json.loads(agregat.corps)["villes"]
+
+
+def bench_serveur(n: int = 300, latence: float = 0.02) -> bool:
+    """Agregat du mode serveur (prevision et qualite de l'air) contre le serveur de rejeu."""
+    with ServeurRejeu(latence=latence) as serveur, tempfile.TemporaryDirectory() as dossier, \
+            ProcessPoolExecutor(1) as pool:
+        premier, suivant, villes = pool.submit(_agregat, n, serveur.url, dossier).result()
+    sans_air = sum(1 for v in villes if not (v["airQuality"] or {}).get("current"))
+    en_erreur = sum(1 for v in villes if "erreur" in v)
+    print(f"  {n} villes : construction {premier:.2f} s, rafraichissement avant echeance "
+          f"{suivant * 1000:.2f} ms")
+    if len(villes) != n or sans_air or en_erreur:
+        print(f"  REGRESSION {len(villes)} ville(s) servie(s) sur {n}, {sans_air} sans qualite de l'air, "
+              f"{en_erreur} en erreur")
+        return False
+    print("  prevision et qualite de l'air presentes pour toutes les villes")
+    return True
+
+
+# ── Bout en bout ──────────────────────────────────────────────────────────────
+
+FICHIER_REFERENCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_reference.json")
+
+# Ecart tolere avant de signaler une regression ; sous le plancher, c'est du bruit
+TOLERANCE_TEMPS = 0.25
+TOLERANCE_MEMOIRE = 0.10
+PLANCHER_TEMPS = 0.01
+
+# Positionne par --reference : les resultats remplacent la reference
+ECRIRE_REFERENCE = False
+
+
+def _bout_en_bout(n: int, url: str, dossier: str) -> dict:
+    """Chaine complete pour n villes, dans un processus neuf (pic memoire isole).
+
+    Un premier passage en flux, comme executer(), donne le pic de memoire
+    residente ; le second, etape par etape, les durees de recuperation,
+    normalisation, rendu et ecriture.
+    """
+    villes = villes_synthetiques(n)
+    chemin = os.path.join(dossier, f"bulletin{n}.txt")
+    meteo.API_URL = url
+    meteo.CACHE = None
+    meteo.LIMITE_API = None
+    meteo.INDEX_GRILLE = meteo.IndexGrille(os.path.join(dossier, f"mailles{n}.index"))
+    mesures = {}
+
+    with meteo.EcritureAtomique(chemin) as f:
+        for morceau in meteo.generer_bulletin(meteo.villes_avec_repli(meteo.fetch_villes(villes)), villes):
+            f.write(morceau)
+    if resource is not None:
+        # ru_maxrss : kilo-octets sous Linux, octets sous macOS
+        mesures["memoire"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (
+            1 if sys.platform == "darwin" else 1024)
+
+    t0 = time.perf_counter()
+    brutes = list(meteo.fetch_villes(villes))
+    mesures["fetch"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    previsions = list(meteo.villes_avec_repli(brutes))
+    mesures["parse"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    morceaux = list(meteo.generer_bulletin(previsions))
+    mesures["rendu"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    with meteo.EcritureAtomique(chemin) as f:
+        f.writelines(morceaux)
+    mesures["ecriture"] = time.perf_counter() - t0
+    return mesures
+
+
+def _regressions(resultats: dict, reference: dict) -> list[str]:
+    regressions = []
+    for n, mesures in resultats.items():
+        for etape, valeur in mesures.items():
+            ancienne = reference.get(n, {}).get(etape)
+            if ancienne is None:
+                continue
+            if etape == "memoire":
+                depasse = valeur > ancienne * (1 + TOLERANCE_MEMOIRE)
+            else:
+                depasse = valeur > max(ancienne * (1 + TOLERANCE_TEMPS), ancienne + PLANCHER_TEMPS)
+            if depasse:
+                regressions.append(f"{n} villes, {etape} : {valeur:.4g} contre {ancienne:.4g}")
+    return regressions
+
+
+def bench_bout_en_bout(tailles: tuple[int, ...] = (3, 100, 1000, 10000), latence: float = 0.02) -> bool:
+    """Chaine complete contre le serveur de rejeu, de 3 a 10 000 villes, comparee a la reference."""
+    resultats = {}
+    with ServeurRejeu(latence=latence) as serveur, tempfile.TemporaryDirectory() as dossier:
+        print(f"  {'villes':>6} {'fetch':>9} {'parse':>9} {'rendu':>9} {'ecriture':>9} {'pic RSS':>10}")
+        for n in tailles:
+            with ProcessPoolExecutor(1) as pool:
+                m = pool.submit(_bout_en_bout, n, serveur.url + "/v1/forecast", dossier).result()
+            resultats[str(n)] = m
+            memoire = f"{m['memoire'] / 1e6:7.1f} Mo" if "memoire" in m else f"{'--':>10}"
+            print(f"  {n:>6} {m['fetch']:8.3f}s {m['parse']:8.3f}s {m['rendu']:8.3f}s "
+                  f"{m['ecriture']:8.3f}s {memoire}")
+    return _comparer_reference("bout_en_bout", resultats)
+
+
+def _comparer_reference(nom: str, resultats: dict) -> bool:
+    """Compare (ou enregistre, avec --reference) les resultats du bench `nom`."""
+    try:
+        with open(FICHIER_REFERENCE, encoding="utf-8") as f:
+            references = json.load(f)
+    except FileNotFoundError:
+        references = {}
+    if ECRIRE_REFERENCE:
+        references[nom] = resultats
+        with meteo.EcritureAtomique(FICHIER_REFERENCE) as f:
+            json.dump(references, f, indent=2)
+        print(f"  reference enregistree dans {FICHIER_REFERENCE}")
+        return True
+    if nom not in references:
+        print("  pas de reference : relancer avec --reference pour l'enregistrer")
+        return True
+    regressions = _regressions(resultats, references[nom])
+    for r in regressions:
+        print(f"  REGRESSION {r}")
+    return not regressions
+
+
+# Modules qu'un bulletin servi par le cache ne doit jamais charger
+MODULES_DIFFERES = ("requests", "urllib3", "http.server", "subprocess", "multiprocessing",
+                    "concurrent.futures")
+
+# Plafond absolu de `import meteo` (s), en plus de la comparaison a la reference
+BUDGET_IMPORT = 0.15
+
+# Execute dans un interpreteur neuf : import de meteo chronometre, puis
+# bulletin complet depuis le cache prepare par bench_demarrage
+_DEMARRAGE = """
+import contextlib, io, json, os, sys, time
+t0 = time.perf_counter()
+import meteo
+t_import = time.perf_counter() - t0
+dossier = sys.argv[1]
+meteo.CACHE = meteo.CacheDisque(os.path.join(dossier, "cache"))
+meteo.INDEX_GRILLE = meteo.IndexGrille(os.path.join(dossier, "mailles.index"))
+meteo.INSTANTANES = meteo.Instantanes(os.path.join(dossier, "instantanes.json"))
+meteo.FICHIER_ALERTES = os.path.join(dossier, "alertes.jsonl")
+meteo.FICHIER_SORTIE = os.path.join(dossier, "bulletin.txt")
+meteo.DOSSIER_ARCHIVE = os.path.join(dossier, "archive")
+meteo.VOLS = meteo.VolsEnCours(os.path.join(dossier, "vols"))
+meteo.LIMITE_API = None
+t0 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    code = meteo.main(["--registre", os.path.join(dossier, "villes.json"), "--headless"])
+print(json.dumps({"import": t_import, "bulletin": time.perf_counter() - t0, "code": code,
+                  "charges": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def bench_demarrage(n: int = 20, essais: int = 7) -> bool:
+    """Demarrage a froid : import de meteo et bulletin servi par le cache, sans pile HTTP."""
+    import subprocess
+    villes = villes_synthetiques(n)
+    with tempfile.TemporaryDirectory() as dossier:
+        with open(os.path.join(dossier, "villes.json"), "w", encoding="utf-8") as f:
+            json.dump(villes, f)
+        cache = meteo.CacheDisque(os.path.join(dossier, "cache"))
+        os.makedirs(cache.dossier)
+        for i, v in enumerate(villes):
+            cache.ecrire(meteo.CacheDisque.cle(v), {**payload_synthetique(i, jours=meteo.JOURS_PREVISION),
+                                                    "latitude": v["lat"], "longitude": v["lon"]})
+        mesures = []
+        for _ in range(essais):
+            sortie = subprocess.run([sys.executable, "-c", _DEMARRAGE, dossier, *MODULES_DIFFERES],
+                                    cwd=os.path.dirname(os.path.abspath(meteo.__file__)),
+                                    capture_output=True, text=True, check=True).stdout
+            mesures.append(json.loads(sortie.splitlines()[-1]))
+
+    # Le meilleur essai : le bruit de la machine ne fait qu'allonger les durees
+    resultats = {str(n): {etape: min(m[etape] for m in mesures) for etape in ("import", "bulletin")}}
+    m = resultats[str(n)]
+    charges = sorted({c for m in mesures for c in m["charges"]})
+    print(f"  import meteo : {m['import'] * 1000:.0f} ms (budget {BUDGET_IMPORT * 1000:.0f} ms), "
+          f"bulletin de {n} villes depuis le cache : {m['bulletin'] * 1000:.0f} ms")
+    print(f"  modules differes charges : {', '.join(charges) or 'aucun'}")
+    ok = not charges and all(m["code"] == 0 for m in mesures)
+    if m["import"] > BUDGET_IMPORT:
+        print("  REGRESSION import au-dela du budget")
+        ok = False
+    return _comparer_reference("demarrage", resultats) and ok
+
+
+BENCHS = {
+    "concurrence": bench_concurrence,
+    "lots": bench_lots,
+    "decodage": bench_decodage,
+    "modele": bench_modele,
+    "horaire": bench_horaire,
+    "archive": bench_archive,
+    "metriques": bench_metriques,
+    "regles": bench_regles,
+    "flux": bench_flux,
+    "incremental": bench_incremental,
+    "reparti": bench_reparti,
+    "alertes": bench_alertes,
+    "astronomie": bench_astronomie,
+    "instrumentation": bench_instrumentation,
+    "registre": bench_registre,
+    "coalescence": bench_coalescence,
+    "backfill": bench_backfill,
+    "serveur": bench_serveur,
+    "bout_en_bout": bench_bout_en_bout,
+    "demarrage": bench_demarrage,
+}
+
+
+def main(argv: list[str]) -> int:
+    global ECRIRE_REFERENCE
+    parser = argparse.ArgumentParser(description="Benchmarks du bulletin meteo (sans acces reseau).")
+    parser.add_argument("noms", nargs="*", metavar="BENCH", help=f"parmi : {', '.join(BENCHS)}")
+    parser.add_argument("--reference", action="store_true",
+                        help="enregistrer les resultats de bout_en_bout et demarrage comme reference")
+    parser.add_argument("--servir", action="store_true",
+                        help="lancer seulement le serveur de rejeu, jusqu'a Ctrl+C")
+    parser.add_argument("--fixtures", metavar="DOSSIER", help="fixtures servies (meteo.py --enregistrer)")
+    parser.add_argument("--port", type=int, default=8766, help="port du serveur de rejeu")
+    parser.add_argument("--latence", type=float, default=0.0, help="latence ajoutee par reponse (s)")
+    parser.add_argument("--erreurs", type=float, default=0.0, help="proportion de reponses 503")
+    args = parser.parse_args(argv)
+    inconnus = [nom for nom in args.noms if nom not in BENCHS]
+    if inconnus:
+        parser.error(f"benchmark inconnu : {', '.join(inconnus)}")
+
+    if args.servir:
+        with ServeurRejeu(args.fixtures, args.latence, args.erreurs, args.port) as serveur:
+            print(f"Serveur de rejeu sur {serveur.url} (meteo.py --api-url {serveur.url}/v1/forecast)")
+            with contextlib.suppress(KeyboardInterrupt):
+                serveur._processus.join()
+        return 0
+
+    ECRIRE_REFERENCE = args.reference
+    echecs = []
+    for nom in args.noms or BENCHS:
+        print(f"[{nom}]")
+        if BENCHS[nom]() is False:
+            echecs.append(nom)
+        print()
+    if echecs:
+        print(f"Regression(s) dans : {', '.join(echecs)}")
+    return 1 if echecs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
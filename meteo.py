@@ -1,78 +1,1674 @@
 """
-Bulletin meteo automatique : Lausanne, Chatel (Haute-Savoie), Paris.
+Bulletin meteo automatique : Lausanne, Chatel (Haute-Savoie), Paris
+(villes.json, ou tout registre JSON/CSV passe a --registre).
 Utilise l'API Open-Meteo (gratuite, sans cle API).
 Lance le script a tout moment : python meteo.py
 Le fichier meteo_bulletin.txt sera genere/ecrase a chaque execution.
+En continu : python meteo.py --daemon --headless
+Dashboard servi localement : python meteo.py --serveur
+Depuis cron : python -m meteo --headless (bytecode en cache, sans navigateur)
 """
 
-import requests
-from datetime import datetime, timezone
+from array import array
+from collections import OrderedDict, deque
+from collections.abc import Iterable, Iterator
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import parse_qsl, urlsplit
+import bisect
+import argparse
+import base64
+import contextlib
+import csv
+import gzip
+import hashlib
+import heapq
+import json
 import math
+import mmap
+import operator
 import os
-import subprocess
+import random
+import signal
+import string
+import struct
 import sys
+import tempfile
+import threading
+import time
+import unicodedata
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrous limites au processus
+    fcntl = None
 
 # ── Configuration des villes ──────────────────────────────────────────────────
 
-VILLES = [
-    {
-        "nom": "Lausanne",
-        "region": "Suisse, canton de Vaud",
-        "lat": 46.5197,
-        "lon": 6.6323,
-        "altitude_info": "~500m",
-        "timezone": "Europe/Zurich",
-    },
-    {
-        "nom": "Chatel",
-        "region": "Haute-Savoie, France",
-        "lat": 46.2667,
-        "lon": 6.8417,
-        "altitude_info": "~1200m (village), ~2200m (sommet pistes)",
-        "timezone": "Europe/Paris",
-    },
-    {
-        "nom": "Paris",
-        "region": "Ile-de-France",
-        "lat": 48.8566,
-        "lon": 2.3522,
-        "altitude_info": "~35m",
-        "timezone": "Europe/Paris",
-    },
-]
+# Registre par defaut : villes.json a cote du script (JSON ou CSV, option --registre)
+FICHIER_VILLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "villes.json")
+
+# Colonnes attendues ; seules nom, lat et lon sont obligatoires
+CHAMPS_VILLE = ["nom", "region", "lat", "lon", "altitude_info", "timezone", "libelle"]
+
+
+def _cle_texte(texte: str) -> str:
+    """Forme de recherche : sans accents ni casse ("Châtel" == "chatel")."""
+    if texte.isascii():
+        return texte.casefold().strip()
+    decompose = unicodedata.normalize("NFKD", texte)
+    return "".join(c for c in decompose if not unicodedata.combining(c)).casefold().strip()
+
+
+def _lire_villes(chemin: str) -> list[dict]:
+    with open(chemin, encoding="utf-8", newline="") as f:
+        if chemin.lower().endswith(".csv"):
+            lignes = list(csv.DictReader(f))
+        else:
+            lignes = json.load(f)
+    villes = []
+    for n, ligne in enumerate(lignes, 1):
+        try:
+            ville = {c: ligne[c] for c in CHAMPS_VILLE if ligne.get(c) not in (None, "")}
+            ville["lat"], ville["lon"] = float(ville["lat"]), float(ville["lon"])
+            if "nom" not in ville:
+                raise KeyError("nom")
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"{chemin}, entree {n} : ville invalide ({e})") from None
+        ville.setdefault("region", "")
+        ville.setdefault("altitude_info", "")
+        ville.setdefault("timezone", "auto")
+        villes.append(ville)
+    return villes
+
+
+def _distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 12742.0 * math.asin(math.sqrt(min(1.0, a)))
+
+
+class RegistreVilles:
+    """Villes disponibles, chargees a la premiere utilisation (JSON ou CSV).
+
+    Chaque index est construit a sa premiere recherche : par nom, par region
+    (une region "Haute-Savoie, France" repond aussi a "France"), et une grille
+    de cellules d'un degre pour chercher les villes les plus proches d'un
+    point. Choisir les villes d'un bulletin ne parcourt donc pas toute la liste.
+    """
+
+    def __init__(self, chemin: str = FICHIER_VILLES):
+        self.chemin = chemin
+        self._villes = None
+        self._index = {}
+        self._verrou = threading.Lock()
+
+    def _charger(self) -> list[dict]:
+        with self._verrou:
+            if self._villes is None:
+                self._villes = _lire_villes(self.chemin)
+        return self._villes
+
+    def _indexer(self, nom: str) -> dict:
+        villes = self._charger()
+        with self._verrou:
+            if nom in self._index:
+                return self._index[nom]
+            index = {}
+            if nom == "nom":
+                for k, v in enumerate(villes):
+                    index.setdefault(_cle_texte(v["nom"]), []).append(k)
+            elif nom == "region":
+                cles_regions = {}  # peu de regions distinctes : decoupees une seule fois
+                for k, v in enumerate(villes):
+                    region = v["region"]
+                    if region not in cles_regions:
+                        parties = {region, *region.split(",")} if region else set()
+                        cles_regions[region] = {_cle_texte(p) for p in parties}
+                    for partie in cles_regions[region]:
+                        index.setdefault(partie, []).append(k)
+            else:
+                for k, v in enumerate(villes):
+                    index.setdefault((math.floor(v["lat"]), math.floor(v["lon"])), []).append(k)
+            self._index[nom] = index
+            return index
+
+    def __len__(self) -> int:
+        return len(self._charger())
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self._charger())
+
+    def par_nom(self, nom: str) -> list[dict]:
+        return [self._villes[k] for k in self._indexer("nom").get(_cle_texte(nom), ())]
+
+    def par_region(self, region: str) -> list[dict]:
+        return [self._villes[k] for k in self._indexer("region").get(_cle_texte(region), ())]
+
+    def plus_proches(self, lat: float, lon: float, nombre: int = 1) -> list[tuple[float, dict]]:
+        """Les `nombre` villes les plus proches de (lat, lon) : [(distance_km, ville)].
+
+        Parcourt la grille en anneaux autour de la cellule du point et
+        s'arrete des que l'anneau suivant ne peut plus rien contenir de
+        plus proche que les villes deja retenues.
+        """
+        grille = self._indexer("grille")
+        villes = self._villes
+        nombre = min(nombre, len(villes))
+        c_lat, c_lon = math.floor(lat), math.floor(lon)
+        meilleures = []  # tas (-distance, k) des `nombre` plus proches
+        vues, parcourues = 0, set()
+        rayon = 0
+        while vues < len(villes) and rayon <= 360:
+            if len(meilleures) == nombre:
+                # Distance minimale d'une cellule de l'anneau (1 deg de latitude = 111 km)
+                borne = (rayon - 1) * 111.2 * math.cos(math.radians(min(89.9, abs(lat) + rayon)))
+                if borne > -meilleures[0][0]:
+                    break
+            for d_lat in range(-rayon, rayon + 1):
+                for d_lon in range(-rayon, rayon + 1):
+                    if max(abs(d_lat), abs(d_lon)) != rayon:
+                        continue
+                    cellule = (c_lat + d_lat, (c_lon + d_lon + 180) % 360 - 180)
+                    if cellule in parcourues:
+                        continue
+                    parcourues.add(cellule)
+                    for k in grille.get(cellule, ()):
+                        vues += 1
+                        d = _distance_km(lat, lon, villes[k]["lat"], villes[k]["lon"])
+                        if len(meilleures) < nombre:
+                            heapq.heappush(meilleures, (-d, k))
+                        elif d < -meilleures[0][0]:
+                            heapq.heapreplace(meilleures, (-d, k))
+            rayon += 1
+        return [(-d, villes[k]) for d, k in sorted(meilleures, reverse=True)]
+
+    def selectionner(self, noms: Iterable[str] = (), regions: Iterable[str] = (),
+                     autour: tuple[float, float, int] | None = None) -> list[dict]:
+        """Villes d'un bulletin : toutes sans critere, sinon l'union des criteres (sans doublon)."""
+        noms, regions = list(noms), list(regions)
+        if not noms and not regions and autour is None:
+            return list(self)
+        choisies = {}
+        for nom in noms:
+            trouvees = self.par_nom(nom)
+            if not trouvees:
+                raise ValueError(f"ville inconnue : {nom}")
+            choisies.update((id(v), v) for v in trouvees)
+        for region in regions:
+            trouvees = self.par_region(region)
+            if not trouvees:
+                raise ValueError(f"region inconnue : {region}")
+            choisies.update((id(v), v) for v in trouvees)
+        if autour is not None:
+            lat, lon, nombre = autour
+            choisies.update((id(v), v) for _, v in self.plus_proches(lat, lon, nombre))
+        return list(choisies.values())
+
+
+REGISTRE = RegistreVilles()
 
 FICHIER_SORTIE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "meteo_bulletin.txt")
 
 # ── Appel API ─────────────────────────────────────────────────────────────────
 
-def fetch_meteo(ville: dict) -> dict:
-    """Recupere les donnees meteo via Open-Meteo."""
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": ville["lat"],
-        "longitude": ville["lon"],
-        "current": ",".join([
-            "temperature_2m", "relative_humidity_2m", "apparent_temperature",
-            "precipitation", "rain", "snowfall", "cloud_cover",
-            "wind_speed_10m", "wind_direction_10m", "wind_gusts_10m",
-            "surface_pressure", "weather_code",
-        ]),
-        "daily": ",".join([
-            "temperature_2m_max", "temperature_2m_min",
-            "apparent_temperature_max", "apparent_temperature_min",
-            "precipitation_sum", "precipitation_probability_max",
-            "rain_sum", "snowfall_sum",
-            "wind_speed_10m_max", "wind_gusts_10m_max",
-            "wind_direction_10m_dominant",
-            "sunrise", "sunset",
-            "uv_index_max",
-        ]),
-        "timezone": ville["timezone"],
-        "forecast_days": 1,
+API_URL = "https://api.open-meteo.com/v1/forecast"
+
+VARIABLES_CURRENT = [
+    "temperature_2m", "relative_humidity_2m", "apparent_temperature",
+    "precipitation", "rain", "snowfall", "cloud_cover",
+    "wind_speed_10m", "wind_direction_10m", "wind_gusts_10m",
+    "surface_pressure", "weather_code",
+]
+
+VARIABLES_DAILY = [
+    "temperature_2m_max", "temperature_2m_min",
+    "apparent_temperature_max", "apparent_temperature_min",
+    "precipitation_sum", "precipitation_probability_max",
+    "rain_sum", "snowfall_sum",
+    "wind_speed_10m_max", "wind_gusts_10m_max",
+    "wind_direction_10m_dominant",
+    "uv_index_max",
+]
+
+# Variables journalieres calculees localement (voir Astronomie), pas demandees
+VARIABLES_ASTRONOMIE = ["sunrise", "sunset", "daylight_duration", "moon_phase", "moon_illumination"]
+
+# Series horaires : tranches matin / apres-midi / soir du bulletin
+VARIABLES_HOURLY = [
+    "temperature_2m", "apparent_temperature", "precipitation_probability",
+    "precipitation", "weather_code", "wind_speed_10m", "wind_gusts_10m", "cloud_cover",
+]
+
+# Jours demandes (1 a 16, option --jours) ; au-dela d'un, le bulletin
+# ajoute la tendance des jours suivants
+JOURS_PREVISION = 1
+JOURS_PREVISION_MAX = 16
+
+# Nombre de requetes simultanees, timeout par requete et delai global (secondes)
+CONCURRENCE_MAX = 8
+TIMEOUT_REQUETE = 15
+DELAI_GLOBAL = 60
+
+# Limites d'une requete groupee (plusieurs coordonnees separees par des virgules)
+LOT_MAX_VILLES = 100
+LOT_MAX_URL = 8000
+
+_session = None
+_session_verrou = threading.Lock()
+
+
+def session_http():
+    """Session partagee : les connexions keep-alive sont reutilisees entre villes.
+
+    requests n'est importe qu'ici, a la premiere requete : un bulletin servi
+    par le cache ne charge jamais la pile HTTP (urllib3, ssl, email...).
+    """
+    global _session
+    with _session_verrou:
+        if _session is None:
+            import requests
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=CONCURRENCE_MAX)
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+    return _session
+
+
+def _session_apres_fork():
+    # Un processus fils ne doit pas reutiliser les sockets keep-alive du pere :
+    # les deux liraient les reponses l'un de l'autre
+    global _session, _session_verrou
+    _session, _session_verrou = None, threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_session_apres_fork)
+
+
+def _params_meteo(villes: list[dict]) -> dict:
+    return {
+        "latitude": ",".join(str(v["lat"]) for v in villes),
+        "longitude": ",".join(str(v["lon"]) for v in villes),
+        "current": ",".join(VARIABLES_CURRENT),
+        "daily": ",".join(VARIABLES_DAILY),
+        "hourly": ",".join(VARIABLES_HOURLY),
+        "timezone": ",".join(v["timezone"] for v in villes),
+        "forecast_days": JOURS_PREVISION,
     }
-    resp = requests.get(url, params=params, timeout=15)
+
+
+def decouper_lots(villes: list[dict], max_villes: int = LOT_MAX_VILLES,
+                  max_url: int = LOT_MAX_URL) -> list[list[dict]]:
+    """Regroupe les villes en lots respectant le nombre de points et la longueur d'URL."""
+    base = len(API_URL) + len(",".join(VARIABLES_CURRENT)) + len(",".join(VARIABLES_DAILY)) + 80
+    lots, lot, taille = [], [], base
+    for v in villes:
+        # lat + lon + timezone, separateurs encodes (%2C) compris
+        cout = len(str(v["lat"])) + len(str(v["lon"])) + len(v["timezone"]) * 2 + 9
+        if lot and (len(lot) >= max_villes or taille + cout > max_url):
+            lots.append(lot)
+            lot, taille = [], base
+        lot.append(v)
+        taille += cout
+    if lot:
+        lots.append(lot)
+    return lots
+
+
+# ── Instrumentation ───────────────────────────────────────────────────────────
+
+class _Etape:
+    __slots__ = ("mesures", "nom", "detail", "debut")
+
+    def __init__(self, mesures: "Mesures", nom: str, detail: str | None):
+        self.mesures, self.nom, self.detail = mesures, nom, detail
+
+    def __enter__(self):
+        self.debut = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.mesures.enregistrer(self.nom, self.debut, time.perf_counter() - self.debut, self.detail)
+        return False
+
+
+_ETAPE_NULLE = contextlib.nullcontext()
+
+
+class Mesures:
+    """Durees par etape et compteurs d'une execution (options --profile, --trace...).
+
+    Desactive, `etape()` renvoie un contexte vide partage et `compter()`
+    retourne immediatement : le cout se limite a un test d'attribut. Active,
+    chaque etape est gardee (dans la limite de `max_etapes`) pour la trace, et
+    cumulee par nom pour l'export Prometheus.
+    """
+
+    def __init__(self, max_etapes: int = 100_000):
+        self.actif = False
+        self.fichier_trace = None
+        self.fichier_prometheus = None
+        self.compteurs: dict[str, float] = {}
+        self._cumuls: dict[str, list] = {}
+        self._etapes = deque(maxlen=max_etapes)
+        self._origine = time.perf_counter()
+        self._verrou = threading.Lock()
+
+    def activer(self, trace: str | None = None, prometheus: str | None = None):
+        self.actif = True
+        self.fichier_trace = trace
+        self.fichier_prometheus = prometheus
+
+    def etape(self, nom: str, detail: str | None = None):
+        if not self.actif:
+            return _ETAPE_NULLE
+        return _Etape(self, nom, detail)
+
+    def enregistrer(self, nom: str, debut: float, duree: float, detail: str | None = None):
+        """Ajoute une etape deja mesuree (debut en time.perf_counter())."""
+        if not self.actif:
+            return
+        with self._verrou:
+            self._etapes.append((nom, detail, debut, duree, threading.get_ident()))
+            cumul = self._cumuls.setdefault(nom, [0, 0.0, 0.0])
+            cumul[0] += 1
+            cumul[1] += duree
+            cumul[2] = max(cumul[2], duree)
+
+    def compter(self, nom: str, n: float = 1):
+        if not self.actif:
+            return
+        with self._verrou:
+            self.compteurs[nom] = self.compteurs.get(nom, 0) + n
+
+    def resume(self, n: int = 10) -> list[str]:
+        """Cumul par etape puis les `n` etapes les plus lentes, pour --profile."""
+        with self._verrou:
+            cumuls = sorted(self._cumuls.items(), key=lambda c: c[1][1], reverse=True)
+            lentes = heapq.nlargest(n, self._etapes, key=lambda e: e[3])
+            compteurs = sorted(self.compteurs.items())
+        lignes = [f"  {'Etape':<18} {'appels':>7} {'total':>10} {'max':>10}"]
+        for nom, (appels, total, maxi) in cumuls:
+            lignes.append(f"  {nom:<18} {appels:>7} {total * 1000:>8.1f}ms {maxi * 1000:>8.1f}ms")
+        lignes += ["", f"  {len(lentes)} etape(s) les plus lentes :"]
+        for nom, detail, _, duree, _ in lentes:
+            lignes.append(f"  {duree * 1000:>9.1f}ms  {nom:<18} {detail or ''}")
+        if compteurs:
+            lignes += ["", "  " + ", ".join(f"{nom} {valeur:g}" for nom, valeur in compteurs)]
+        return lignes
+
+    def exporter_trace(self, chemin: str):
+        """Trace JSON au format Trace Event (chrome://tracing, Perfetto)."""
+        with self._verrou:
+            evenements = [
+                {"name": nom, "cat": "meteo", "ph": "X", "pid": os.getpid(), "tid": tid,
+                 "ts": round((debut - self._origine) * 1e6, 1), "dur": round(duree * 1e6, 1),
+                 **({"args": {"detail": detail}} if detail else {})}
+                for nom, detail, debut, duree, tid in self._etapes
+            ]
+            compteurs = dict(self.compteurs)
+        with EcritureAtomique(chemin) as f:
+            json.dump({"traceEvents": evenements, "displayTimeUnit": "ms",
+                       "otherData": {"compteurs": compteurs}}, f)
+
+    def exporter_prometheus(self, chemin: str):
+        """Fichier texte Prometheus (collecteur textfile de node_exporter...)."""
+        with self._verrou:
+            cumuls = sorted(self._cumuls.items())
+            compteurs = sorted(self.compteurs.items())
+        lignes = [
+            "# HELP meteo_etape_secondes_total Temps cumule passe dans chaque etape.",
+            "# TYPE meteo_etape_secondes_total counter",
+            *(f'meteo_etape_secondes_total{{etape="{nom}"}} {c[1]:.6f}' for nom, c in cumuls),
+            "# HELP meteo_etape_appels_total Nombre d'executions de chaque etape.",
+            "# TYPE meteo_etape_appels_total counter",
+            *(f'meteo_etape_appels_total{{etape="{nom}"}} {c[0]}' for nom, c in cumuls),
+        ]
+        for nom, valeur in compteurs:
+            lignes += [f"# TYPE meteo_{nom}_total counter", f"meteo_{nom}_total {valeur:g}"]
+        lignes += ["# TYPE meteo_derniere_execution_timestamp_seconds gauge",
+                   f"meteo_derniere_execution_timestamp_seconds {time.time():.0f}"]
+        with EcritureAtomique(chemin) as f:
+            f.write("\n".join(lignes) + "\n")
+
+    def exporter(self):
+        """Ecrit les fichiers demandes a l'activation."""
+        if self.fichier_trace:
+            self.exporter_trace(self.fichier_trace)
+        if self.fichier_prometheus:
+            self.exporter_prometheus(self.fichier_prometheus)
+
+
+MESURES = Mesures()
+
+
+# ── Robustesse reseau ─────────────────────────────────────────────────────────
+
+# Nouvelles tentatives sur erreur transitoire (connexion, timeout, 429, 5xx),
+# avec attente exponentielle aleatoire ("full jitter")
+ESSAIS_MAX = 3
+ATTENTE_BASE = 0.5
+ATTENTE_MAX = 8.0
+
+# Requete dupliquee si la premiere depasse ce centile des latences recentes
+CENTILE_COUVERTURE = 95
+COUVERTURE_DEFAUT = 2.0
+COUVERTURE_MIN = 0.2
+
+# Disjoncteur par hote : ouvert apres N echecs consecutifs, pendant N secondes
+SEUIL_DISJONCTEUR = 5
+DUREE_DISJONCTEUR = 30.0
+
+
+class ErreurDisjoncteur(RuntimeError):
+    """L'hote a trop echoue recemment ; la requete n'est pas envoyee."""
+
+
+# Positionne par --hors-ligne : aucune requete, le cache (meme perime) fait foi
+HORS_LIGNE = False
+
+
+class HorsLigne(RuntimeError):
+    """Mode hors ligne : la requete n'est pas envoyee."""
+
+
+class Disjoncteur:
+    """Coupe-circuit d'un hote : evite de s'acharner sur un service en panne.
+
+    Apres SEUIL_DISJONCTEUR echecs consecutifs, les requetes sont refusees
+    pendant DUREE_DISJONCTEUR secondes, puis une seule requete d'essai est
+    autorisee : son succes referme le circuit, son echec le rouvre.
+    """
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.echecs = 0
+        self.ouvert_jusqua = 0.0
+        self._essai_en_cours = False
+
+    def autoriser(self) -> bool:
+        with self._verrou:
+            if self.echecs < SEUIL_DISJONCTEUR:
+                return True
+            if time.monotonic() < self.ouvert_jusqua or self._essai_en_cours:
+                return False
+            self._essai_en_cours = True
+            return True
+
+    def succes(self):
+        with self._verrou:
+            self.echecs = 0
+            self._essai_en_cours = False
+
+    def echec(self):
+        with self._verrou:
+            self.echecs += 1
+            self._essai_en_cours = False
+            if self.echecs >= SEUIL_DISJONCTEUR:
+                self.ouvert_jusqua = time.monotonic() + DUREE_DISJONCTEUR
+
+
+class SuiviLatences:
+    """Fenetre glissante des latences reussies, pour fixer le seuil de couverture."""
+
+    def __init__(self, taille: int = 200):
+        self._latences = deque(maxlen=taille)
+        self._verrou = threading.Lock()
+
+    def ajouter(self, duree: float):
+        with self._verrou:
+            self._latences.append(duree)
+
+    def seuil_couverture(self) -> float:
+        with self._verrou:
+            if len(self._latences) < 20:
+                return COUVERTURE_DEFAUT
+            triees = sorted(self._latences)
+        rang = min(len(triees) - 1, int(len(triees) * CENTILE_COUVERTURE / 100))
+        return max(COUVERTURE_MIN, triees[rang])
+
+
+_disjoncteurs: dict[str, Disjoncteur] = {}
+_disjoncteurs_verrou = threading.Lock()
+LATENCES = SuiviLatences()
+_pool_couverture = None
+_pool_verrou = threading.Lock()
+
+
+def disjoncteur(url: str) -> Disjoncteur:
+    hote = urlsplit(url).netloc
+    with _disjoncteurs_verrou:
+        return _disjoncteurs.setdefault(hote, Disjoncteur())
+
+
+def _est_transitoire(e: Exception) -> bool:
+    import requests
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return False
+
+
+def _get(url: str, params: dict, timeout: float):
+    if LIMITE_API is not None:
+        LIMITE_API.attendre()
+    t0 = time.perf_counter()
+    with MESURES.etape("http", urlsplit(url).netloc):
+        resp = session_http().get(url, params=params, timeout=timeout)
+    if MESURES.actif:
+        MESURES.compter("requetes_http")
+        MESURES.compter("octets_recus", len(resp.content))
+        # Jusqu'aux en-tetes : connexion (DNS, TLS) et attente du serveur
+        MESURES.enregistrer("http_entetes", t0, resp.elapsed.total_seconds(), urlsplit(url).netloc)
     resp.raise_for_status()
-    return resp.json()
+    LATENCES.ajouter(time.perf_counter() - t0)
+    if ENREGISTREUR is not None:
+        ENREGISTREUR.enregistrer(resp)
+    return resp
+
+
+def _get_couvert(url: str, params: dict, timeout: float):
+    """GET avec couverture : un doublon part si la reponse tarde, le premier succes gagne."""
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FuturesTimeout, wait
+    global _pool_couverture
+    with _pool_verrou:
+        if _pool_couverture is None:
+            _pool_couverture = ThreadPoolExecutor(max_workers=2 * CONCURRENCE_MAX)
+    principale = _pool_couverture.submit(_get, url, params, timeout)
+    seuil = LATENCES.seuil_couverture()
+    if seuil >= timeout:
+        return principale.result()
+    try:
+        return principale.result(timeout=seuil)
+    except FuturesTimeout:
+        pass
+    MESURES.compter("couvertures")
+    en_cours = {principale, _pool_couverture.submit(_get, url, params, timeout - seuil)}
+    erreur = None
+    while en_cours:
+        termines, en_cours = wait(en_cours, return_when=FIRST_COMPLETED)
+        for fut in termines:
+            if fut.exception() is None:
+                return fut.result()
+            erreur = fut.exception()
+    raise erreur
+
+
+def requete_robuste(url: str, params: dict, timeout: float = TIMEOUT_REQUETE,
+                    echeance: float | None = None):
+    """GET avec disjoncteur, couverture et nouvelles tentatives, borne par `echeance`.
+
+    `echeance` est un instant time.monotonic() au-dela duquel on abandonne.
+    """
+    if HORS_LIGNE:
+        raise HorsLigne(f"{urlsplit(url).netloc} non interroge (mode hors ligne)")
+    coupe = disjoncteur(url)
+    for essai in range(ESSAIS_MAX):
+        restant = timeout if echeance is None else echeance - time.monotonic()
+        if restant <= 0:
+            raise TimeoutError("delai global depasse")
+        if not coupe.autoriser():
+            MESURES.compter("refus_disjoncteur")
+            raise ErreurDisjoncteur(f"{urlsplit(url).netloc} indisponible (disjoncteur ouvert)")
+        try:
+            resp = _get_couvert(url, params, min(timeout, restant))
+        except Exception as e:
+            if not _est_transitoire(e):
+                # L'hote a repondu : erreur de la requete, pas du service
+                coupe.succes()
+                raise
+            coupe.echec()
+            attente = random.uniform(0, min(ATTENTE_MAX, ATTENTE_BASE * 2 ** essai))
+            dernier = essai == ESSAIS_MAX - 1
+            if dernier or (
+                    echeance is not None and time.monotonic() + attente >= echeance):
+                raise
+            MESURES.compter("nouvelles_tentatives")
+            time.sleep(attente)
+        else:
+            coupe.succes()
+            return resp
+
+
+# ── Enregistrement des reponses ───────────────────────────────────────────────
+
+def cle_fixture(url: str) -> str:
+    """Cle d'une requete, independante de l'hote et de l'ordre des parametres."""
+    morceaux = urlsplit(url)
+    requete = sorted(parse_qsl(morceaux.query, keep_blank_values=True))
+    return hashlib.blake2b(repr((morceaux.path, requete)).encode(), digest_size=12).hexdigest()
+
+
+class Enregistreur:
+    """Copie chaque reponse HTTP reussie dans un dossier de fixtures (--enregistrer).
+
+    Une fixture par requete, `<cle>.json` : URL, statut, type et corps (texte,
+    ou base64 pour les reponses binaires comme flatbuffers). Le serveur de
+    rejeu de bench_meteo.py les sert ensuite a la place d'Open-Meteo.
+    """
+
+    def __init__(self, dossier: str):
+        self.dossier = dossier
+        self.n = 0
+        self._verrou = threading.Lock()
+
+    def enregistrer(self, resp):
+        type_contenu = resp.headers.get("Content-Type", "")
+        fixture = {"url": resp.url, "statut": resp.status_code, "type": type_contenu}
+        if "json" in type_contenu or type_contenu.startswith("text/"):
+            fixture["corps"] = resp.text
+        else:
+            fixture["corps_b64"] = base64.b64encode(resp.content).decode("ascii")
+        chemin = os.path.join(self.dossier, cle_fixture(resp.url) + ".json")
+        with EcritureAtomique(chemin, durable=False) as f:
+            json.dump(fixture, f, ensure_ascii=False)
+        with self._verrou:
+            self.n += 1
+
+
+def lire_fixtures(dossier: str) -> dict[str, tuple[int, str, bytes]]:
+    """Fixtures d'un dossier : {cle: (statut, type, corps)}."""
+    fixtures = {}
+    for nom in os.listdir(dossier):
+        if not nom.endswith(".json"):
+            continue
+        with open(os.path.join(dossier, nom), encoding="utf-8") as f:
+            fixture = json.load(f)
+        if "corps_b64" in fixture:
+            corps = base64.b64decode(fixture["corps_b64"])
+        else:
+            corps = fixture["corps"].encode("utf-8")
+        fixtures[cle_fixture(fixture["url"])] = (fixture["statut"], fixture["type"], corps)
+    return fixtures
+
+
+# Actif avec --enregistrer
+ENREGISTREUR = None
+
+
+# ── Fichiers ──────────────────────────────────────────────────────────────────
+
+class EcritureAtomique:
+    """Fichier texte ecrit dans un temporaire du meme dossier, puis renomme.
+
+    Les lecteurs voient l'ancienne version ou la nouvelle, jamais un fichier
+    tronque ; en cas d'exception le temporaire est supprime.
+    """
+
+    def __init__(self, chemin: str, durable: bool = True, tampon: int = 1 << 16):
+        self.chemin = chemin
+        self.durable = durable
+        self.tampon = tampon
+
+    def __enter__(self):
+        dossier, nom = os.path.split(os.path.abspath(self.chemin))
+        os.makedirs(dossier, exist_ok=True)
+        fd, self.tmp = tempfile.mkstemp(dir=dossier, prefix=f".{nom}.", suffix=".tmp")
+        self.f = os.fdopen(fd, "w", encoding="utf-8", buffering=self.tampon)
+        return self.f
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.f.flush()
+                if self.durable:
+                    os.fsync(self.f.fileno())
+                self.f.close()
+                try:
+                    mode = os.stat(self.chemin).st_mode & 0o777
+                except OSError:
+                    mode = 0o644
+                os.chmod(self.tmp, mode)
+                os.replace(self.tmp, self.chemin)
+                return False
+        except BaseException:
+            self._abandonner()
+            raise
+        self._abandonner()
+        return False
+
+    def _abandonner(self):
+        self.f.close()
+        with contextlib.suppress(OSError):
+            os.unlink(self.tmp)
+
+
+# ── Cache disque ──────────────────────────────────────────────────────────────
+
+DOSSIER_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_meteo")
+CACHE_MAX_ENTREES = 5000
+
+# Les modeles sont recalcules a heure fixe : une reponse reste valable jusqu'a
+# la prochaine mise a jour (plus une marge pour la publication des donnees).
+INTERVALLE_MODELE = 3600
+MARGE_PUBLICATION = 300
+
+
+def prochaine_maj(maintenant: float | None = None) -> float:
+    """Horodatage de la prochaine mise a jour du modele."""
+    maintenant = time.time() if maintenant is None else maintenant
+    prochaine = (maintenant - MARGE_PUBLICATION) // INTERVALLE_MODELE * INTERVALLE_MODELE
+    return prochaine + INTERVALLE_MODELE + MARGE_PUBLICATION
+
+
+class CacheDisque:
+    """Cache des reponses Open-Meteo, un fichier JSON par point de prevision.
+
+    Les ecritures passent par un fichier temporaire renomme atomiquement :
+    plusieurs processus peuvent lire et ecrire le meme dossier sans jamais
+    voir une entree tronquee.
+    """
+
+    def __init__(self, dossier: str = DOSSIER_CACHE, max_entrees: int = CACHE_MAX_ENTREES):
+        self.dossier = dossier
+        self.max_entrees = max_entrees
+        # Nombre d'entrees connu depuis le dernier parcours du dossier (None :
+        # pas encore compte). Les autres processus peuvent en ajouter : le
+        # compte est recale a chaque parcours, quand la limite semble franchie.
+        self._n = None
+        self._verrou = threading.Lock()
+
+    @staticmethod
+    def cle(ville: dict, requete: list | None = None) -> str:
+        """Cle d'une ville ; `requete` decrit les variables demandees (previsions par defaut)."""
+        if requete is None:
+            requete = [VARIABLES_CURRENT, VARIABLES_DAILY, VARIABLES_HOURLY, JOURS_PREVISION]
+        brut = json.dumps([ville["lat"], ville["lon"], ville["timezone"], *requete])
+        return hashlib.sha256(brut.encode()).hexdigest()[:32]
+
+    def _chemin(self, cle: str) -> str:
+        return os.path.join(self.dossier, cle + ".json")
+
+    def _entree(self, cle: str) -> dict | None:
+        try:
+            with open(self._chemin(cle), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def lire(self, cle: str) -> dict | None:
+        entree = self._entree(cle)
+        if entree is None or entree.get("expire", 0) < time.time():
+            return None
+        return entree["donnees"]
+
+    def lire_perime(self, cle: str) -> tuple[dict, float] | None:
+        """Derniere reponse connue meme expiree, avec sa date d'ecriture."""
+        entree = self._entree(cle)
+        if entree is None:
+            return None
+        ecrit = entree.get("ecrit")
+        if ecrit is None:
+            with contextlib.suppress(OSError):
+                ecrit = os.path.getmtime(self._chemin(cle))
+        return entree["donnees"], ecrit or 0.0
+
+    def ecrire(self, cle: str, donnees: dict, expire: float | None = None):
+        entree = {
+            "expire": prochaine_maj() if expire is None else expire,
+            "ecrit": time.time(),
+            "donnees": donnees,
+        }
+        chemin = self._chemin(cle)
+        nouvelle = self._n is not None and not os.path.exists(chemin)
+        with EcritureAtomique(chemin, durable=False) as f:
+            json.dump(entree, f, separators=(",", ":"), default=_json_defaut)
+        if nouvelle:
+            with self._verrou:
+                if self._n is not None:
+                    self._n += 1
+
+    def evincer(self):
+        """Supprime les entrees les plus anciennes au-dela de `max_entrees`.
+
+        Le dossier n'est parcouru que si le compte tenu par `ecrire` depasse
+        la limite (ou au premier appel) : une ecriture ne coute pas O(entrees).
+        """
+        with self._verrou:
+            if self._n is not None and self._n <= self.max_entrees:
+                return
+        try:
+            entrees = [e for e in os.scandir(self.dossier) if e.name.endswith(".json")]
+        except OSError:
+            return
+        if len(entrees) <= self.max_entrees:
+            with self._verrou:
+                self._n = len(entrees)
+            return
+        def mtime(e):
+            try:
+                return e.stat().st_mtime
+            except OSError:
+                return 0.0
+        entrees.sort(key=mtime)
+        for e in entrees[:len(entrees) - self.max_entrees]:
+            with contextlib.suppress(OSError):
+                os.unlink(e.path)
+        with self._verrou:
+            self._n = self.max_entrees
+
+
+# Mettre a None pour desactiver le cache
+CACHE = CacheDisque()
+
+
+def _json_defaut(obj):
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} non serialisable")
+
+
+# ── Coordination entre processus ──────────────────────────────────────────────
+
+# Requetes par seconde vers Open-Meteo pour tous les processus de la machine
+# (l'offre gratuite plafonne a 600 par minute), et rafale toleree
+DEBIT_API = 10.0
+RAFALE_API = 20
+
+DOSSIER_VOLS = os.path.join(DOSSIER_CACHE, "vols")
+
+
+class VerrouFichier:
+    """Verrou exclusif sur un fichier, entre threads et processus (flock).
+
+    `fd` est le descripteur du fichier (cree au besoin), utilisable sous le
+    verrou. Sans fcntl (Windows), le verrou ne vaut que dans le processus.
+    """
+
+    _locaux = {}
+    _locaux_verrou = threading.Lock()
+
+    def __init__(self, chemin: str):
+        self.chemin = chemin
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.chemin)), exist_ok=True)
+        self.fd = os.open(self.chemin, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        else:
+            with VerrouFichier._locaux_verrou:
+                self._local = VerrouFichier._locaux.setdefault(os.path.abspath(self.chemin), threading.Lock())
+            self._local.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if fcntl is None:
+            self._local.release()
+        os.close(self.fd)  # libere aussi le flock
+        return False
+
+
+class LimiteDebit:
+    """Seau a jetons : au plus `debit` requetes par seconde, par rafales de `rafale`.
+
+    Avec `chemin`, l'etat du seau (jetons restants, date) est dans ce
+    fichier, lu et mis a jour sous VerrouFichier : tous les processus qui
+    partagent le fichier consomment le meme budget.
+    """
+
+    ETAT = struct.Struct("<dd")
+
+    def __init__(self, debit: float, rafale: int = 1, chemin: str | None = None):
+        self.debit = debit
+        self.rafale = rafale
+        self.chemin = chemin
+        self._jetons = float(rafale)
+        self._dernier = time.monotonic()
+        self._verrou = threading.Lock()
+
+    def _prendre(self, jetons: float, dernier: float, maintenant: float) -> tuple[float, float]:
+        """Jetons apres un essai, et attente necessaire (0 si un jeton a ete pris)."""
+        jetons = min(self.rafale, jetons + max(0.0, maintenant - dernier) * self.debit)
+        if jetons >= 1:
+            return jetons - 1, 0.0
+        return jetons, (1 - jetons) / self.debit
+
+    def attendre(self):
+        if self.chemin is None:
+            with self._verrou:
+                while True:
+                    maintenant = time.monotonic()
+                    self._jetons, attente = self._prendre(self._jetons, self._dernier, maintenant)
+                    self._dernier = maintenant
+                    if not attente:
+                        return
+                    time.sleep(attente)
+        while True:
+            with VerrouFichier(self.chemin) as verrou:
+                # Horloge murale : seule commune a tous les processus
+                maintenant = time.time()
+                brut = os.read(verrou.fd, self.ETAT.size)
+                jetons, dernier = self.ETAT.unpack(brut) if len(brut) == self.ETAT.size else (self.rafale, maintenant)
+                jetons, attente = self._prendre(jetons, dernier, maintenant)
+                os.lseek(verrou.fd, 0, os.SEEK_SET)
+                os.write(verrou.fd, self.ETAT.pack(jetons, maintenant))
+            if not attente:
+                return
+            time.sleep(attente)
+
+
+# Budget partage de l'API (None pour ne pas limiter)
+LIMITE_API = LimiteDebit(DEBIT_API, RAFALE_API, os.path.join(DOSSIER_CACHE, "debit_api.etat"))
+
+
+class VolsEnCours:
+    """Requetes en vol sur la machine : une seule par cle, tous processus confondus.
+
+    Un appelant revendique une cle en creant `<cle>.vol` en mode exclusif
+    (O_EXCL, atomique entre processus) avant de la demander a l'API ; les
+    autres attendent que la reponse arrive dans le cache partage au lieu de
+    la redemander. Une revendication plus vieille que `peremption` secondes
+    (processus tue en cours de route) est ignoree.
+    """
+
+    def __init__(self, dossier: str = DOSSIER_VOLS, peremption: float = DELAI_GLOBAL):
+        self.dossier = dossier
+        self.peremption = peremption
+
+    def _chemin(self, cle: str) -> str:
+        return os.path.join(self.dossier, cle + ".vol")
+
+    def en_vol(self, cle: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(self._chemin(cle)) < self.peremption
+        except OSError:
+            return False
+
+    def revendiquer(self, cles: list[str]) -> tuple[list[str], list[str]]:
+        """Separe les cles en (revendiquees par nous, deja en vol ailleurs)."""
+        os.makedirs(self.dossier, exist_ok=True)
+        nous, ailleurs = [], []
+        for cle in cles:
+            for essai in range(2):
+                try:
+                    os.close(os.open(self._chemin(cle), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                    nous.append(cle)
+                    break
+                except FileExistsError:
+                    if essai == 0 and not self.en_vol(cle):
+                        with contextlib.suppress(OSError):
+                            os.unlink(self._chemin(cle))
+                        continue
+                    ailleurs.append(cle)
+                    break
+        return nous, ailleurs
+
+    def liberer(self, cles: list[str]):
+        for cle in cles:
+            with contextlib.suppress(OSError):
+                os.unlink(self._chemin(cle))
+
+
+# Mettre a None pour ne pas coordonner les requetes
+VOLS = VolsEnCours()
+
+
+# ── Transport FlatBuffers ─────────────────────────────────────────────────────
+
+# "json" (defaut) ou "flatbuffers" : le format binaire d'Open-Meteo evite de
+# construire des listes Python pour chaque serie (necessite openmeteo_sdk).
+FORMAT_TRANSPORT = "json"
+
+# Variables que l'API JSON renvoie sous forme d'entiers
+VARIABLES_ENTIERES = {
+    "relative_humidity_2m", "cloud_cover", "wind_direction_10m", "weather_code",
+    "precipitation_probability_max", "wind_direction_10m_dominant", "precipitation_probability",
+}
+
+# Variables transmises en secondes Unix (int64) plutot qu'en float32
+VARIABLES_HORAIRES = {"sunrise", "sunset"}
+
+
+def _valeur_f32(v: float, entier: bool = False):
+    """Ramene un float32 a la valeur decimale qu'aurait renvoyee l'API JSON."""
+    if v != v:  # NaN : valeur manquante
+        return None
+    v = float(f"{v:.7g}")
+    return int(v) if entier else v
+
+
+class ColonneF32:
+    """Serie float32 lue directement dans le tampon de la reponse, sans copie.
+
+    S'indexe comme la liste de l'API JSON (`daily[...][0]`) ; `valeurs` donne
+    acces au tableau type brut.
+    """
+
+    __slots__ = ("valeurs", "entier")
+
+    def __init__(self, valeurs: memoryview, entier: bool = False):
+        self.valeurs = valeurs
+        self.entier = entier
+
+    def __len__(self) -> int:
+        return len(self.valeurs)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [_valeur_f32(v, self.entier) for v in self.valeurs[i]]
+        return _valeur_f32(self.valeurs[i], self.entier)
+
+    def __iter__(self):
+        return (_valeur_f32(v, self.entier) for v in self.valeurs)
+
+    def tolist(self) -> list:
+        return list(self)
+
+
+def _iso_local(ts: int, decalage: int, date_seule: bool = False) -> str:
+    dt = datetime.fromtimestamp(ts + decalage, tz=timezone.utc)
+    return dt.strftime("%Y-%m-%d" if date_seule else "%Y-%m-%dT%H:%M")
+
+
+class AxeTemps:
+    """Axe temporel regulier ; les dates ISO ne sont formatees qu'a la lecture."""
+
+    __slots__ = ("debut", "fin", "pas", "decalage")
+
+    def __init__(self, debut: int, fin: int, pas: int, decalage: int):
+        self.debut, self.fin, self.pas, self.decalage = debut, fin, pas, decalage
+
+    def __len__(self) -> int:
+        return max(0, (self.fin - self.debut) // self.pas)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        return _iso_local(self.debut + i * self.pas, self.decalage, self.pas >= 86400)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def tolist(self) -> list:
+        return list(self)
+
+
+def _section_fb(section, noms: list[str], tampon: memoryview, decalage: int, serie: bool) -> dict:
+    debut, fin, pas = section.Time(), section.TimeEnd(), section.Interval()
+    if serie:
+        res = {"time": AxeTemps(debut, fin, pas, decalage)}
+    else:
+        res = {"time": _iso_local(debut, decalage), "interval": pas}
+    # Les variables arrivent dans l'ordre de la requete
+    for i, nom in enumerate(noms):
+        var = section.Variables(i)
+        if nom in VARIABLES_HORAIRES:
+            n = var.ValuesInt64Length()
+            res[nom] = [_iso_local(var.ValuesInt64(j), decalage) for j in range(n)]
+        elif serie:
+            # Vue directe sur le vecteur float32 du tampon (champ `values`)
+            o = var._tab.Offset(10)
+            pos, n = var._tab.Vector(o), var._tab.VectorLen(o)
+            res[nom] = ColonneF32(tampon[pos:pos + 4 * n].cast("f"), nom in VARIABLES_ENTIERES)
+        else:
+            res[nom] = _valeur_f32(var.Value(), nom in VARIABLES_ENTIERES)
+    return res
+
+
+def decoder_flatbuffers(contenu: bytes, current: list[str] = VARIABLES_CURRENT,
+                        daily: list[str] = VARIABLES_DAILY, hourly: list[str] = ()) -> list[dict]:
+    """Decode une reponse `format=flatbuffers` en payloads de meme forme que le JSON."""
+    try:
+        from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+    except ImportError as e:
+        raise RuntimeError("Le format flatbuffers necessite le paquet openmeteo-sdk") from e
+
+    tampon = memoryview(contenu)
+    resultats, pos = [], 0
+    while pos < len(contenu):
+        taille = int.from_bytes(contenu[pos:pos + 4], "little")
+        r = WeatherApiResponse.GetRootAs(contenu, pos + 4)
+        pos += 4 + taille
+        decalage = r.UtcOffsetSeconds()
+        donnees = {
+            "latitude": _valeur_f32(r.Latitude()),
+            "longitude": _valeur_f32(r.Longitude()),
+            "elevation": _valeur_f32(r.Elevation()),
+            "utc_offset_seconds": decalage,
+            "timezone": (r.Timezone() or b"").decode(),
+        }
+        if current:
+            donnees["current"] = _section_fb(r.Current(), current, tampon, decalage, serie=False)
+        if daily:
+            donnees["daily"] = _section_fb(r.Daily(), daily, tampon, decalage, serie=True)
+        if hourly:
+            donnees["hourly"] = _section_fb(r.Hourly(), hourly, tampon, decalage, serie=True)
+        resultats.append(donnees)
+    return resultats
+
+
+def _telecharger_lot(villes: list[dict], timeout: float, echeance: float | None) -> list[dict]:
+    """Une requete a l'API pour toutes les `villes`, decodee en une reponse par ville."""
+    params = _params_meteo(villes)
+    if FORMAT_TRANSPORT == "flatbuffers":
+        params["format"] = "flatbuffers"
+    detail = f"{len(villes)} ville(s) : " + ", ".join(v["nom"] for v in villes[:3])
+    with MESURES.etape("requete", detail):
+        resp = requete_robuste(API_URL, params, timeout, echeance)
+    with MESURES.etape("decodage", detail):
+        if FORMAT_TRANSPORT == "flatbuffers":
+            donnees = decoder_flatbuffers(resp.content, hourly=VARIABLES_HOURLY)
+        else:
+            donnees = resp.json()
+    if isinstance(donnees, dict):
+        donnees = [donnees]
+    if len(donnees) != len(villes):
+        raise ValueError(f"{len(donnees)} resultats recus pour {len(villes)} villes")
+    return donnees
+
+
+def _lire_cache(cles: list[str]) -> list[dict | None]:
+    resultats = [CACHE.lire(c) if CACHE else None for c in cles]
+    trouvees = sum(r is not None for r in resultats)
+    MESURES.compter("cache_succes", trouvees)
+    MESURES.compter("cache_echecs", len(cles) - trouvees)
+    return resultats
+
+
+def fetch_meteo_lot(villes: list[dict], timeout: float = TIMEOUT_REQUETE,
+                    echeance: float | None = None, en_cache: list | None = None) -> list[dict]:
+    """Recupere plusieurs villes en une seule requete.
+
+    Open-Meteo renvoie un tableau de resultats pour une liste de coordonnees ;
+    chaque element a la meme forme qu'une reponse a une seule ville. Les villes
+    deja presentes dans le cache ne sont pas redemandees, ni celles qu'un
+    autre thread ou processus est en train de demander (VOLS) : on attend
+    alors leur arrivee dans le cache, et on ne les demande soi-meme que si
+    cet appel echoue. `en_cache` evite de relire le cache deja lu (fetch_villes).
+    """
+    cles = [CacheDisque.cle(v) for v in villes]
+    resultats = list(en_cache) if en_cache is not None else _lire_cache(cles)
+    manquantes = [i for i, r in enumerate(resultats) if r is None]
+    if not manquantes:
+        return resultats
+    if HORS_LIGNE:
+        # Echec ville par ville : celles du cache restent fraiches, les autres
+        # passent au cache perime (villes_avec_repli)
+        for i in manquantes:
+            resultats[i] = HorsLigne("absente du cache (mode hors ligne)")
+        return resultats
+
+    coordonne = CACHE and VOLS is not None
+    revendiquees, ailleurs = [], []
+    if coordonne:
+        revendiquees, autres = VOLS.revendiquer([cles[i] for i in manquantes])
+        autres = set(autres)
+        ailleurs = [i for i in manquantes if cles[i] in autres]
+        manquantes = [i for i in manquantes if cles[i] not in autres]
+    try:
+        if coordonne:
+            # Reponses arrivees entre la lecture du cache et la revendication
+            for i in manquantes:
+                resultats[i] = CACHE.lire(cles[i])
+            manquantes = [i for i in manquantes if resultats[i] is None]
+        if manquantes:
+            _remplir(villes, cles, resultats, manquantes, timeout, echeance)
+    finally:
+        if revendiquees:
+            VOLS.liberer(revendiquees)
+
+    if ailleurs:
+        limite = time.monotonic() + timeout if echeance is None else echeance
+        with MESURES.etape("attente_vols", f"{len(ailleurs)} ville(s)"):
+            while True:
+                attendues = []
+                for i in ailleurs:
+                    resultats[i] = CACHE.lire(cles[i])
+                    if resultats[i] is None and VOLS.en_vol(cles[i]):
+                        attendues.append(i)
+                if not attendues or time.monotonic() >= limite:
+                    break
+                time.sleep(0.05)
+        restantes = [i for i in ailleurs if resultats[i] is None]
+        MESURES.compter("requetes_partagees", len(ailleurs) - len(restantes))
+        if restantes:
+            _remplir(villes, cles, resultats, restantes, timeout, echeance)
+    return resultats
+
+
+def _remplir(villes: list[dict], cles: list[str], resultats: list, indices: list[int],
+             timeout: float, echeance: float | None):
+    donnees = _telecharger_lot([villes[i] for i in indices], timeout, echeance)
+    with MESURES.etape("cache_ecriture", f"{len(indices)} ville(s)"):
+        for i, d in zip(indices, donnees):
+            resultats[i] = d
+            if CACHE:
+                CACHE.ecrire(cles[i], d)
+        if CACHE:
+            CACHE.evincer()
+
+
+def fetch_meteo(ville: dict, timeout: float = TIMEOUT_REQUETE) -> dict:
+    """Recupere les donnees meteo via Open-Meteo."""
+    donnees = fetch_meteo_lot([ville], timeout)[0]
+    if isinstance(donnees, Exception):
+        raise donnees
+    return donnees
+
+
+# ── Regroupement par maille du modele ─────────────────────────────────────────
+
+class IndexGrille:
+    """Index spatial des villes par maille effective du modele.
+
+    Open-Meteo indique dans chaque reponse le point de grille et l'altitude
+    reellement utilises. Deux villes qui ont deja ete resolues vers la meme
+    maille et la meme altitude recoivent des previsions identiques : une seule
+    requete suffit pour tout le groupe. Tant qu'une ville n'a pas encore ete
+    resolue, seules les coordonnees strictement identiques sont regroupees.
+    """
+
+    def __init__(self, chemin: str):
+        self.chemin = chemin
+        self._mailles = None
+        self._modifie = False
+
+    @staticmethod
+    def _coord(ville: dict) -> str:
+        return f"{ville['lat']:.4f},{ville['lon']:.4f}"
+
+    @property
+    def mailles(self) -> dict:
+        if self._mailles is None:
+            try:
+                with open(self.chemin, encoding="utf-8") as f:
+                    self._mailles = json.load(f)
+            except (OSError, ValueError):
+                self._mailles = {}
+        return self._mailles
+
+    def cle(self, ville: dict) -> tuple:
+        coord = self._coord(ville)
+        maille = self.mailles.get(coord)
+        if maille is None:
+            return ("coord", coord, ville["timezone"])
+        return ("maille", *maille, ville["timezone"])
+
+    def apprendre(self, ville: dict, donnees: dict):
+        maille = [donnees.get("latitude"), donnees.get("longitude"), donnees.get("elevation")]
+        if None in maille:
+            return
+        coord = self._coord(ville)
+        if self.mailles.get(coord) != maille:
+            self.mailles[coord] = maille
+            self._modifie = True
+
+    def regrouper(self, villes: list[dict]) -> list[list[dict]]:
+        """Groupes de villes partageant la meme maille, dans l'ordre d'apparition."""
+        groupes = {}
+        for v in villes:
+            groupes.setdefault(self.cle(v), []).append(v)
+        return list(groupes.values())
+
+    def sauver(self):
+        if not self._modifie:
+            return
+        with EcritureAtomique(self.chemin) as f:
+            json.dump(self.mailles, f)
+        self._modifie = False
+
+
+INDEX_GRILLE = IndexGrille(os.path.join(DOSSIER_CACHE, "mailles.index"))
+
+# Bilan du dernier appel a fetch_villes
+STATS_GRILLE = {"villes": 0, "points": 0}
+
+
+def _resultat_lot(fut, taille: int, echeance: float, delai: float) -> list:
+    from concurrent.futures import TimeoutError as FuturesTimeout
+    try:
+        return fut.result(timeout=max(0.0, echeance - time.monotonic()))
+    except FuturesTimeout:
+        fut.cancel()
+        return [TimeoutError(f"delai global de {delai:.0f} s depasse")] * taille
+    except Exception as e:
+        return [e] * taille
+
+
+def fetch_villes(villes: list[dict], concurrence: int = CONCURRENCE_MAX,
+                 timeout: float = TIMEOUT_REQUETE, delai: float = DELAI_GLOBAL,
+                 taille_lot: int = LOT_MAX_VILLES):
+    """Recupere toutes les villes, par lots envoyes en parallele.
+
+    Les villes tombant dans la meme maille du modele ne sont demandees qu'une
+    fois (voir IndexGrille). Produit des tuples (ville, donnees) dans l'ordre
+    de `villes`, au fur et a mesure que les reponses arrivent. En cas d'echec,
+    `donnees` est l'exception levee ; une ville qui n'a pas repondu avant le
+    delai global recoit un TimeoutError.
+    """
+    echeance = time.monotonic() + delai
+    groupes = INDEX_GRILLE.regrouper(villes)
+    representant = {id(v): g[0] for g in groupes for v in g}
+    autres_membres = {id(g[0]): g[1:] for g in groupes if len(g) > 1}
+    STATS_GRILLE.update(villes=len(villes), points=len(groupes))
+
+    lots = decouper_lots([g[0] for g in groupes], max_villes=taille_lot)
+    # Cache lu sur place : si tout y est, ni pool de threads ni pile HTTP
+    en_cache = [_lire_cache([CacheDisque.cle(v) for v in lot]) if CACHE else None for lot in lots]
+    a_demander = [n for n, r in enumerate(en_cache) if r is None or None in r]
+    # Reponses a recopier sous la cle de chaque membre du groupe : le repli
+    # hors ligne ou sur erreur (villes_avec_repli) lit la cle de la ville
+    telechargees = {n: {p for p in range(len(lots[n])) if en_cache[n] is None or en_cache[n][p] is None}
+                    for n in a_demander} if CACHE and autres_membres else {}
+    pool, futures = None, {}
+    try:
+        if HORS_LIGNE:
+            # Rien a attendre : les villes absentes du cache echouent sur place
+            for n in a_demander:
+                en_cache[n] = fetch_meteo_lot(lots[n], timeout, echeance, en_cache[n])
+        elif a_demander:
+            from concurrent.futures import ThreadPoolExecutor
+            pool = ThreadPoolExecutor(max_workers=max(1, concurrence))
+            futures = {n: pool.submit(fetch_meteo_lot, lots[n], timeout, echeance, en_cache[n])
+                       for n in a_demander}
+        position = {id(v): (n, p) for n, lot in enumerate(lots) for p, v in enumerate(lot)}
+        recus = {}
+        for ville in villes:
+            rep = representant[id(ville)]
+            n, p = position[id(rep)]
+            if n not in recus:
+                recus[n] = (_resultat_lot(futures[n], len(lots[n]), echeance, delai) if n in futures
+                            else en_cache[n])
+                for v, d in zip(lots[n], recus[n]):
+                    if not isinstance(d, Exception):
+                        INDEX_GRILLE.apprendre(v, d)
+                _copier_membres(lots[n], recus[n], telechargees.get(n, ()), autres_membres)
+            yield ville, recus[n][p]
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        INDEX_GRILLE.sauver()
+
+
+def _copier_membres(lot: list[dict], donnees: list, positions, autres_membres: dict):
+    """Ecrit la reponse telechargee d'un representant sous la cle des autres villes de sa maille."""
+    copies = [(m, d) for p, (v, d) in enumerate(zip(lot, donnees))
+              if p in positions and not isinstance(d, Exception)
+              for m in autres_membres.get(id(v), ())]
+    if not copies:
+        return
+    with MESURES.etape("cache_ecriture", f"{len(copies)} ville(s) de meme maille"):
+        for m, d in copies:
+            CACHE.ecrire(CacheDisque.cle(m), d)
+        CACHE.evincer()
+
+
+# ── Modele de donnees ─────────────────────────────────────────────────────────
+
+# Valeurs manquantes (null) lues comme 0 : cumuls, probabilites, vent max, UV
+VARIABLES_NULLES_A_ZERO = {
+    "precipitation", "rain", "snowfall",
+    "precipitation_sum", "precipitation_probability_max", "rain_sum", "snowfall_sum",
+    "wind_speed_10m_max", "wind_gusts_10m_max", "uv_index_max",
+}
+
+
+def _valeur(nom: str, v):
+    """Applique la convention de valeurs manquantes et de type d'une variable."""
+    if v is None or v != v:
+        return 0 if nom in VARIABLES_NULLES_A_ZERO else None
+    return int(v) if nom in VARIABLES_ENTIERES else v
+
+
+def _iso_vers_ts(iso: str, decalage: int) -> int:
+    return int(datetime.fromisoformat(iso).replace(tzinfo=timezone.utc).timestamp()) - decalage
+
+
+class Actuel:
+    """Conditions courantes, un attribut par variable de VARIABLES_CURRENT."""
+
+    __slots__ = ("time",) + tuple(VARIABLES_CURRENT)
+
+
+class Journee:
+    """Valeurs d'un jour, un attribut par variable de VARIABLES_DAILY et VARIABLES_ASTRONOMIE."""
+
+    __slots__ = ("time",) + tuple(VARIABLES_DAILY) + tuple(VARIABLES_ASTRONOMIE)
+
+
+class Serie:
+    """Series d'une section (daily, ...) stockees colonne par colonne.
+
+    Un seul tableau type contient l'axe de temps (secondes Unix) puis chaque
+    variable, chacune sur `n` valeurs consecutives ; NaN marque les valeurs
+    manquantes. `colonne()` renvoie une vue sans copie.
+    """
+
+    __slots__ = ("index", "n", "valeurs")
+
+    _index_partages = {}
+
+    def __init__(self, section: dict, noms: list[str], decalage: int, typecode: str = "d"):
+        cle = tuple(noms)
+        if cle not in Serie._index_partages:
+            Serie._index_partages[cle] = {nom: k for k, nom in enumerate(("time",) + cle)}
+        self.index = Serie._index_partages[cle]
+        self.n = len(section["time"])
+        self.valeurs = array(typecode)
+        for nom in self.index:
+            serie = section[nom]
+            if nom == "time":
+                self.valeurs.extend(_iso_vers_ts(v, decalage) for v in serie)
+            else:
+                self.valeurs.extend(math.nan if v is None else v for v in serie)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def colonne(self, nom: str) -> memoryview:
+        k = self.index[nom]
+        return memoryview(self.valeurs)[k * self.n:(k + 1) * self.n]
+
+
+# Tranches de la journee, en heures locales (fin exclue)
+PERIODES = {"matin": (6, 12), "apres-midi": (12, 18), "soir": (18, 24)}
+
+
+class SerieHoraire:
+    """Series a pas regulier (hourly), en float32 et colonne par colonne.
+
+    L'axe de temps n'est pas stocke : l'indice k correspond a l'instant
+    `debut + k * pas`, si bien qu'une fenetre se localise en O(1). 16 jours
+    de 8 variables tiennent en 12 Ko par ville.
+    """
+
+    __slots__ = ("index", "n", "debut", "pas", "valeurs")
+
+    def __init__(self, section: dict, noms: list[str], decalage: int):
+        temps = section["time"]
+        self.n = len(temps)
+        if isinstance(temps, AxeTemps):
+            self.debut, self.pas = temps.debut, temps.pas
+        else:
+            self.debut = _iso_vers_ts(temps[0], decalage) if self.n else 0
+            self.pas = _iso_vers_ts(temps[1], decalage) - self.debut if self.n > 1 else 3600
+        cle = tuple(noms)
+        if cle not in Serie._index_partages:
+            Serie._index_partages[cle] = {nom: k for k, nom in enumerate(cle)}
+        self.index = Serie._index_partages[cle]
+        self.valeurs = array("f")
+        for nom in noms:
+            serie = section[nom]
+            if isinstance(serie, ColonneF32):
+                # Reponse flatbuffers : copie brute du vecteur float32
+                self.valeurs.frombytes(serie.valeurs.tobytes())
+            else:
+                self.valeurs.extend(math.nan if v is None else v for v in serie)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def colonne(self, nom: str) -> memoryview:
+        k = self.index[nom]
+        return memoryview(self.valeurs)[k * self.n:(k + 1) * self.n]
+
+    def fenetre(self, debut: int, fin: int) -> "Fenetre":
+        """Valeurs des instants de [debut, fin[ (secondes Unix)."""
+        i = min(self.n, max(0, -((self.debut - debut) // self.pas)))
+        j = min(self.n, max(i, -((self.debut - fin) // self.pas)))
+        return Fenetre(self, i, j)
+
+
+class Fenetre:
+    """Tranche [i, j[ d'une SerieHoraire ; les colonnes sont des vues."""
+
+    __slots__ = ("serie", "i", "j")
+
+    def __init__(self, serie: SerieHoraire, i: int, j: int):
+        self.serie, self.i, self.j = serie, i, j
+
+    def __len__(self) -> int:
+        return self.j - self.i
+
+    def colonne(self, nom: str) -> memoryview:
+        return self.serie.colonne(nom)[self.i:self.j]
+
+    def _connues(self, nom: str) -> list[float]:
+        return [v for v in self.colonne(nom) if v == v]
+
+    def minimum(self, nom: str):
+        connues = self._connues(nom)
+        return _valeur_f32(min(connues), nom in VARIABLES_ENTIERES) if connues else None
+
+    def maximum(self, nom: str):
+        connues = self._connues(nom)
+        return _valeur_f32(max(connues), nom in VARIABLES_ENTIERES) if connues else None
+
+    def somme(self, nom: str):
+        connues = self._connues(nom)
+        return _valeur_f32(math.fsum(connues)) if connues else None
+
+
+class Prevision:
+    """Prevision d'une ville, construite une fois par reponse.
+
+    Remplace les dictionnaires JSON dans le rendu : les conditions courantes et
+    les journees sont des enregistrements a attributs fixes, et les valeurs
+    manquantes y sont deja resolues (voir VARIABLES_NULLES_A_ZERO).
+    """
+
+    __slots__ = ("latitude", "longitude", "elevation", "decalage", "actuel", "jours", "heures",
+                 "unites", "perimee", "astro", "_empreinte")
+
+    _unites_partagees = {}
+
+    def __init__(self, donnees: dict):
+        self.latitude = donnees.get("latitude")
+        self.longitude = donnees.get("longitude")
+        self.elevation = donnees.get("elevation")
+        self.decalage = donnees.get("utc_offset_seconds", 0)
+        unites = {**donnees.get("current_units", {}), **donnees.get("daily_units", {})}
+        # Les unites sont identiques d'une ville a l'autre : un seul dict partage
+        self.unites = Prevision._unites_partagees.setdefault(tuple(sorted(unites.items())), unites)
+
+        cur = donnees["current"]
+        self.actuel = Actuel()
+        self.actuel.time = cur.get("time")
+        for nom in VARIABLES_CURRENT:
+            setattr(self.actuel, nom, _valeur(nom, cur.get(nom)))
+
+        self.jours = Serie(donnees["daily"], VARIABLES_DAILY, self.decalage)
+        # Soleil et Lune : calcules sur place au premier besoin, ou pour tout
+        # un paquet de previsions (voir calculer_astronomie)
+        self.astro = None
+        horaire = donnees.get("hourly")
+        self.heures = SerieHoraire(horaire, VARIABLES_HOURLY, self.decalage) if horaire else None
+        # Horodatage (epoch) des donnees si elles viennent du cache perime
+        self.perimee = None
+        self._empreinte = None
+
+    def empreinte(self) -> bytes:
+        """Hash du contenu meteo (hors horodatage courant) : egal si rien n'a change."""
+        if self._empreinte is None:
+            h = hashlib.blake2b(digest_size=16)
+            h.update(repr([getattr(self.actuel, nom) for nom in VARIABLES_CURRENT]
+                          + [self.latitude, self.longitude]).encode())
+            h.update(self.decalage.to_bytes(8, "little", signed=True))
+            h.update(self.jours.valeurs.tobytes())
+            if self.heures is not None:
+                h.update(self.heures.debut.to_bytes(8, "little", signed=True))
+                h.update(self.heures.valeurs.tobytes())
+            self._empreinte = h.digest()
+        return self._empreinte
+
+    def minuits(self) -> list[int]:
+        """Minuit UTC de chaque date locale de la prevision, en secondes Unix."""
+        return [int(t) + self.decalage for t in self.jours.colonne("time")]
+
+    def astronomie(self) -> dict[str, list[float]]:
+        """Variables de VARIABLES_ASTRONOMIE par jour (voir ephemerides)."""
+        if self.astro is None:
+            self.astro = ephemerides(self.latitude, self.longitude, self.minuits())
+        return self.astro
+
+    def jour(self, i: int = 0, astronomie: bool = False) -> Journee:
+        """Valeurs du jour i ; Soleil et Lune seulement avec `astronomie`."""
+        jours = self.jours
+        j = Journee()
+        valeurs = [(nom, jours.valeurs[k * jours.n + i]) for nom, k in jours.index.items()]
+        if astronomie:
+            valeurs += [(nom, serie[i]) for nom, serie in self.astronomie().items()]
+        for nom, v in valeurs:
+            if nom == "time":
+                j.time = _iso_local(int(v), self.decalage, date_seule=True)
+            elif nom in VARIABLES_HORAIRES:
+                setattr(j, nom, None if v != v else _iso_local(int(v), self.decalage))
+            else:
+                setattr(j, nom, _valeur(nom, v))
+        return j
+
+    def periode(self, nom: str, i: int = 0) -> Fenetre | None:
+        """Heures d'une tranche de PERIODES pour le jour i (None sans donnees horaires)."""
+        if self.heures is None:
+            return None
+        minuit = int(self.jours.valeurs[i])  # colonne "time" : minuit local du jour i
+        h0, h1 = PERIODES[nom]
+        return self.heures.fenetre(minuit + h0 * 3600, minuit + h1 * 3600)
+
+
+def calculer_astronomie(previsions: list[Prevision]):
+    """Calcule Soleil et Lune des previsions qui ne les ont pas encore.
+
+    Les previsions de meme nombre de jours passent ensemble dans ephemerides_v
+    (a partir de 16, en deca le cout fixe de NumPy l'emporte).
+    """
+    groupes = {}
+    for prev in previsions:
+        if prev.astro is None:
+            groupes.setdefault(len(prev.jours), []).append(prev)
+    for groupe in groupes.values():
+        np = _numpy() if len(groupe) >= 16 else None
+        if np is None:
+            for prev in groupe:
+                prev.astronomie()
+            continue
+        res = ephemerides_v([[p.latitude] for p in groupe], [[p.longitude] for p in groupe],
+                            [p.minuits() for p in groupe])
+        colonnes = {nom: res[nom].tolist() for nom in VARIABLES_ASTRONOMIE}
+        for k, prev in enumerate(groupe):
+            prev.astro = {nom: colonnes[nom][k] for nom in VARIABLES_ASTRONOMIE}
+
+
+def normaliser(donnees) -> Prevision:
+    """Construit la Prevision d'une reponse (ou la renvoie telle quelle)."""
+    return donnees if isinstance(donnees, Prevision) else Prevision(donnees)
+
+
+class VilleIndisponible:
+    """Ville sans donnees (ni reponse, ni cache) : rendue comme un cadre vide."""
+
+    __slots__ = ("raison",)
+
+    def __init__(self, raison: str):
+        self.raison = raison
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
@@ -223,40 +1819,26 @@ def barre_precip(prob: float) -> str:
     return f"  [{bar}] {prob:.0f}%"
 
 
+DIRECTIONS_VENT = ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+                   "S", "SSO", "SO", "OSO", "O", "ONO", "NO", "NNO"]
+
+# Bornes superieures (km/h, exclues) de chaque force Beaufort
+SEUILS_BEAUFORT = [1, 6, 12, 20, 29, 39, 50, 62, 75, 89, 103, 117]
+LIBELLES_BEAUFORT = [
+    "Calme (0)", "Tres legere brise (1)", "Legere brise (2)", "Petite brise (3)",
+    "Jolie brise (4)", "Bonne brise (5)", "Vent frais (6)", "Grand frais (7)",
+    "Coup de vent (8)", "Fort coup de vent (9)", "Tempete (10)",
+    "Violente tempete (11)", "Ouragan (12)",
+]
+
+
 def direction_vent(deg: float) -> str:
-    dirs = ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
-            "S", "SSO", "SO", "OSO", "O", "ONO", "NO", "NNO"]
     idx = round(deg / 22.5) % 16
-    return dirs[idx]
+    return DIRECTIONS_VENT[idx]
 
 
 def beaufort(kmh: float) -> str:
-    if kmh < 1:
-        return "Calme (0)"
-    elif kmh < 6:
-        return "Tres legere brise (1)"
-    elif kmh < 12:
-        return "Legere brise (2)"
-    elif kmh < 20:
-        return "Petite brise (3)"
-    elif kmh < 29:
-        return "Jolie brise (4)"
-    elif kmh < 39:
-        return "Bonne brise (5)"
-    elif kmh < 50:
-        return "Vent frais (6)"
-    elif kmh < 62:
-        return "Grand frais (7)"
-    elif kmh < 75:
-        return "Coup de vent (8)"
-    elif kmh < 89:
-        return "Fort coup de vent (9)"
-    elif kmh < 103:
-        return "Tempete (10)"
-    elif kmh < 117:
-        return "Violente tempete (11)"
-    else:
-        return "Ouragan (12)"
+    return LIBELLES_BEAUFORT[bisect.bisect_right(SEUILS_BEAUFORT, kmh)]
 
 
 def point_de_rosee(temp: float, hum: float) -> float:
@@ -265,141 +1847,580 @@ def point_de_rosee(temp: float, hum: float) -> float:
     return round((b * alpha) / (a - alpha), 1)
 
 
-def duree_jour(sunrise_str: str, sunset_str: str) -> str:
-    fmt = "%Y-%m-%dT%H:%M"
-    sr = datetime.strptime(sunrise_str, fmt)
-    ss = datetime.strptime(sunset_str, fmt)
-    delta = ss - sr
-    h, reste = divmod(int(delta.total_seconds()), 3600)
+def confort_score(t_max: float, precip_prob: float, vent_max: float) -> float:
+    return t_max - precip_prob / 10 - vent_max / 10
+
+
+def duree_jour(secondes: float) -> str:
+    h, reste = divmod(int(secondes), 3600)
     m = reste // 60
     return f"{h}h{m:02d}"
 
 
-# ── Recommandations vestimentaires ────────────────────────────────────────────
+# ── Metriques derivees vectorisees ────────────────────────────────────────────
 
-def recommandation(nom: str, data: dict) -> str:
-    cur = data["current"]
-    daily = data["daily"]
+_np = None
 
-    t_max = daily["temperature_2m_max"][0]
-    t_min = daily["temperature_2m_min"][0]
-    precip_prob = daily["precipitation_probability_max"][0] or 0
-    pluie = daily["rain_sum"][0] or 0
-    neige = daily["snowfall_sum"][0] or 0
-    vent_max = daily["wind_speed_10m_max"][0] or 0
-    rafales = daily["wind_gusts_10m_max"][0] or 0
 
-    lignes = []
+def _numpy():
+    """Importe NumPy a la demande ; None s'il n'est pas installe."""
+    global _np
+    if _np is None:
+        try:
+            import numpy
+        except ImportError:
+            return None
+        _np = numpy
+    return _np
+
+
+def point_de_rosee_v(temp, hum):
+    """point_de_rosee() sur des tableaux de forme quelconque."""
+    np = _numpy()
+    temp = np.asarray(temp, dtype=float)
+    hum = np.asarray(hum, dtype=float)
+    a, b = 17.27, 237.7
+    with np.errstate(divide="ignore", invalid="ignore"):
+        alpha = (a * temp) / (b + temp) + np.log(hum / 100.0)
+        brut = (b * alpha) / (a - alpha)
+    res = np.round(brut, 1)
+    # np.round multiplie par 10 avant d'arrondir : pres d'une demi-decimale, le
+    # resultat peut differer de round() ; ces cas rares repassent par le scalaire.
+    douteux = np.abs(np.abs(brut * 10 - np.trunc(brut * 10)) - 0.5) < 1e-6
+    for idx in zip(*np.nonzero(douteux)):
+        res[idx] = point_de_rosee(float(temp[idx]), float(hum[idx]))
+    return res
+
+
+def beaufort_v(kmh):
+    """Force Beaufort (0-12) de chaque valeur ; LIBELLES_BEAUFORT donne le texte."""
+    np = _numpy()
+    return np.searchsorted(np.asarray(SEUILS_BEAUFORT, dtype=float), kmh, side="right")
+
+
+def direction_vent_v(deg):
+    """Secteur (0-15) de chaque direction ; DIRECTIONS_VENT donne le texte."""
+    np = _numpy()
+    return np.rint(np.asarray(deg, dtype=float) / 22.5).astype(np.int64) % 16
+
+
+def confort_score_v(t_max, precip_prob, vent_max):
+    np = _numpy()
+    return (np.asarray(t_max, dtype=float) - np.asarray(precip_prob, dtype=float) / 10
+            - np.asarray(vent_max, dtype=float) / 10)
+
+
+def metriques_bulletin(previsions: list[Prevision]) -> list[tuple]:
+    """Metriques derivees du bulletin pour toutes les villes en un seul passage.
+
+    Renvoie par ville : (point de rosee, direction du vent, Beaufort du vent
+    max, direction dominante, score de confort). Sans NumPy, ou pour quelques
+    villes seulement, les fonctions scalaires sont appelees ville par ville.
+    """
+    jours = [p.jour(0) for p in previsions]
+    # Pour une poignee de villes, le cout fixe de NumPy depasse le gain
+    np = _numpy() if len(previsions) >= 16 else None
+    if np is None:
+        return [
+            (point_de_rosee(p.actuel.temperature_2m, p.actuel.relative_humidity_2m),
+             direction_vent(p.actuel.wind_direction_10m),
+             beaufort(j.wind_speed_10m_max),
+             direction_vent(j.wind_direction_10m_dominant),
+             confort_score(j.temperature_2m_max, j.precipitation_probability_max, j.wind_speed_10m_max))
+            for p, j in zip(previsions, jours)
+        ]
 
-    # -- Couche de base / chaleur --
-    if t_min < -10:
-        lignes.append("- Sous-vetements thermiques OBLIGATOIRES (haut + bas)")
-        lignes.append("- Doudoune epaisse ou manteau grand froid")
-        lignes.append("- Bonnet, gants doubles, echarpe/tour de cou")
-    elif t_min < 0:
-        lignes.append("- Sous-couche thermique recommandee")
-        lignes.append("- Manteau chaud / doudoune")
-        lignes.append("- Bonnet et gants chauds")
-        lignes.append("- Echarpe ou tour de cou")
-    elif t_min < 5:
-        lignes.append("- Pull ou polaire en couche intermediaire")
-        lignes.append("- Veste chaude ou manteau mi-saison epais")
-        lignes.append("- Echarpe legere pour le matin")
-        lignes.append("- Gants legers optionnels")
-    elif t_min < 12:
-        lignes.append("- Pull leger ou sweat")
-        lignes.append("- Veste legere ou blouson")
-    elif t_min < 20:
-        lignes.append("- T-shirt ou chemise legere")
-        lignes.append("- Gilet ou veste fine pour le soir")
-    else:
-        lignes.append("- Vetements legers et respirants")
-        lignes.append("- Chapeau / casquette contre le soleil")
+    def col(valeurs):
+        return np.array([math.nan if v is None else v for v in valeurs], dtype=float)
+
+    rosee = point_de_rosee_v(col(p.actuel.temperature_2m for p in previsions),
+                             col(p.actuel.relative_humidity_2m for p in previsions))
+    dirs = direction_vent_v(col(p.actuel.wind_direction_10m for p in previsions))
+    vent_max = col(j.wind_speed_10m_max for j in jours)
+    forces = beaufort_v(vent_max)
+    dirs_dom = direction_vent_v(col(j.wind_direction_10m_dominant for j in jours))
+    confort = confort_score_v(col(j.temperature_2m_max for j in jours),
+                              col(j.precipitation_probability_max for j in jours), vent_max)
+    return [
+        (float(rosee[i]), DIRECTIONS_VENT[dirs[i]], LIBELLES_BEAUFORT[forces[i]],
+         DIRECTIONS_VENT[dirs_dom[i]], float(confort[i]))
+        for i in range(len(previsions))
+    ]
 
-    # -- Pluie / neige --
-    if neige > 0:
-        lignes.append("- NEIGE prevue : chaussures impermeables et crantees")
-        lignes.append("- Pantalon impermeable ou surpantalon")
-        lignes.append("- Veste impermeable avec capuche")
-        if neige > 5:
-            lignes.append("- Guetres si vous marchez en exterieur")
-    elif precip_prob >= 70 or pluie > 3:
-        lignes.append("- Parapluie INDISPENSABLE")
-        lignes.append("- Veste impermeable avec capuche")
-        lignes.append("- Chaussures impermeables (pas de baskets en toile !)")
-    elif precip_prob >= 40:
-        lignes.append("- Parapluie pliable dans le sac (on ne sait jamais)")
-        lignes.append("- Veste deperlante ou coupe-vent")
-        lignes.append("- Chaussures fermees de preference")
-    else:
-        lignes.append("- Pas de pluie significative attendue")
 
-    # -- Vent --
-    if rafales > 80:
-        lignes.append("- VENT FORT : coupe-vent solide obligatoire")
-        lignes.append("- Evitez les parapluies, preferez une capuche")
-    elif rafales > 50:
-        lignes.append("- Vent soutenu : coupe-vent recommande")
-    elif vent_max > 25:
-        lignes.append("- Brise notable : une couche coupe-vent est un plus")
+# ── Astronomie ────────────────────────────────────────────────────────────────
 
-    # -- UV --
-    uv = daily["uv_index_max"][0] or 0
-    if uv >= 6:
-        lignes.append(f"- UV eleve ({uv:.0f}) : creme solaire et lunettes de soleil")
-    elif uv >= 3:
-        lignes.append(f"- UV modere ({uv:.0f}) : lunettes de soleil recommandees")
+# Lever, coucher et phase de la Lune sont calcules localement plutot que
+# demandes a l'API : Soleil selon l'algorithme du NOAA, Lune selon les termes
+# principaux de Meeus (ch. 47-48). Compare a PyEphem jusqu'a 65° de latitude,
+# lever et coucher s'ecartent de moins de 10 s avant l'arrondi a la minute
+# (35 s apres). Au-dela des cercles polaires, les jours ou le Soleil ne fait
+# qu'effleurer l'horizon, l'ecart peut atteindre une minute ou deux.
 
+# Au lever, le bord du Soleil est a l'horizon : son centre est sous
+# l'horizon de la refraction (34') plus son rayon apparent, qui varie de
+# +/- 1,7 % avec la distance Terre-Soleil (16' a 1 ua)
+REFRACTION_HORIZON = 34 / 60
+RAYON_SOLEIL = 0.2666
+
+PHASES_LUNE = [
+    "Nouvelle lune", "Premier croissant", "Premier quartier", "Gibbeuse croissante",
+    "Pleine lune", "Gibbeuse decroissante", "Dernier quartier", "Dernier croissant",
+]
+
+
+class _Scalaire:
+    """Fonctions de `math` sous les noms NumPy : les formules servent aux deux."""
+
+    sin, cos, tan, arcsin, arccos = math.sin, math.cos, math.tan, math.asin, math.acos
+    radians, degrees, floor = math.radians, math.degrees, math.floor
+    clip = staticmethod(lambda x, bas, haut: min(max(x, bas), haut))
+
+
+def _siecles(t):
+    """Siecles juliens depuis J2000.0 d'un instant en secondes Unix."""
+    return (t / 86400 - 10957.5) / 36525
+
+
+def _soleil(m, t):
+    """Declinaison du Soleil (radians), equation du temps (minutes) et hauteur
+    de son centre au lever (degres) a l'instant t."""
+    T = _siecles(t)
+    l0 = m.radians((280.46646 + T * (36000.76983 + T * 0.0003032)) % 360)
+    ma = m.radians(357.52911 + T * (35999.05029 - 0.0001537 * T))
+    e = 0.016708634 - T * (0.000042037 + 0.0000001267 * T)
+    centre = (m.sin(ma) * (1.914602 - T * (0.004817 + 0.000014 * T))
+              + m.sin(2 * ma) * (0.019993 - 0.000101 * T) + m.sin(3 * ma) * 0.000289)
+    omega = m.radians(125.04 - 1934.136 * T)
+    longitude = l0 + m.radians(centre - 0.00569 - 0.00478 * m.sin(omega))
+    obliquite = m.radians(23 + (26 + (21.448 - T * (46.815 + T * (0.00059 - T * 0.001813)))
+                                / 60) / 60 + 0.00256 * m.cos(omega))
+    declinaison = m.arcsin(m.sin(obliquite) * m.sin(longitude))
+    distance = 1.000001018 * (1 - e * e) / (1 + e * m.cos(ma + m.radians(centre)))
+    y = m.tan(obliquite / 2) ** 2
+    equation = 4 * m.degrees(y * m.sin(2 * l0) - 2 * e * m.sin(ma)
+                             + 4 * e * y * m.sin(ma) * m.cos(2 * l0)
+                             - 0.5 * y * y * m.sin(4 * l0) - 1.25 * e * e * m.sin(2 * ma))
+    return declinaison, equation, -(REFRACTION_HORIZON + RAYON_SOLEIL / distance)
+
+
+def _cos_angle_horaire(m, lat, declinaison, hauteur):
+    """Cosinus de l'angle horaire du lever ; > 1 en nuit polaire, < -1 en jour polaire."""
+    phi = m.radians(lat)
+    return ((m.sin(m.radians(hauteur)) - m.sin(phi) * m.sin(declinaison))
+            / (m.cos(phi) * m.cos(declinaison)))
+
+
+def _instant(m, lat, lon, jour, declinaison, equation, hauteur, signe: int):
+    angle = m.degrees(m.arccos(m.clip(_cos_angle_horaire(m, lat, declinaison, hauteur), -1, 1)))
+    return jour + (720 - 4 * lon - equation + signe * 4 * angle) * 60
+
+
+def _evenement(m, lat, lon, jour, soleil_midi, signe: int):
+    """Lever (signe -1) ou coucher (+1) d'un jour (minuit UTC), en secondes Unix.
+
+    Estime avec le Soleil de midi, puis recalcule avec celui de l'instant
+    estime : une correction suffit a rester sous la minute.
+    """
+    t = _instant(m, lat, lon, jour, *soleil_midi, signe)
+    t = _instant(m, lat, lon, jour, *_soleil(m, t), signe)
+    return m.floor(t / 60 + 0.5) * 60
+
+
+def _lune(m, t):
+    """Phase (0 nouvelle lune, 0.5 pleine lune) et fraction eclairee de la Lune."""
+    T = _siecles(t)
+    d = m.radians((297.8501921 + 445267.1114034 * T) % 360)
+    ms = m.radians(357.5291092 + 35999.0502909 * T)
+    ml = m.radians(134.9633964 + 477198.8675055 * T)
+    # Angle de phase (0 = pleine lune)
+    i = (180 - m.degrees(d) - 6.289 * m.sin(ml) + 2.100 * m.sin(ms) - 1.274 * m.sin(2 * d - ml)
+         - 0.658 * m.sin(2 * d) - 0.214 * m.sin(2 * ml) - 0.110 * m.sin(d))
+    return ((180 - i) % 360) / 360, (1 + m.cos(m.radians(i))) / 2
+
+
+def ephemerides(lat: float, lon: float, jours: Iterable[int]) -> dict[str, list[float]]:
+    """Soleil et Lune d'un lieu pour chaque jour (minuit UTC, en secondes Unix).
+
+    Une liste par variable de VARIABLES_ASTRONOMIE : lever et coucher en
+    secondes Unix arrondies a la minute (NaN en nuit ou jour polaire), duree
+    du jour en secondes, phase et fraction eclairee de la Lune a midi solaire.
+    """
+    m = _Scalaire
+    res = {nom: [] for nom in VARIABLES_ASTRONOMIE}
+    for jour in jours:
+        midi = jour + 43200 - lon * 240
+        soleil = _soleil(m, midi)
+        c = _cos_angle_horaire(m, lat, soleil[0], soleil[2])
+        if c > 1 or c < -1:
+            lever = coucher = math.nan
+            duree = 0 if c > 1 else 86400
+        else:
+            lever = _evenement(m, lat, lon, jour, soleil, -1)
+            coucher = _evenement(m, lat, lon, jour, soleil, 1)
+            duree = coucher - lever
+        phase, eclairee = _lune(m, midi)
+        for nom, v in zip(VARIABLES_ASTRONOMIE, (lever, coucher, duree, phase, eclairee)):
+            res[nom].append(v)
+    return res
+
+
+def ephemerides_v(lat, lon, jours) -> dict:
+    """ephemerides() sur des tableaux diffuses entre eux, par ex. lat et lon de
+    forme (villes, 1) et jours de forme (jours,) ou (villes, jours)."""
+    np = _numpy()
+    lat, lon, jours = (np.asarray(x, dtype=float) for x in (lat, lon, jours))
+    midi = jours + 43200 - lon * 240
+    soleil = _soleil(np, midi)
+    c = _cos_angle_horaire(np, lat, soleil[0], soleil[2])
+    polaire = np.abs(c) > 1
+    lever = np.where(polaire, np.nan, _evenement(np, lat, lon, jours, soleil, -1))
+    coucher = np.where(polaire, np.nan, _evenement(np, lat, lon, jours, soleil, 1))
+    duree = np.where(c > 1, 0.0, np.where(c < -1, 86400.0, coucher - lever))
+    phase, eclairee = _lune(np, midi)
+    return dict(zip(VARIABLES_ASTRONOMIE, (lever, coucher, duree, phase, eclairee)))
+
+
+def phase_lune(phase: float) -> str:
+    """Nom de la phase (0 a 1 depuis la nouvelle lune), par huitiemes de lunaison."""
+    return PHASES_LUNE[int(phase * 8 + 0.5) % 8]
+
+
+# ── Recommandations vestimentaires ────────────────────────────────────────────
+
+# Une regle : (condition, lignes). La condition enchaine des clauses
+# "variable operateur seuil" avec " et " / " ou " ("et" prioritaire) ;
+# "" est toujours vraie. Dans chaque groupe, la premiere regle vraie fournit
+# ses lignes (aucune si rien ne correspond) ; les groupes s'enchainent dans
+# l'ordre. Les lignes peuvent citer une variable : "{uv:.0f}".
+REGLES_RECOMMANDATION = [
+    # -- Couche de base / chaleur --
+    [
+        ("t_min < -10", ["- Sous-vetements thermiques OBLIGATOIRES (haut + bas)",
+                         "- Doudoune epaisse ou manteau grand froid",
+                         "- Bonnet, gants doubles, echarpe/tour de cou"]),
+        ("t_min < 0", ["- Sous-couche thermique recommandee",
+                       "- Manteau chaud / doudoune",
+                       "- Bonnet et gants chauds",
+                       "- Echarpe ou tour de cou"]),
+        ("t_min < 5", ["- Pull ou polaire en couche intermediaire",
+                       "- Veste chaude ou manteau mi-saison epais",
+                       "- Echarpe legere pour le matin",
+                       "- Gants legers optionnels"]),
+        ("t_min < 12", ["- Pull leger ou sweat",
+                        "- Veste legere ou blouson"]),
+        ("t_min < 20", ["- T-shirt ou chemise legere",
+                        "- Gilet ou veste fine pour le soir"]),
+        ("", ["- Vetements legers et respirants",
+              "- Chapeau / casquette contre le soleil"]),
+    ],
+    # -- Pluie / neige --
+    [
+        ("neige > 0", ["- NEIGE prevue : chaussures impermeables et crantees",
+                       "- Pantalon impermeable ou surpantalon",
+                       "- Veste impermeable avec capuche"]),
+        ("precip_prob >= 70 ou pluie > 3", ["- Parapluie INDISPENSABLE",
+                                            "- Veste impermeable avec capuche",
+                                            "- Chaussures impermeables (pas de baskets en toile !)"]),
+        ("precip_prob >= 40", ["- Parapluie pliable dans le sac (on ne sait jamais)",
+                               "- Veste deperlante ou coupe-vent",
+                               "- Chaussures fermees de preference"]),
+        ("", ["- Pas de pluie significative attendue"]),
+    ],
+    [
+        ("neige > 5", ["- Guetres si vous marchez en exterieur"]),
+    ],
+    # -- Vent --
+    [
+        ("rafales > 80", ["- VENT FORT : coupe-vent solide obligatoire",
+                          "- Evitez les parapluies, preferez une capuche"]),
+        ("rafales > 50", ["- Vent soutenu : coupe-vent recommande"]),
+        ("vent_max > 25", ["- Brise notable : une couche coupe-vent est un plus"]),
+    ],
+    # -- UV --
+    [
+        ("uv >= 6", ["- UV eleve ({uv:.0f}) : creme solaire et lunettes de soleil"]),
+        ("uv >= 3", ["- UV modere ({uv:.0f}) : lunettes de soleil recommandees"]),
+    ],
+    # -- Au fil de la journee (series horaires, NaN sans donnees) --
+    [
+        ("ecart >= 10", ["- Ecart de {ecart:.0f}°C entre le matin et l'apres-midi :",
+                         "  des couches faciles a retirer"]),
+    ],
+    [
+        ("proba_soir >= 60 et proba_jour < 40", ["- Pluie attendue le soir : parapluie pour le retour"]),
+    ],
     # -- Verdict --
-    lignes.append("")
-    if t_min < 0 and neige > 0:
-        lignes.append("  Verdict : Conditions hivernales. Habillez-vous chaudement,")
-        lignes.append("  impermeabilisez-vous, et soyez prudent sur les sols glissants.")
-    elif t_min < 5 and precip_prob >= 50:
-        lignes.append("  Verdict : Frais et humide. Le systeme des 3 couches est")
-        lignes.append("  votre meilleur ami : thermique + polaire + impermeable.")
-    elif t_min < 5:
-        lignes.append("  Verdict : Frais mais sec. Un bon manteau et une echarpe")
-        lignes.append("  suffiront pour passer la journee confortablement.")
-    elif t_max > 25:
-        lignes.append("  Verdict : Journee chaude ! Restez leger, hydratez-vous,")
-        lignes.append("  et cherchez l'ombre aux heures les plus chaudes.")
-    elif precip_prob >= 50:
-        lignes.append("  Verdict : Temps mitige. Gardez un parapluie a portee")
-        lignes.append("  et privilegiez des chaussures qui ne craignent pas l'eau.")
-    else:
-        lignes.append("  Verdict : Conditions agreables. Habillez-vous normalement")
-        lignes.append("  avec une petite couche en plus pour le matin/soir.")
+    [
+        ("", [""]),
+    ],
+    [
+        ("t_min < 0 et neige > 0", ["  Verdict : Conditions hivernales. Habillez-vous chaudement,",
+                                    "  impermeabilisez-vous, et soyez prudent sur les sols glissants."]),
+        ("t_min < 5 et precip_prob >= 50", ["  Verdict : Frais et humide. Le systeme des 3 couches est",
+                                            "  votre meilleur ami : thermique + polaire + impermeable."]),
+        ("t_min < 5", ["  Verdict : Frais mais sec. Un bon manteau et une echarpe",
+                       "  suffiront pour passer la journee confortablement."]),
+        ("t_max > 25", ["  Verdict : Journee chaude ! Restez leger, hydratez-vous,",
+                        "  et cherchez l'ombre aux heures les plus chaudes."]),
+        ("precip_prob >= 50", ["  Verdict : Temps mitige. Gardez un parapluie a portee",
+                               "  et privilegiez des chaussures qui ne craignent pas l'eau."]),
+        ("", ["  Verdict : Conditions agreables. Habillez-vous normalement",
+              "  avec une petite couche en plus pour le matin/soir."]),
+    ],
+]
 
-    return "\n".join(lignes)
+OPERATEURS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+              "==": operator.eq, "!=": operator.ne}
+
+
+class MoteurRegles:
+    """Table de regles compilee, evaluee sur des colonnes de conditions.
+
+    Chaque condition devient une liste d'alternatives ("ou") de clauses
+    ("et") ; les operateurs de comparaison s'appliquent indifferemment a des
+    flottants ou a des tableaux NumPy. `classer` donne, pour chaque groupe,
+    l'indice de la regle retenue pour chaque element (-1 si aucune) : avec
+    NumPy, une regle est evaluee d'un coup sur toutes les villes (ou
+    tranches horaires). `textes` assemble ensuite les lignes.
+    """
+
+    def __init__(self, table: list[list[tuple[str, list[str]]]]):
+        self.groupes = [[(self._compiler(cond), lignes) for cond, lignes in groupe]
+                        for groupe in table]
+        self.variables = sorted({clause[0] for groupe in self.groupes for cond, _ in groupe
+                                 for alternative in cond for clause in alternative})
+
+    @staticmethod
+    def _compiler(condition: str) -> list[list[tuple]]:
+        if not condition.strip():
+            return [[]]
+        alternatives = []
+        for alternative in condition.split(" ou "):
+            clauses = []
+            for clause in alternative.split(" et "):
+                variable, op, seuil = clause.split()
+                clauses.append((variable, OPERATEURS[op], float(seuil)))
+            alternatives.append(clauses)
+        return alternatives
+
+    @staticmethod
+    def _vraie(cond: list[list[tuple]], variables: dict):
+        resultat = False
+        for alternative in cond:
+            vraie = True
+            for variable, op, seuil in alternative:
+                vraie = vraie & op(variables[variable], seuil)
+            resultat = resultat | vraie
+        return resultat
+
+    def classer(self, variables: dict, n: int) -> list:
+        """Indice de la regle retenue par groupe et par element.
+
+        `variables` associe a chaque nom une colonne de `n` valeurs : des
+        tableaux NumPy (evaluation vectorisee) ou des listes de flottants.
+        """
+        # Listes : evaluation scalaire, sans meme importer NumPy
+        if n and not any(isinstance(variables[v], list) for v in self.variables):
+            np = _numpy()
+            choix = []
+            for groupe in self.groupes:
+                retenue = np.full(n, -1)
+                for k in range(len(groupe) - 1, -1, -1):
+                    vraie = np.broadcast_to(self._vraie(groupe[k][0], variables), (n,))
+                    retenue[vraie] = k
+                choix.append(retenue)
+            return choix
+
+        choix = [[-1] * n for _ in self.groupes]
+        for i in range(n):
+            ligne = {v: variables[v][i] for v in self.variables}
+            for g, groupe in enumerate(self.groupes):
+                for k, (cond, _) in enumerate(groupe):
+                    if self._vraie(cond, ligne):
+                        choix[g][i] = k
+                        break
+        return choix
+
+    def texte(self, groupe: int, regle: int, valeurs: dict) -> str:
+        """Lignes d'une regle, completees avec les valeurs d'un element."""
+        return "\n".join(self.groupes[groupe][regle][1]).format(**valeurs)
+
+    def textes(self, variables: dict, n: int) -> list[str]:
+        choix = [c.tolist() if hasattr(c, "tolist") else c for c in self.classer(variables, n)]
+        cites = {champ for groupe in self.groupes for _, lignes in groupe for ligne in lignes
+                 for _, champ, _, _ in string.Formatter().parse(ligne) if champ}
+        valeurs = {v: [float(x) for x in variables[v]] for v in cites}
+        # Le gabarit ne depend que des regles retenues
+        gabarits = {}
+        textes = []
+        for i, retenues in enumerate(zip(*choix)):
+            gabarit = gabarits.get(retenues)
+            if gabarit is None:
+                lignes = []
+                for groupe, k in zip(self.groupes, retenues):
+                    if k >= 0:
+                        lignes.extend(groupe[k][1])
+                texte = "\n".join(lignes)
+                gabarit = gabarits[retenues] = (texte, "{" in texte)
+            texte, a_completer = gabarit
+            if a_completer:
+                texte = texte.format(**{v: valeurs[v][i] for v in cites})
+            textes.append(texte)
+        return textes
+
+
+MOTEUR_RECOMMANDATION = MoteurRegles(REGLES_RECOMMANDATION)
+
+
+def conditions_recommandation(previsions: list[Prevision], jour: int = 0) -> dict[str, list[float]]:
+    """Colonnes de conditions du moteur de recommandation, une valeur par ville."""
+    cols = {v: [] for v in ("t_min", "t_max", "precip_prob", "pluie", "neige", "vent_max",
+                            "rafales", "uv", "ecart", "proba_jour", "proba_soir")}
+    nan = math.nan
+    for prev in previsions:
+        j = prev.jour(jour)
+        for v, valeur in (("t_min", j.temperature_2m_min), ("t_max", j.temperature_2m_max),
+                          ("precip_prob", j.precipitation_probability_max), ("pluie", j.rain_sum),
+                          ("neige", j.snowfall_sum), ("vent_max", j.wind_speed_10m_max),
+                          ("rafales", j.wind_gusts_10m_max), ("uv", j.uv_index_max)):
+            cols[v].append(nan if valeur is None else valeur)
+
+        # Tranches horaires : NaN (aucune regle vraie) sans donnees
+        ecart = proba_jour = proba_soir = nan
+        matin, apres_midi, soir = (prev.periode(p, jour) for p in PERIODES)
+        if matin is not None and len(matin) and len(apres_midi):
+            froid = matin.minimum("apparent_temperature")
+            chaud = apres_midi.maximum("apparent_temperature")
+            if froid is not None and chaud is not None:
+                ecart = chaud - froid
+            proba_jour = max((f.maximum("precipitation_probability") or 0) for f in (matin, apres_midi))
+            if len(soir) and soir.maximum("precipitation_probability") is not None:
+                proba_soir = soir.maximum("precipitation_probability")
+        cols["ecart"].append(ecart)
+        cols["proba_jour"].append(proba_jour)
+        cols["proba_soir"].append(proba_soir)
+    return cols
+
+
+def recommandations(previsions: list[Prevision], jour: int = 0) -> list[str]:
+    """Recommandations de plusieurs villes ; vectorisees avec NumPy au-dela d'une poignee."""
+    cols = conditions_recommandation(previsions, jour)
+    np = _numpy() if len(previsions) >= 16 else None
+    if np is not None:
+        cols = {v: np.array(c, dtype=float) for v, c in cols.items()}
+    return MOTEUR_RECOMMANDATION.textes(cols, len(previsions))
+
+
+def recommandation(nom: str, data: Prevision | dict) -> str:
+    """Recommandation d'une seule ville ; le bulletin passe par recommandations()."""
+    return recommandations([normaliser(data)])[0]
+
+
+# Conseil court par tranche de PERIODES, meme format que REGLES_RECOMMANDATION.
+# Variables lues dans les series horaires de la tranche : ressenti min et
+# max, probabilite de pluie max, cumul de precipitations, rafales max.
+REGLES_TRANCHE = [
+    [
+        ("ressenti_min < 0", ["bonnet et gants"]),
+        ("ressenti_min < 8", ["manteau chaud"]),
+        ("ressenti_min < 15", ["pull ou veste"]),
+        ("ressenti_max > 28", ["tenue legere, de l'eau"]),
+    ],
+    [
+        ("precip_prob >= 60 ou precip > 1", ["parapluie"]),
+        ("precip_prob >= 30", ["parapluie pliable"]),
+    ],
+    [
+        ("rafales > 60", ["coupe-vent"]),
+    ],
+]
+
+MOTEUR_TRANCHE = MoteurRegles(REGLES_TRANCHE)
+
+
+def conseils_tranches(previsions: list[Prevision], jour: int = 0) -> list[dict[str, str]]:
+    """Conseil de chaque tranche (matin, apres-midi, soir) de chaque ville.
+
+    Les tranches de toutes les villes forment les lignes d'une seule
+    evaluation de MOTEUR_TRANCHE (vectorisee avec NumPy au-dela d'une
+    poignee). Une ville sans series horaires recoit {} ; une tranche sans
+    conseil, "".
+    """
+    cols = {v: [] for v in ("ressenti_min", "ressenti_max", "precip_prob", "precip", "rafales")}
+    places = []
+    nan = math.nan
+    for n, prev in enumerate(previsions):
+        for nom in PERIODES:
+            f = prev.periode(nom, jour)
+            if f is None or not len(f):
+                continue
+            for v, valeur in (("ressenti_min", f.minimum("apparent_temperature")),
+                              ("ressenti_max", f.maximum("apparent_temperature")),
+                              ("precip_prob", f.maximum("precipitation_probability")),
+                              ("precip", f.somme("precipitation")),
+                              ("rafales", f.maximum("wind_gusts_10m"))):
+                cols[v].append(nan if valeur is None else valeur)
+            places.append((n, nom))
+    conseils = [{} for _ in previsions]
+    if not places:
+        return conseils
+    np = _numpy() if len(places) >= 16 else None
+    if np is not None:
+        cols = {v: np.array(c, dtype=float) for v, c in cols.items()}
+    for (n, nom), texte in zip(places, MOTEUR_TRANCHE.textes(cols, len(places))):
+        conseils[n][nom] = texte.replace("\n", ", ")
+    return conseils
 
 
 # ── Construction du bulletin ──────────────────────────────────────────────────
 
-def construire_bulletin(resultats: list[tuple[dict, dict]]) -> str:
-    maintenant = datetime.now()
-    date_str = maintenant.strftime("%A %d %B %Y").capitalize()
-    heure_str = maintenant.strftime("%Hh%M")
+LARGEUR = 80
 
-    JOURS_FR = {
-        "Monday": "Lundi", "Tuesday": "Mardi", "Wednesday": "Mercredi",
-        "Thursday": "Jeudi", "Friday": "Vendredi", "Saturday": "Samedi",
-        "Sunday": "Dimanche",
-    }
-    MOIS_FR = {
-        "January": "janvier", "February": "fevrier", "March": "mars",
-        "April": "avril", "May": "mai", "June": "juin", "July": "juillet",
-        "August": "aout", "September": "septembre", "October": "octobre",
-        "November": "novembre", "December": "decembre",
-    }
+JOURS_FR = {
+    "Monday": "Lundi", "Tuesday": "Mardi", "Wednesday": "Mercredi",
+    "Thursday": "Jeudi", "Friday": "Vendredi", "Saturday": "Samedi",
+    "Sunday": "Dimanche",
+}
+MOIS_FR = {
+    "January": "janvier", "February": "fevrier", "March": "mars",
+    "April": "avril", "May": "mai", "June": "juin", "July": "juillet",
+    "August": "aout", "September": "septembre", "October": "octobre",
+    "November": "novembre", "December": "decembre",
+}
+
+
+def _date_fr(maintenant: datetime) -> str:
+    date_str = maintenant.strftime("%A %d %B %Y").capitalize()
     for en, fr in JOURS_FR.items():
         date_str = date_str.replace(en, fr)
     for en, fr in MOIS_FR.items():
         date_str = date_str.replace(en, fr)
         date_str = date_str.replace(en.lower(), fr)
         date_str = date_str.replace(en.upper(), fr.upper())
+    return date_str
+
+
+def _texte(lines: list[str]) -> str:
+    return "".join(line + "\n" for line in lines)
+
+
+def _ligne_villes(villes: list[dict]) -> str:
+    """Villes du bulletin pour l'en-tete, abregees si elles ne tiennent pas sur la ligne."""
+    libelles = [v.get("libelle") or v["nom"] for v in villes]
+    for k in range(len(libelles), 0, -1):
+        ligne = "  " + "  ~  ".join(libelles[:k])
+        if k < len(libelles):
+            ligne += f"  ~  +{len(libelles) - k} autres"
+        if len(ligne) <= LARGEUR - 4:
+            return ligne
+    return f"  {len(libelles)} villes"
 
-    W = 80
+
+def _entete(maintenant: datetime, villes: list[dict] | None = None) -> list[str]:
+    W = LARGEUR
+    date_str = _date_fr(maintenant)
+    heure_str = maintenant.strftime("%Hh%M")
     lines = []
 
     # ── Header avec ASCII art ──
@@ -417,153 +2438,214 @@ def construire_bulletin(resultats: list[tuple[dict, dict]]) -> str:
     lines.append("|" + " " * (W - 2) + "|")
     lines.append("|" + f"  {date_str}".center(W - 2) + "|")
     lines.append("|" + f"  Genere a {heure_str}".center(W - 2) + "|")
-    lines.append("|" + "  Lausanne  ~  Chatel (74)  ~  Paris".center(W - 2) + "|")
+    if villes:
+        lines.append("|" + _ligne_villes(villes).center(W - 2) + "|")
     lines.append("|" + " " * (W - 2) + "|")
     lines.append("+" + "=" * (W - 2) + "+")
     lines.append("")
+    return lines
 
-    comparatif = []
-
-    for i, (ville, data) in enumerate(resultats, 1):
-        cur = data["current"]
-        daily = data["daily"]
-
-        t_cur = cur["temperature_2m"]
-        t_res = cur["apparent_temperature"]
-        hum = cur["relative_humidity_2m"]
-        nuages = cur["cloud_cover"]
-        vent = cur["wind_speed_10m"]
-        vent_dir = cur["wind_direction_10m"]
-        rafales = cur["wind_gusts_10m"]
-        pression = cur["surface_pressure"]
-        wcode = cur["weather_code"]
-
-        t_max = daily["temperature_2m_max"][0]
-        t_min = daily["temperature_2m_min"][0]
-        tres_max = daily["apparent_temperature_max"][0]
-        tres_min = daily["apparent_temperature_min"][0]
-        precip_prob = daily["precipitation_probability_max"][0] or 0
-        pluie_total = daily["rain_sum"][0]
-        neige_total = daily["snowfall_sum"][0]
-        vent_max = daily["wind_speed_10m_max"][0]
-        raf_max = daily["wind_gusts_10m_max"][0]
-        vent_dom = daily["wind_direction_10m_dominant"][0]
-        sunrise = daily["sunrise"][0]
-        sunset = daily["sunset"][0]
-        uv_max = daily["uv_index_max"][0]
-
-        # ── Titre ville ──
-        titre = f"  {i}. {ville['nom'].upper()} ({ville['region']}) ~ Alt. {ville['altitude_info']}  "
-        pad = W - len(titre)
-        lines.append("+" + "-" * (W - 2) + "+")
-        lines.append("|" + titre + " " * max(0, pad - 2) + "|")
-        lines.append("+" + "-" * (W - 2) + "+")
-
-        # ── ASCII art meteo + resume cote a cote ──
-        art = ascii_weather(wcode)
-        desc = desc_weather_code(wcode)
-        info_lines = [
-            f"  {desc}",
-            f"  {t_cur}°C  (ressenti {t_res}°C)",
-            f"  Min {t_min}°C / Max {t_max}°C",
-            f"  Vent {vent} km/h {direction_vent(vent_dir)}  ~  Rafales {rafales} km/h",
-            "",
-        ]
-        lines.append("|" + " " * (W - 2) + "|")
-        for j in range(5):
-            a = art[j] if j < len(art) else " " * 13
-            inf = info_lines[j] if j < len(info_lines) else ""
-            line_content = f"    {a}  |{inf}"
-            lines.append("|" + line_content + " " * max(0, W - 2 - len(line_content)) + "|")
-        lines.append("|" + " " * (W - 2) + "|")
-
-        # ── Barre temperature ──
-        lines.append("|  Temperature du jour :".ljust(W - 1) + "|")
-        lines.append("|" + barre_temperature(t_min, t_max).ljust(W - 2) + "|")
-        lines.append("|" + f"  [ # = negatif | = = 0-10°C | : = 10-25°C | ! = 25°C+ ]".ljust(W - 2) + "|")
-        lines.append("|" + " " * (W - 2) + "|")
-
-        # ── Barre precipitation ──
-        lines.append("|  Precipitation :".ljust(W - 1) + "|")
-        lines.append("|" + barre_precip(precip_prob).ljust(W - 2) + "|")
-        if neige_total and neige_total > 0:
-            lines.append("|" + f"  *** {neige_total} cm de neige prevus ***".ljust(W - 2) + "|")
-        if pluie_total and pluie_total > 0:
-            lines.append("|" + f"  ~~~ {pluie_total} mm de pluie prevus ~~~".ljust(W - 2) + "|")
-        lines.append("|" + " " * (W - 2) + "|")
-
-        # ── Section nerdy ──
-        lines.append("|  .--------------------------------------------.".ljust(W - 1) + "|")
-        lines.append("|  |        DONNEES DETAILLEES (nerds only)     |".ljust(W - 1) + "|")
-        lines.append("|  '--------------------------------------------'".ljust(W - 1) + "|")
-        nerd_data = [
-            f"  Couverture nuageuse .. {nuages}%",
-            f"  Humidite relative .... {hum}%",
-            f"  Point de rosee ....... {point_de_rosee(t_cur, hum)}°C",
-            f"  Pression atmo ........ {pression} hPa",
-            f"  Vent max journee ..... {vent_max} km/h ({beaufort(vent_max)})",
-            f"  Rafales max .......... {raf_max} km/h",
-            f"  Direction dominante .. {direction_vent(vent_dom)} ({vent_dom}°)",
-            f"  Ressenti min/max ..... {tres_min}°C / {tres_max}°C",
-            f"  Indice UV max ........ {uv_max}",
-            f"  Lever du soleil ...... {sunrise.split('T')[1]}",
-            f"  Coucher du soleil .... {sunset.split('T')[1]}",
-            f"  Duree du jour ........ {duree_jour(sunrise, sunset)}",
-        ]
-        for nd in nerd_data:
-            lines.append("|" + nd.ljust(W - 2) + "|")
-        lines.append("|" + " " * (W - 2) + "|")
-        lines.append("+" + "-" * (W - 2) + "+")
-        lines.append("")
-
-        # Donnees pour le comparatif
-        type_precip = "Neige" if (neige_total or 0) > 0 else "Pluie" if (pluie_total or 0) > 0 else "Sec"
-        comparatif.append({
-            "nom": ville["nom"],
-            "t_min": t_min,
-            "t_max": t_max,
-            "precip": f"{type_precip} {precip_prob:.0f}%",
-            "vent": f"{vent_max} km/h",
-            "confort_score": t_max - precip_prob / 10 - (vent_max or 0) / 10,
-            "wcode": wcode,
-        })
 
-    # ── Recommandations vestimentaires ──
-    lines.append("+" + "=" * (W - 2) + "+")
-    lines.append("|" + "  RECOMMANDATIONS VESTIMENTAIRES".center(W - 2) + "|")
-    lines.append("+" + "=" * (W - 2) + "+")
-    lines.append("")
+LIBELLES_PERIODES = {"matin": "Matin", "apres-midi": "Apres-midi", "soir": "Soir"}
 
-    for ville, data in resultats:
-        wcode = data["current"]["weather_code"]
-        art = ascii_weather(wcode)
-        lines.append(f"    >>> {ville['nom'].upper()} <<<")
-        lines.append("")
-        reco = recommandation(ville["nom"], data)
-        for rl in reco.split("\n"):
-            lines.append(f"    {rl}")
-        lines.append("")
-
-    # ── Comparatif ──
-    lines.append("+" + "=" * (W - 2) + "+")
-    lines.append("|" + "  COMPARATIF RAPIDE".center(W - 2) + "|")
-    lines.append("+" + "=" * (W - 2) + "+")
+
+def _lignes_tranches(prev: Prevision, conseils: dict[str, str] | None = None) -> list[str]:
+    """Matin / apres-midi / soir du jour, lus dans les series horaires,
+    chacun suivi de son conseil (voir conseils_tranches)."""
+    lines = []
+    for nom, libelle in LIBELLES_PERIODES.items():
+        f = prev.periode(nom)
+        if f is None or not len(f):
+            continue
+        t_min, t_max = f.minimum("temperature_2m"), f.maximum("temperature_2m")
+        proba = f.maximum("precipitation_probability")
+        code = f.maximum("weather_code")
+        lines.append(f"    {libelle:<11} {t_min}°C a {t_max}°C  ~  pluie "
+                     f"{'--' if proba is None else f'{proba}%'}  ~  "
+                     f"{'--' if code is None else desc_weather_code(code)}")
+        if conseils and conseils.get(nom):
+            lines.append(f"    {'':<11} -> {conseils[nom]}")
+    return ["  Au fil de la journee :"] + lines if lines else []
+
+
+def _lignes_tendance(prev: Prevision) -> list[str]:
+    """Une ligne par jour de prevision apres le premier."""
+    lines = []
+    for i in range(1, len(prev.jours)):
+        j = prev.jour(i)
+        date = datetime.strptime(j.time, "%Y-%m-%d")
+        lines.append(f"    {JOURS_FR[date.strftime('%A')][:3]} {date:%d/%m}  "
+                     f"Min {j.temperature_2m_min}°C / Max {j.temperature_2m_max}°C  ~  "
+                     f"pluie {j.precipitation_probability_max}%  ~  vent {j.wind_speed_10m_max} km/h")
+    return ["  Prochains jours :"] + lines if lines else []
+
+
+def _section_ville(i: int, ville: dict, prev: Prevision, metr: tuple,
+                   conseils: dict[str, str] | None = None) -> tuple[list[str], dict]:
+    """Cadre d'une ville et son resume pour le comparatif ; `conseils` par
+    tranche horaire (voir conseils_tranches)."""
+    W = LARGEUR
+    lines = []
+    rosee, dir_vent, force_vent_max, dir_dominante, score = metr
+    cur = prev.actuel
+    jour = prev.jour(0, astronomie=True)
+
+    t_cur = cur.temperature_2m
+    t_res = cur.apparent_temperature
+    hum = cur.relative_humidity_2m
+    nuages = cur.cloud_cover
+    vent = cur.wind_speed_10m
+    rafales = cur.wind_gusts_10m
+    pression = cur.surface_pressure
+    wcode = cur.weather_code
+
+    t_max = jour.temperature_2m_max
+    t_min = jour.temperature_2m_min
+    tres_max = jour.apparent_temperature_max
+    tres_min = jour.apparent_temperature_min
+    precip_prob = jour.precipitation_probability_max
+    pluie_total = jour.rain_sum
+    neige_total = jour.snowfall_sum
+    vent_max = jour.wind_speed_10m_max
+    raf_max = jour.wind_gusts_10m_max
+    vent_dom = jour.wind_direction_10m_dominant
+    sunrise = jour.sunrise.split("T")[1] if jour.sunrise else "--:--"
+    sunset = jour.sunset.split("T")[1] if jour.sunset else "--:--"
+    uv_max = jour.uv_index_max
+
+    # ── Titre ville ──
+    titre = f"  {i}. {ville['nom'].upper()} ({ville['region']}) ~ Alt. {ville['altitude_info']}  "
+    pad = W - len(titre)
+    lines.append("+" + "-" * (W - 2) + "+")
+    lines.append("|" + titre + " " * max(0, pad - 2) + "|")
+    lines.append("+" + "-" * (W - 2) + "+")
+    if prev.perimee is not None:
+        date_cache = datetime.fromtimestamp(prev.perimee).strftime("%d/%m/%Y a %Hh%M")
+        avis = f"  /!\\ Source injoignable : donnees en cache du {date_cache}"
+        lines.append("|" + avis.ljust(W - 2) + "|")
+
+    # ── ASCII art meteo + resume cote a cote ──
+    art = ascii_weather(wcode)
+    desc = desc_weather_code(wcode)
+    info_lines = [
+        f"  {desc}",
+        f"  {t_cur}°C  (ressenti {t_res}°C)",
+        f"  Min {t_min}°C / Max {t_max}°C",
+        f"  Vent {vent} km/h {dir_vent}  ~  Rafales {rafales} km/h",
+        "",
+    ]
+    lines.append("|" + " " * (W - 2) + "|")
+    for j in range(5):
+        a = art[j] if j < len(art) else " " * 13
+        inf = info_lines[j] if j < len(info_lines) else ""
+        line_content = f"    {a}  |{inf}"
+        lines.append("|" + line_content + " " * max(0, W - 2 - len(line_content)) + "|")
+    lines.append("|" + " " * (W - 2) + "|")
+
+    # ── Barre temperature ──
+    lines.append("|  Temperature du jour :".ljust(W - 1) + "|")
+    lines.append("|" + barre_temperature(t_min, t_max).ljust(W - 2) + "|")
+    lines.append("|" + f"  [ # = negatif | = = 0-10°C | : = 10-25°C | ! = 25°C+ ]".ljust(W - 2) + "|")
+    lines.append("|" + " " * (W - 2) + "|")
+
+    # ── Barre precipitation ──
+    lines.append("|  Precipitation :".ljust(W - 1) + "|")
+    lines.append("|" + barre_precip(precip_prob).ljust(W - 2) + "|")
+    if neige_total > 0:
+        lines.append("|" + f"  *** {neige_total} cm de neige prevus ***".ljust(W - 2) + "|")
+    if pluie_total > 0:
+        lines.append("|" + f"  ~~~ {pluie_total} mm de pluie prevus ~~~".ljust(W - 2) + "|")
+    lines.append("|" + " " * (W - 2) + "|")
+
+    # ── Tranches horaires et jours suivants (si demandes) ──
+    tranches = _lignes_tranches(prev, conseils)
+    tendance = _lignes_tendance(prev)
+    for bloc in (tranches, tendance):
+        for ligne in bloc:
+            lines.append("|" + ligne.ljust(W - 2) + "|")
+        if bloc:
+            lines.append("|" + " " * (W - 2) + "|")
+
+    # ── Section nerdy ──
+    lines.append("|  .--------------------------------------------.".ljust(W - 1) + "|")
+    lines.append("|  |        DONNEES DETAILLEES (nerds only)     |".ljust(W - 1) + "|")
+    lines.append("|  '--------------------------------------------'".ljust(W - 1) + "|")
+    nerd_data = [
+        f"  Couverture nuageuse .. {nuages}%",
+        f"  Humidite relative .... {hum}%",
+        f"  Point de rosee ....... {rosee}°C",
+        f"  Pression atmo ........ {pression} hPa",
+        f"  Vent max journee ..... {vent_max} km/h ({force_vent_max})",
+        f"  Rafales max .......... {raf_max} km/h",
+        f"  Direction dominante .. {dir_dominante} ({vent_dom}°)",
+        f"  Ressenti min/max ..... {tres_min}°C / {tres_max}°C",
+        f"  Indice UV max ........ {uv_max}",
+        f"  Lever du soleil ...... {sunrise}",
+        f"  Coucher du soleil .... {sunset}",
+        f"  Duree du jour ........ {duree_jour(jour.daylight_duration)}",
+        f"  Lune ................. {phase_lune(jour.moon_phase)} ({jour.moon_illumination:.0%} eclairee)",
+    ]
+    for nd in nerd_data:
+        lines.append("|" + nd.ljust(W - 2) + "|")
+    lines.append("|" + " " * (W - 2) + "|")
+    lines.append("+" + "-" * (W - 2) + "+")
     lines.append("")
-    lines.append(f"    {'Ville':<12} {'Temp Min':>9}  {'Temp Max':>9}  {'Precip':<13} {'Vent':<11}")
-    lines.append(f"    {'~'*12} {'~'*9}  {'~'*9}  {'~'*13} {'~'*11}")
-    for c in comparatif:
-        lines.append(f"    {c['nom']:<12} {c['t_min']:>7}°C  {c['t_max']:>7}°C  {c['precip']:<13} {c['vent']:<11}")
+
+    # Donnees pour le comparatif
+    type_precip = "Neige" if neige_total > 0 else "Pluie" if pluie_total > 0 else "Sec"
+    resume = {
+        "nom": ville["nom"],
+        "t_min": t_min,
+        "t_max": t_max,
+        "precip": f"{type_precip} {precip_prob:.0f}%",
+        "vent": f"{vent_max} km/h",
+        "confort_score": score,
+    }
+    return lines, resume
+
+
+def _lignes_recommandation(ville: dict, reco: str) -> list[str]:
+    lines = [f"    >>> {ville['nom'].upper()} <<<", ""]
+    for rl in reco.split("\n"):
+        lines.append(f"    {rl}")
     lines.append("")
+    return lines
+
+
+def _ligne_comparatif(c: dict) -> str:
+    return f"    {c['nom']:<12} {c['t_min']:>7}°C  {c['t_max']:>7}°C  {c['precip']:<13} {c['vent']:<11}"
+
+
+def _titre_section(titre: str) -> list[str]:
+    W = LARGEUR
+    return ["+" + "=" * (W - 2) + "+", "|" + titre.center(W - 2) + "|", "+" + "=" * (W - 2) + "+", ""]
+
+
+def _entete_comparatif() -> list[str]:
+    return _titre_section("  COMPARATIF RAPIDE") + [
+        f"    {'Ville':<12} {'Temp Min':>9}  {'Temp Max':>9}  {'Precip':<13} {'Vent':<11}",
+        f"    {'~'*12} {'~'*9}  {'~'*9}  {'~'*13} {'~'*11}",
+    ]
+
+
+# Villes affichees dans le classement confort
+CLASSEMENT_MAX = 10
+
+
+def _classement_et_pied(scores: list[tuple[float, str]], maintenant: datetime) -> list[str]:
+    W = LARGEUR
+    lines = []
 
     # ── Classement confort ──
-    medailles = ["[1er]", "[2e] ", "[3e] "]
-    classement = sorted(comparatif, key=lambda x: x["confort_score"], reverse=True)
+    classement = heapq.nlargest(CLASSEMENT_MAX, scores, key=lambda x: x[0])
     lines.append("    Classement confort du jour :")
     lines.append("")
-    for idx, c in enumerate(classement):
-        medal = medailles[idx] if idx < len(medailles) else f"[{idx+1}e] "
-        bar_score = ">" * max(1, int(c["confort_score"]))
-        lines.append(f"      {medal}  {c['nom']:<12}  {bar_score}")
+    for idx, (score, nom) in enumerate(classement):
+        medal = "[1er]" if idx == 0 else f"[{idx + 1}e]".ljust(5)
+        bar_score = ">" * max(1, int(score))
+        lines.append(f"      {medal}  {nom:<12}  {bar_score}")
+    if len(scores) > len(classement):
+        lines.append(f"      ... et {len(scores) - len(classement)} autre(s) ville(s)")
     lines.append("")
 
     # ── Footer ──
@@ -573,44 +2655,1294 @@ def construire_bulletin(resultats: list[tuple[dict, dict]]) -> str:
     lines.append("+" + "-" * (W - 2) + "+")
     lines.append("")
     lines.append("      Merci d'avoir consulte le bulletin. Bonne journee !")
-    lines.append("")
+    return lines
+
+
+def _section_indisponible(i: int, ville: dict, raison: str) -> list[str]:
+    W = LARGEUR
+    titre = f"  {i}. {ville['nom'].upper()} ({ville['region']}) ~ Alt. {ville['altitude_info']}  "
+    return [
+        "+" + "-" * (W - 2) + "+",
+        "|" + titre + " " * max(0, W - len(titre) - 2) + "|",
+        "|" + f"  Donnees indisponibles : {raison}"[:W - 2].ljust(W - 2) + "|",
+        "+" + "-" * (W - 2) + "+",
+        "",
+    ]
 
-    return "\n".join(lines)
 
+def _relire(spool) -> Iterator[str]:
+    spool.seek(0)
+    yield from iter(lambda: spool.read(1 << 16), "")
 
-# ── Main ──────────────────────────────────────────────────────────────────────
 
-def main():
-    print("Recuperation des donnees meteo...")
-    resultats = []
-    for ville in VILLES:
-        print(f"  -> {ville['nom']}...", end=" ")
-        try:
-            data = fetch_meteo(ville)
-            resultats.append((ville, data))
-            print("OK")
-        except Exception as e:
-            print(f"ERREUR : {e}")
+class RenduVille:
+    """Textes d'une ville, reutilisables tant que sa prevision ne change pas."""
+
+    __slots__ = ("section", "recommandation", "comparatif", "score")
+
+    def __init__(self, section: str, recommandation: str, comparatif: str, score: float):
+        self.section = section
+        self.recommandation = recommandation
+        self.comparatif = comparatif
+        self.score = score
+
+
+class CacheRendu:
+    """Memoisation LRU des rendus par ville, indexee par l'empreinte de la prevision."""
+
+    def __init__(self, max_entrees: int = 20000):
+        self.max_entrees = max_entrees
+        self._entrees = OrderedDict()
+        self.succes = 0
+        self.echecs = 0
+
+    def obtenir(self, cle: tuple) -> RenduVille | None:
+        rendu = self._entrees.get(cle)
+        if rendu is None:
+            self.echecs += 1
+            return None
+        self._entrees.move_to_end(cle)
+        self.succes += 1
+        return rendu
+
+    def ajouter(self, cle: tuple, rendu: RenduVille):
+        self._entrees[cle] = rendu
+        if len(self._entrees) > self.max_entrees:
+            self._entrees.popitem(last=False)
+
+
+# Villes rendues ensemble : assez pour que metriques_bulletin passe par
+# NumPy, assez peu pour que la memoire ne suive pas le nombre de villes
+PAQUET_RENDU = 64
+
+
+def rendre_villes(paquet: list[tuple[int, dict, Prevision]],
+                  cache: CacheRendu | None = None) -> list[RenduVille]:
+    """Rend un paquet de villes (rang, ville, prevision) en un seul passage.
+
+    Les metriques, les recommandations, les conseils par tranche horaire et
+    l'astronomie de toutes les villes a rendre sont calcules ensemble, chacun
+    en une evaluation (voir metriques_bulletin, recommandations,
+    conseils_tranches, calculer_astronomie). Avec `cache`, une ville dont les donnees n'ont
+    pas change reprend son rendu precedent.
+    """
+    if cache is None:
+        cles, rendus = None, [None] * len(paquet)
+    else:
+        cles = [(prev.empreinte(), prev.perimee, i, ville["nom"], ville["region"], ville["altitude_info"])
+                for i, ville, prev in paquet]
+        rendus = [cache.obtenir(cle) for cle in cles]
+    a_rendre = [k for k, rendu in enumerate(rendus) if rendu is None]
+    MESURES.compter("rendus_reutilises", len(paquet) - len(a_rendre))
+    if not a_rendre:
+        return rendus
+    with MESURES.etape("rendu", f"{len(a_rendre)} ville(s)"):
+        previsions = [paquet[k][2] for k in a_rendre]
+        calculer_astronomie(previsions)
+        lots = zip(metriques_bulletin(previsions), recommandations(previsions), conseils_tranches(previsions))
+        for k, (m, reco, conseils) in zip(a_rendre, lots):
+            i, ville, prev = paquet[k]
+            lines, resume = _section_ville(i, ville, prev, m, conseils)
+            rendus[k] = RenduVille(_texte(lines), _texte(_lignes_recommandation(ville, reco)),
+                                   _ligne_comparatif(resume) + "\n", resume["confort_score"])
+            if cache is not None:
+                cache.ajouter(cles[k], rendus[k])
+    return rendus
+
+
+def generer_bulletin(resultats: Iterable[tuple[dict, Prevision | VilleIndisponible | dict]],
+                     villes: list[dict] | None = None, maintenant: datetime | None = None,
+                     resumes: list | None = None, rendus: CacheRendu | None = None) -> Iterator[str]:
+    """Produit le bulletin section par section, au rythme de l'arrivee des villes.
+
+    Les villes sont rendues par paquets de PAQUET_RENDU au plus, des que le
+    paquet est complet (voir rendre_villes). Les recommandations et les
+    lignes du comparatif, qui viennent apres toutes les villes, sont mises de
+    cote dans des fichiers temporaires : la memoire ne croit pas avec le nombre
+    de villes (hormis les scores du classement).
+
+    `rendus` est a passer par les modes qui regenerent le bulletin en boucle
+    (voir demon) : les villes dont la prevision n'a pas change depuis le
+    bulletin precedent y reprennent leur rendu ; seuls l'en-tete, le
+    comparatif et le classement sont recalcules. Sans lui, rien n'est garde
+    d'une ville a l'autre. Une VilleIndisponible garde sa place (cadre et ligne du
+    comparatif) mais sort des recommandations et du classement.
+
+    `villes` (par defaut celles de `resultats` si c'est une liste) sert a
+    la ligne des villes de l'en-tete, ecrit avant de consommer le flux.
+    Si `resumes` est fourni, il recoit (ligne du comparatif, score ou None)
+    de chaque ville, de quoi refaire comparatif et classement ailleurs
+    (voir generer_reparti).
+    """
+    if villes is None and isinstance(resultats, list):
+        villes = [v for v, _ in resultats]
+    maintenant = maintenant or datetime.now()
+    yield _texte(_entete(maintenant, villes))
+
+    scores = []
+    with tempfile.SpooledTemporaryFile(1 << 18, "w+", encoding="utf-8") as recos, \
+            tempfile.SpooledTemporaryFile(1 << 18, "w+", encoding="utf-8") as tableau:
+
+        def vider(paquet: list) -> Iterator[str]:
+            # Les villes indisponibles gardent leur rang au milieu du paquet
+            rendus_paquet = iter(rendre_villes([e for e in paquet if not isinstance(e[2], VilleIndisponible)],
+                                               rendus))
+            for i, ville, data in paquet:
+                if isinstance(data, VilleIndisponible):
+                    yield _texte(_section_indisponible(i, ville, data.raison))
+                    ligne = f"    {ville['nom']:<12} {'--':>9}  {'--':>9}  {'--':<13} {'--':<11}\n"
+                    tableau.write(ligne)
+                    if resumes is not None:
+                        resumes.append((ligne, None))
+                    continue
+                rendu = next(rendus_paquet)
+                yield rendu.section
+                recos.write(rendu.recommandation)
+                tableau.write(rendu.comparatif)
+                scores.append((rendu.score, ville["nom"]))
+                if resumes is not None:
+                    resumes.append((rendu.comparatif, rendu.score))
+
+        paquet, a_rendre = [], 0
+        for i, (ville, data) in enumerate(resultats, 1):
+            if not isinstance(data, VilleIndisponible):
+                data = normaliser(data)
+                a_rendre += 1
+            paquet.append((i, ville, data))
+            if a_rendre >= PAQUET_RENDU:
+                yield from vider(paquet)
+                paquet, a_rendre = [], 0
+        yield from vider(paquet)
+
+        # ── Recommandations vestimentaires ──
+        yield _texte(_titre_section("  RECOMMANDATIONS VESTIMENTAIRES"))
+        yield from _relire(recos)
+
+        # ── Comparatif ──
+        yield _texte(_entete_comparatif())
+        yield from _relire(tableau)
+        yield "\n"
+
+    yield _texte(_classement_et_pied(scores, maintenant))
+
+
+def construire_bulletin(resultats: Iterable[tuple[dict, Prevision | dict]]) -> str:
+    return "".join(generer_bulletin(resultats))
+
+
+# ── Ecriture ──────────────────────────────────────────────────────────────────
+
+class ErreurMeteo(RuntimeError):
+    """Aucune ville n'a pu etre recuperee."""
+
+
+def _raison_echec(e: Exception) -> str:
+    reponse = getattr(e, "response", None)
+    if reponse is not None:
+        return f"source en erreur (HTTP {reponse.status_code})"
+    if isinstance(e, ErreurDisjoncteur):
+        return "source suspendue apres des echecs repetes"
+    if isinstance(e, HorsLigne):
+        return "absente du cache (mode hors ligne)"
+    return f"source injoignable ({type(e).__name__})"
+
+
+def villes_avec_repli(flux: Iterable[tuple[dict, object]], bilan: dict | None = None
+                      ) -> Iterator[tuple[dict, Prevision | VilleIndisponible]]:
+    """Normalise les resultats de fetch_villes sans s'arreter au premier echec.
+
+    Une ville en erreur reprend sa derniere reponse en cache, meme expiree
+    (Prevision.perimee renseigne), ou a defaut devient une VilleIndisponible.
+    Les compteurs fraiches / perimees / indisponibles sont tenus dans bilan.
+    """
+    if bilan is None:
+        bilan = {}
+    for cle in ("fraiches", "perimees", "indisponibles"):
+        bilan.setdefault(cle, 0)
+    for ville, data in flux:
+        if not isinstance(data, Exception):
+            bilan["fraiches"] += 1
+            yield ville, normaliser(data)
+            continue
+        ancien = CACHE.lire_perime(CacheDisque.cle(ville)) if CACHE else None
+        if ancien is None:
+            bilan["indisponibles"] += 1
+            yield ville, VilleIndisponible(_raison_echec(data))
+            continue
+        prev = Prevision(ancien[0])
+        prev.perimee = ancien[1]
+        bilan["perimees"] += 1
+        yield ville, prev
+
+
+# ── Alertes et changements ────────────────────────────────────────────────────
+
+# Hors de DOSSIER_CACHE : CacheDisque.evincer y supprime les .json les plus anciens
+FICHIER_INSTANTANES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "meteo_instantanes.json")
+FICHIER_ALERTES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "meteo_alertes.jsonl")
+
+# Meme format que REGLES_RECOMMANDATION, variables de conditions_recommandation
+# (jour courant). Une alerte par groupe : la premiere regle vraie.
+REGLES_ALERTE = [
+    [
+        ("rafales > 100", ["Rafales violentes : {rafales:.0f} km/h"]),
+        ("rafales > 80", ["Rafales fortes : {rafales:.0f} km/h"]),
+    ],
+    [
+        ("neige > 5", ["Neige abondante : {neige:.1f} cm"]),
+        ("neige > 0", ["Neige : {neige:.1f} cm"]),
+    ],
+    [
+        ("t_min < -10", ["Grand froid : minimum {t_min:.1f}°C"]),
+        ("t_min < 0", ["Gel : minimum {t_min:.1f}°C"]),
+    ],
+    [
+        ("pluie > 20", ["Fortes pluies : {pluie:.0f} mm"]),
+    ],
+]
+
+MOTEUR_ALERTE = MoteurRegles(REGLES_ALERTE)
+
+# Ecart a partir duquel un changement de prevision est signale : (libelle, seuil, unite)
+SEUILS_CHANGEMENT = {
+    "t_min": ("Min", 3.0, "°C"),
+    "t_max": ("Max", 3.0, "°C"),
+    "precip_prob": ("Pluie", 30.0, "%"),
+    "pluie": ("Cumul pluie", 5.0, " mm"),
+    "neige": ("Neige", 2.0, " cm"),
+    "rafales": ("Rafales", 20.0, " km/h"),
+}
+
+
+class Instantanes:
+    """Dernier etat connu de chaque ville : empreinte, jour et conditions du jour."""
+
+    def __init__(self, chemin: str = FICHIER_INSTANTANES):
+        self.chemin = chemin
+        self._etats = None
+        self._modifie = False
+
+    @staticmethod
+    def cle(ville: dict) -> str:
+        return f"{ville['nom']}|{ville['lat']:.4f},{ville['lon']:.4f}"
+
+    @property
+    def etats(self) -> dict:
+        if self._etats is None:
+            try:
+                with open(self.chemin, encoding="utf-8") as f:
+                    self._etats = json.load(f)
+            except (OSError, ValueError):
+                self._etats = {}
+        return self._etats
+
+    def remplacer(self, ville: dict, etat: dict):
+        cle = self.cle(ville)
+        if self.etats.get(cle) != etat:
+            self.etats[cle] = etat
+            self._modifie = True
+
+    def sauver(self):
+        if not self._modifie:
             return
+        with EcritureAtomique(self.chemin) as f:
+            json.dump(self.etats, f, ensure_ascii=False, separators=(",", ":"))
+        self._modifie = False
 
-    print("Generation du bulletin...")
-    bulletin = construire_bulletin(resultats)
 
-    with open(FICHIER_SORTIE, "w", encoding="utf-8") as f:
-        f.write(bulletin)
+INSTANTANES = Instantanes()
 
-    print(f"Bulletin sauvegarde dans : {FICHIER_SORTIE}")
+
+class SuiviChangements:
+    """Compare les previsions d'une execution aux instantanes precedents.
+
+    `flux` observe les villes au passage sans retenir leurs previsions :
+    seules l'empreinte et les conditions du jour sont gardees. `evaluer`
+    applique ensuite REGLES_ALERTE aux anciennes et aux nouvelles conditions
+    de toutes les villes (une passe vectorisee chacune au-dela d'une poignee
+    de villes) et produit les evenements : alerte nouvelle ou aggravee, alerte
+    attenuee (regle moins severe du meme groupe), alerte terminee,
+    changement notable (SEUILS_CHANGEMENT) d'une prevision modifiee.
+    Les villes en cache perime ou indisponibles ne sont pas comparees.
+    """
+
+    def __init__(self, instantanes: Instantanes):
+        self.instantanes = instantanes
+        self.villes = []
+        self.etats = []
+
+    def observer(self, ville: dict, data):
+        if isinstance(data, VilleIndisponible) or data.perimee is not None:
+            return
+        cols = conditions_recommandation([data])
+        self.villes.append(ville)
+        self.etats.append({
+            "empreinte": data.empreinte().hex(),
+            "jour": data.jour(0).time,
+            "valeurs": {v: cols[v][0] for v in MOTEUR_ALERTE.variables + list(SEUILS_CHANGEMENT)},
+        })
+
+    def flux(self, flux: Iterable[tuple[dict, object]]) -> Iterator[tuple[dict, object]]:
+        for ville, data in flux:
+            self.observer(ville, data)
+            yield ville, data
+
+    def _colonnes(self, etats: list[dict | None]) -> dict:
+        noms = MOTEUR_ALERTE.variables
+        cols = {v: [math.nan if e is None else e["valeurs"].get(v, math.nan) for e in etats] for v in noms}
+        np = _numpy() if len(etats) >= 16 else None
+        if np is not None:
+            cols = {v: np.array(c, dtype=float) for v, c in cols.items()}
+        return cols
+
+    def evaluer(self) -> list[dict]:
+        """Evenements de l'execution ; les instantanes sont mis a jour (a sauver)."""
+        n = len(self.etats)
+        anciens = []
+        for ville, etat in zip(self.villes, self.etats):
+            ancien = self.instantanes.etats.get(Instantanes.cle(ville))
+            # Un instantane d'un autre jour ne dit rien des conditions d'aujourd'hui
+            anciens.append(ancien if ancien is not None and ancien.get("jour") == etat["jour"] else None)
+        avant = [c.tolist() if hasattr(c, "tolist") else c for c in MOTEUR_ALERTE.classer(self._colonnes(anciens), n)]
+        apres = [c.tolist() if hasattr(c, "tolist") else c for c in MOTEUR_ALERTE.classer(self._colonnes(self.etats), n)]
+
+        evenements = []
+        for i, (ville, etat, ancien) in enumerate(zip(self.villes, self.etats, anciens)):
+            for g in range(len(MOTEUR_ALERTE.groupes)):
+                k_avant, k_apres = avant[g][i], apres[g][i]
+                # Dans un groupe, la premiere regle est la plus severe
+                if k_apres >= 0 and (k_avant < 0 or k_apres < k_avant):
+                    evenements.append({"ville": ville["nom"], "type": "alerte",
+                                       "texte": MOTEUR_ALERTE.texte(g, k_apres, etat["valeurs"])})
+                elif k_apres > k_avant >= 0:
+                    evenements.append({"ville": ville["nom"], "type": "attenuation",
+                                       "texte": MOTEUR_ALERTE.texte(g, k_apres, etat["valeurs"])})
+                elif k_avant >= 0 and k_apres < 0:
+                    evenements.append({"ville": ville["nom"], "type": "fin",
+                                       "texte": MOTEUR_ALERTE.texte(g, k_avant, ancien["valeurs"])})
+            if ancien is not None and ancien["empreinte"] != etat["empreinte"]:
+                ecarts = []
+                for v, (libelle, seuil, unite) in SEUILS_CHANGEMENT.items():
+                    a, b = ancien["valeurs"].get(v, math.nan), etat["valeurs"][v]
+                    if abs(b - a) >= seuil:
+                        ecarts.append(f"{libelle} {a:g} -> {b:g}{unite}")
+                if ecarts:
+                    evenements.append({"ville": ville["nom"], "type": "changement", "texte": ", ".join(ecarts)})
+            self.instantanes.remplacer(ville, etat)
+        return evenements
+
+
+def publier_evenements(evenements: list[dict], chemin: str = FICHIER_ALERTES) -> None:
+    """Ajoute les evenements au flux JSON Lines (une ligne par evenement, horodatee)."""
+    if not evenements:
+        return
+    horodatage = datetime.now().isoformat(timespec="seconds")
+    with open(chemin, "a", encoding="utf-8") as f:
+        for e in evenements:
+            f.write(json.dumps({"date": horodatage, **e}, ensure_ascii=False) + "\n")
+
+
+def _lignes_evenements(evenements: list[dict], maximum: int = 10) -> list[str]:
+    etiquettes = {"alerte": "ALERTE", "attenuation": "attenue", "fin": "fin", "changement": "change"}
+    lignes = [f"  [{etiquettes[e['type']]}] {e['ville']} : {e['texte']}" for e in evenements[:maximum]]
+    if len(evenements) > maximum:
+        lignes.append(f"  ... et {len(evenements) - maximum} autre(s) evenement(s)")
+    return lignes
+
+
+# ── Generation repartie ───────────────────────────────────────────────────────
+
+DOSSIER_BULLETINS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bulletins_meteo")
+
+# Villes par tache envoyee a un processus : de quoi amortir l'envoi des
+# previsions sans desequilibrer la charge entre processus
+VILLES_PAR_TACHE = 64
+
+
+def _nom_bulletin(cle: str) -> str:
+    """Fichier du bulletin d'une region ou d'une ville (homonymes regroupes)."""
+    slug = "-".join("".join(c if c.isalnum() else " " for c in _cle_texte(cle)).split())
+    return f"bulletin_{slug or 'sans-region'}.txt"
+
+
+def _rendre_groupes(groupes: list[tuple[str, list[tuple[int, dict, object]]]], dossier: str,
+                    maintenant: datetime) -> list[tuple[int, str, float | None]]:
+    """Tache d'un processus : ecrit le bulletin de chaque groupe de villes.
+
+    Renvoie un resume compact par ville : (rang dans le bulletin complet,
+    ligne du comparatif, score confort ou None si indisponible).
+    """
+    resumes = []
+    for fichier, membres in groupes:
+        resumes_groupe = []
+        # Pas de fsync par fichier : le bulletin fusionne, lui, est durable
+        with EcritureAtomique(os.path.join(dossier, fichier), durable=False) as f:
+            for morceau in generer_bulletin([(v, d) for _, v, d in membres],
+                                            maintenant=maintenant, resumes=resumes_groupe):
+                f.write(morceau)
+        resumes.extend((i, ligne, score) for (i, _, _), (ligne, score) in zip(membres, resumes_groupe))
+    return resumes
+
+
+def generer_reparti(resultats: Iterable[tuple[dict, Prevision | VilleIndisponible | dict]],
+                    processus: int | None = None, par: str = "region",
+                    dossier: str = DOSSIER_BULLETINS) -> Iterator[str]:
+    """Bulletin de grandes listes de villes, rendu sur plusieurs processus.
+
+    Les villes sont regroupees par region (ou une par fichier avec
+    par="ville") ; chaque groupe devient un bulletin complet dans `dossier`,
+    rendu par un pool de `processus` processus (os.cpu_count() par defaut).
+    Les processus ne renvoient que des resumes (ligne du comparatif, score) :
+    le bulletin produit ici ne contient que l'en-tete, le comparatif de
+    toutes les villes et le classement. Les bulletins d'une execution
+    precedente qui n'ont plus de villes sont supprimes.
+    """
+    resultats = list(resultats)
+    villes = [v for v, _ in resultats]
+    maintenant = datetime.now()
+    yield _texte(_entete(maintenant, villes))
+
+    groupes: dict[str, list] = {}
+    for i, (ville, data) in enumerate(resultats):
+        cle = (ville["region"] or "") if par == "region" else ville["nom"]
+        groupes.setdefault(_nom_bulletin(cle), []).append((i, ville, data))
+    # Taches d'au plus VILLES_PAR_TACHE villes (un groupe n'est jamais coupe),
+    # au moins une par processus tant qu'il y a des groupes
+    processus = processus or os.cpu_count() or 1
+    taille = max(1, min(VILLES_PAR_TACHE, -(-len(resultats) // processus)))
+    taches, tache, n = [], [], 0
+    for groupe in groupes.items():
+        tache.append(groupe)
+        n += len(groupe[1])
+        if n >= taille:
+            taches.append(tache)
+            tache, n = [], 0
+    if tache:
+        taches.append(tache)
+
+    os.makedirs(dossier, exist_ok=True)
+    with MESURES.etape("rendu_reparti", f"{len(groupes)} bulletin(s), {processus} processus"):
+        if processus == 1:
+            lots = [_rendre_groupes(t, dossier, maintenant) for t in taches]
+        else:
+            # Charge multiprocessing : seulement si le rendu est vraiment reparti
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(processus) as pool:
+                lots = list(pool.map(_rendre_groupes, taches, [dossier] * len(taches),
+                                     [maintenant] * len(taches)))
+    for nom in os.listdir(dossier):
+        if nom.startswith("bulletin_") and nom.endswith(".txt") and nom not in groupes:
+            with contextlib.suppress(OSError):
+                os.unlink(os.path.join(dossier, nom))
+
+    resumes = sorted(r for lot in lots for r in lot)
+    yield _texte(_titre_section("  BULLETINS DETAILLES") + [
+        f"    {len(groupes)} bulletin(s) par {par} dans {dossier}",
+        "",
+    ])
+    yield _texte(_entete_comparatif())
+    yield "".join(ligne for _, ligne, _ in resumes)
+    yield "\n"
+    scores = [(score, villes[i]["nom"]) for i, _, score in resumes if score is not None]
+    yield _texte(_classement_et_pied(scores, maintenant))
+
+
+# ── Archive des observations ──────────────────────────────────────────────────
+
+DOSSIER_ARCHIVE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive_meteo")
+
+# Champs journaliers archives, dans l'ordre des enregistrements
+CHAMPS_ARCHIVE = [
+    "temperature_2m_max", "temperature_2m_min",
+    "apparent_temperature_max", "apparent_temperature_min",
+    "precipitation_sum", "rain_sum", "snowfall_sum",
+    "wind_speed_10m_max", "wind_gusts_10m_max", "wind_direction_10m_dominant",
+]
+
+# Jour 0 de l'index : debut des reanalyses de l'API archive d'Open-Meteo
+JOUR0_ARCHIVE = date(1940, 1, 1)
+
+
+class ArchiveVille:
+    """Observations journalieres d'une ville, stockees en ajout seul.
+
+    `<cle>.dat` contient des enregistrements de taille fixe (jour int32 puis
+    un float32 par champ de CHAMPS_ARCHIVE, NaN si absent). `<cle>.idx` est
+    adresse directement par le numero du jour depuis JOUR0_ARCHIVE : un int32
+    par jour, rang de l'enregistrement + 1 (0 pour un jour absent). C'est un
+    fichier creux, seules les pages des periodes archivees occupent le disque.
+
+    Les lectures passent par mmap et ne touchent que les pages des jours
+    demandes. Reecrire un jour ajoute un enregistrement et l'index pointe
+    desormais sur celui-ci.
+    """
+
+    ENREGISTREMENT = struct.Struct("<i" + "f" * len(CHAMPS_ARCHIVE))
+    CASE = struct.Struct("<i")
+
+    def __init__(self, ville: dict, dossier: str = DOSSIER_ARCHIVE):
+        cle = hashlib.sha256(json.dumps([ville["lat"], ville["lon"]]).encode()).hexdigest()[:16]
+        self.dossier = dossier
+        self.donnees = os.path.join(dossier, cle + ".dat")
+        self.index = os.path.join(dossier, cle + ".idx")
+
+    @staticmethod
+    def numero(jour: date) -> int:
+        n = (jour - JOUR0_ARCHIVE).days
+        if n < 0:
+            raise ValueError(f"{jour} est anterieur a {JOUR0_ARCHIVE}")
+        return n
+
+    def ajouter(self, journees: Iterable[tuple[date, dict]]) -> int:
+        """Ajoute des journees {champ: valeur} ; renvoie le nombre d'enregistrements ecrits."""
+        taille = self.ENREGISTREMENT.size
+        paquet, numeros = bytearray(), []
+        for jour, valeurs in journees:
+            n = self.numero(jour)
+            paquet += self.ENREGISTREMENT.pack(n, *(
+                math.nan if valeurs.get(c) is None else valeurs[c] for c in CHAMPS_ARCHIVE))
+            numeros.append(n)
+        if not numeros:
+            return 0
+
+        os.makedirs(self.dossier, exist_ok=True)
+        # Verrou sur le .dat : d'autres processus (demon, backfill) ajoutent peut-etre en meme temps
+        with VerrouFichier(self.donnees):
+            # Donnees d'abord : un arret entre les deux laisse un enregistrement
+            # orphelin, jamais un index qui pointe dans le vide
+            with open(self.donnees, "ab") as dat:
+                premier = dat.tell() // taille
+                dat.write(paquet)
+            fd = os.open(self.index, os.O_RDWR | os.O_CREAT, 0o644)
+            with os.fdopen(fd, "r+b") as idx:
+                # Jours consecutifs ecrits d'un bloc
+                debut = 0
+                for k in range(1, len(numeros) + 1):
+                    if k < len(numeros) and numeros[k] == numeros[k - 1] + 1:
+                        continue
+                    rangs = array("i", range(premier + debut + 1, premier + k + 1))
+                    if sys.byteorder != "little":
+                        rangs.byteswap()
+                    idx.seek(numeros[debut] * self.CASE.size)
+                    idx.write(rangs.tobytes())
+                    debut = k
+        return len(numeros)
+
+    @contextlib.contextmanager
+    def _vues(self):
+        """Projections memoire (index, donnees) en lecture, None si l'archive est vide."""
+        with contextlib.ExitStack() as pile:
+            vues = []
+            for chemin in (self.index, self.donnees):
+                try:
+                    f = pile.enter_context(open(chemin, "rb"))
+                except FileNotFoundError:
+                    yield None, None
+                    return
+                if os.fstat(f.fileno()).st_size == 0:
+                    yield None, None
+                    return
+                vues.append(pile.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)))
+            yield tuple(vues)
+
+    def _rangs(self, idx, debut: int, nombre: int) -> tuple[int, ...]:
+        fin = min(debut + nombre, len(idx) // self.CASE.size)
+        if fin <= debut:
+            return (0,) * nombre
+        lus = struct.unpack_from(f"<{fin - debut}i", idx, debut * self.CASE.size)
+        return lus + (0,) * (nombre - len(lus))
+
+    def _enregistrement(self, dat, rang: int) -> dict | None:
+        taille = self.ENREGISTREMENT.size
+        if not rang or rang * taille > len(dat):
+            return None
+        _, *valeurs = self.ENREGISTREMENT.unpack_from(dat, (rang - 1) * taille)
+        return {c: _valeur_f32(v, c in VARIABLES_ENTIERES) for c, v in zip(CHAMPS_ARCHIVE, valeurs)}
+
+    def lire(self, jours: Iterable[date]) -> list[dict | None]:
+        """Journees archivees aux dates demandees (None si absentes)."""
+        jours = list(jours)
+        with self._vues() as (idx, dat):
+            if idx is None:
+                return [None] * len(jours)
+            return [self._enregistrement(dat, self._rangs(idx, self.numero(j), 1)[0]) for j in jours]
+
+    def periode(self, debut: date, fin: date) -> Iterator[tuple[date, dict]]:
+        """Journees archivees de debut a fin inclus, dans l'ordre."""
+        n0 = self.numero(debut)
+        with self._vues() as (idx, dat):
+            if idx is None:
+                return
+            for k, rang in enumerate(self._rangs(idx, n0, (fin - debut).days + 1)):
+                valeurs = self._enregistrement(dat, rang)
+                if valeurs is not None:
+                    yield debut + timedelta(days=k), valeurs
+
+    def meme_jour(self, jour: date, annees: int = 10) -> list[tuple[date, dict]]:
+        """Le meme jour de l'annee sur les `annees` annees precedentes (29/02 -> 28/02)."""
+        dates = []
+        for a in range(1, annees + 1):
+            try:
+                d = jour.replace(year=jour.year - a)
+            except ValueError:
+                d = jour.replace(year=jour.year - a, day=28)
+            if d >= JOUR0_ARCHIVE:
+                dates.append(d)
+        return [(d, v) for d, v in zip(dates, self.lire(dates)) if v is not None]
+
+    def extremes(self, fin: date, jours: int = 30) -> tuple[float, float] | None:
+        """Minimum des minimales et maximum des maximales sur les `jours` jours finissant a `fin`."""
+        t_min, t_max = [], []
+        for _, v in self.periode(fin - timedelta(days=jours - 1), fin):
+            if v["temperature_2m_min"] is not None:
+                t_min.append(v["temperature_2m_min"])
+            if v["temperature_2m_max"] is not None:
+                t_max.append(v["temperature_2m_max"])
+        if not t_min or not t_max:
+            return None
+        return min(t_min), max(t_max)
+
+
+def archiver(ville: dict, prev: Prevision, dossier: str | None = DOSSIER_ARCHIVE):
+    """Ajoute la journee du jour d'une prevision fraiche a l'archive de la ville."""
+    if dossier is None or prev.perimee is not None:
+        return
+    jour = prev.jour(0)
+    try:
+        with MESURES.etape("archive", ville["nom"]):
+            ArchiveVille(ville, dossier).ajouter(
+                [(date.fromisoformat(jour.time), {c: getattr(jour, c) for c in CHAMPS_ARCHIVE})])
+    except OSError as e:
+        _journal(f"{ville['nom']} : archive non mise a jour ({e})")
+
+
+def flux_archive(flux: Iterable[tuple[dict, object]]) -> Iterator[tuple[dict, object]]:
+    """Laisse passer le flux du bulletin en archivant chaque ville au passage."""
+    for ville, prev in flux:
+        if isinstance(prev, Prevision):
+            archiver(ville, prev, DOSSIER_ARCHIVE)
+        yield ville, prev
+
+
+# ── Backfill historique ───────────────────────────────────────────────────────
+
+API_ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+# Une requete par ville et par tranche de jours, quelques-unes en parallele,
+# sous un debit maximal (l'API gratuite limite le nombre d'appels par minute)
+TRANCHE_BACKFILL = 366
+CONCURRENCE_BACKFILL = 4
+DEBIT_BACKFILL = 5.0
+
+# Les reanalyses sont publiees avec quelques jours de retard
+RETARD_ARCHIVE = 6
+
+
+class Reprise:
+    """Tranches deja archivees d'une ville : un backfill interrompu repart de la."""
+
+    def __init__(self, chemin: str):
+        self.chemin = chemin
+        self._verrou = threading.Lock()
+        try:
+            with open(chemin, encoding="utf-8") as f:
+                self.faites = set(json.load(f))
+        except (OSError, ValueError):
+            self.faites = set()
+
+    @staticmethod
+    def cle(debut: date, fin: date) -> str:
+        return f"{debut.isoformat()}:{fin.isoformat()}"
+
+    def faite(self, debut: date, fin: date) -> bool:
+        return self.cle(debut, fin) in self.faites
+
+    def marquer(self, debut: date, fin: date):
+        with self._verrou:
+            self.faites.add(self.cle(debut, fin))
+            with EcritureAtomique(self.chemin) as f:
+                json.dump(sorted(self.faites), f)
+
+
+def tranches_dates(debut: date, fin: date, jours: int = TRANCHE_BACKFILL) -> Iterator[tuple[date, date]]:
+    """Decoupe [debut, fin] (inclus) en tranches d'au plus `jours` jours."""
+    while debut <= fin:
+        bout = min(fin, debut + timedelta(days=jours - 1))
+        yield debut, bout
+        debut = bout + timedelta(days=1)
+
+
+def _journees_archive(donnees: dict) -> Iterator[tuple[date, dict]]:
+    daily = donnees.get("daily", {})
+    for k, jour in enumerate(daily.get("time", [])):
+        yield date.fromisoformat(jour), {c: daily[c][k] for c in CHAMPS_ARCHIVE if c in daily}
+
+
+def _telecharger_tranche(url: str, ville: dict, debut: date, fin: date,
+                         limite: LimiteDebit, timeout: float) -> dict:
+    limite.attendre()
+    params = {
+        "latitude": ville["lat"],
+        "longitude": ville["lon"],
+        "start_date": debut.isoformat(),
+        "end_date": fin.isoformat(),
+        "daily": ",".join(CHAMPS_ARCHIVE),
+        "timezone": ville["timezone"],
+    }
+    return requete_robuste(url, params, timeout).json()
+
+
+def backfill(villes: list[dict], debut: date, fin: date | None = None, url: str = API_ARCHIVE_URL,
+             dossier: str = DOSSIER_ARCHIVE, tranche: int = TRANCHE_BACKFILL,
+             concurrence: int = CONCURRENCE_BACKFILL, debit: float = DEBIT_BACKFILL,
+             timeout: float = 60) -> dict:
+    """Remplit l'archive des villes avec l'historique de l'API archive.
+
+    La periode est decoupee en tranches telechargees en parallele sous un
+    debit maximal. Chaque tranche est ecrite dans l'archive des sa reception,
+    puis notee dans `<cle>.reprise` : relance apres interruption, le backfill
+    saute les tranches deja faites. Au plus `2 * concurrence` tranches sont en
+    vol, la memoire ne depend pas de la longueur de la periode.
+    """
+    if fin is None:
+        fin = date.today() - timedelta(days=RETARD_ARCHIVE)
+    # Debit commun aux backfills lances en parallele sur la meme archive
+    limite = LimiteDebit(debit, rafale=concurrence, chemin=os.path.join(dossier, ".debit"))
+    bilan = {"tranches": 0, "sautees": 0, "journees": 0, "echecs": 0}
+
+    def travaux():
+        for ville in villes:
+            archive = ArchiveVille(ville, dossier)
+            reprise = Reprise(os.path.splitext(archive.index)[0] + ".reprise")
+            for d0, d1 in tranches_dates(debut, fin, tranche):
+                if reprise.faite(d0, d1):
+                    bilan["sautees"] += 1
+                    continue
+                yield ville, archive, reprise, d0, d1
+
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    os.makedirs(dossier, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=concurrence) as pool:
+        en_vol = {}
+        a_faire = travaux()
+        while True:
+            for travail in a_faire:
+                ville, _, _, d0, d1 = travail
+                en_vol[pool.submit(_telecharger_tranche, url, ville, d0, d1, limite, timeout)] = travail
+                if len(en_vol) >= 2 * concurrence:
+                    break
+            if not en_vol:
+                break
+            termines, _ = wait(en_vol, return_when=FIRST_COMPLETED)
+            for fut in termines:
+                ville, archive, reprise, d0, d1 = en_vol.pop(fut)
+                try:
+                    bilan["journees"] += archive.ajouter(_journees_archive(fut.result()))
+                    reprise.marquer(d0, d1)
+                    bilan["tranches"] += 1
+                except Exception as e:
+                    bilan["echecs"] += 1
+                    _journal(f"{ville['nom']} {d0} -> {d1} : ERREUR {_raison_echec(e)}")
+    return bilan
+
+
+# ── Serveur d'agregation ──────────────────────────────────────────────────────
+
+API_QUALITE_AIR_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
+
+VARIABLES_QUALITE_AIR = [
+    "european_aqi", "pm10", "pm2_5", "nitrogen_dioxide", "ozone",
+    "carbon_monoxide", "sulphur_dioxide",
+]
+
+PORT_SERVEUR = 8765
+FICHIER_DASHBOARD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index.html")
+
+
+def fetch_qualite_air_lot(villes: list[dict], timeout: float = TIMEOUT_REQUETE,
+                          echeance: float | None = None) -> list[dict]:
+    """Qualite de l'air courante de plusieurs villes, en une requete (avec cache)."""
+    requete = ["air", VARIABLES_QUALITE_AIR]
+    cles = [CacheDisque.cle(v, requete) for v in villes]
+    resultats = [CACHE.lire(c) if CACHE else None for c in cles]
+    manquantes = [i for i, r in enumerate(resultats) if r is None]
+    if not manquantes:
+        return resultats
+
+    a_demander = [villes[i] for i in manquantes]
+    params = {
+        "latitude": ",".join(str(v["lat"]) for v in a_demander),
+        "longitude": ",".join(str(v["lon"]) for v in a_demander),
+        "current": ",".join(VARIABLES_QUALITE_AIR),
+        "timezone": ",".join(v["timezone"] for v in a_demander),
+    }
+    resp = requete_robuste(API_QUALITE_AIR_URL, params, timeout, echeance)
+    donnees = resp.json()
+    if isinstance(donnees, dict):
+        donnees = [donnees]
+    if len(donnees) != len(a_demander):
+        raise ValueError(f"{len(donnees)} resultats recus pour {len(a_demander)} villes")
+    for i, d in zip(manquantes, donnees):
+        resultats[i] = d
+        if CACHE:
+            CACHE.ecrire(cles[i], d)
+    return resultats
+
+
+def avec_soleil(reponses: list[dict]) -> list[dict]:
+    """Copies des reponses avec lever et coucher calcules dans "daily".
+
+    Le tableau de bord lit `daily.sunrise` et `daily.sunset` (heure locale ISO,
+    comme l'API) ; ils ne sont plus demandes a Open-Meteo. Toutes les villes
+    passent en un seul calcul vectorise si elles ont le meme nombre de jours.
+    """
+    jours = [[_iso_vers_ts(t, 0) for t in r["daily"]["time"]] for r in reponses]
+    np = _numpy() if len(reponses) >= 16 and len({len(j) for j in jours}) == 1 else None
+    if np is None:
+        astro = [ephemerides(r["latitude"], r["longitude"], j) for r, j in zip(reponses, jours)]
+        evenements = [(a["sunrise"], a["sunset"]) for a in astro]
+    else:
+        astro = ephemerides_v([[r["latitude"]] for r in reponses], [[r["longitude"]] for r in reponses], jours)
+        evenements = zip(astro["sunrise"].tolist(), astro["sunset"].tolist())
+    res = []
+    for r, (levers, couchers) in zip(reponses, evenements):
+        decalage = r.get("utc_offset_seconds", 0)
+        iso = [[None if ts != ts else _iso_local(int(ts), decalage) for ts in serie]
+               for serie in (levers, couchers)]
+        res.append({**r, "daily": {**r["daily"], "sunrise": iso[0], "sunset": iso[1]}})
+    return res
+
+
+class Agregat:
+    """Reponse agregee de toutes les villes, partagee par tous les visiteurs.
+
+    Le corps JSON, sa version gzip et son ETag sont calcules une fois par
+    mise a jour du modele ; un seul rafraichissement a lieu a la fois, quel
+    que soit le nombre de requetes simultanees.
+    """
+
+    def __init__(self, villes: list[dict]):
+        self.villes = villes
+        self._verrou = threading.Lock()
+        self.corps = b""
+        self.corps_gzip = b""
+        self.etag = ""
+        self.expire = 0.0
+
+    def _construire(self):
+        meteo = list(fetch_villes(self.villes))
+        valides = [i for i, (_, data) in enumerate(meteo) if not isinstance(data, Exception)]
+        for i, data in zip(valides, avec_soleil([meteo[i][1] for i in valides])):
+            meteo[i] = (meteo[i][0], data)
+        air = []
+        for lot in decouper_lots(self.villes):
+            # Un lot en echec ne prive pas les autres de leur qualite de l'air
+            try:
+                air.extend(fetch_qualite_air_lot(lot))
+            except Exception:
+                air.extend([None] * len(lot))
+        villes, erreurs = [], 0
+        for (ville, data), aq in zip(meteo, air):
+            entree = {k: ville[k] for k in ("nom", "region", "lat", "lon", "timezone")}
+            if isinstance(data, Exception):
+                entree["erreur"] = str(data)
+                erreurs += 1
+            else:
+                entree["weather"] = data
+            entree["airQuality"] = aq
+            villes.append(entree)
+        corps = json.dumps({"genere": int(time.time()), "villes": villes},
+                           separators=(",", ":"), default=_json_defaut).encode()
+        return corps, erreurs
+
+    def actualiser(self):
+        with self._verrou:
+            if time.time() < self.expire:
+                return
+            corps, erreurs = self._construire()
+            # Le champ "genere" change a chaque fois : l'ETag ne porte que sur les donnees
+            donnees = corps[corps.index(b',"villes"'):]
+            etag = '"' + hashlib.blake2b(donnees, digest_size=12).hexdigest() + '"'
+            if etag != self.etag:
+                self.corps, self.corps_gzip, self.etag = corps, gzip.compress(corps), etag
+            # Villes en echec : nouvel essai rapide plutot qu'a la prochaine mise a jour
+            self.expire = time.time() + DELAI_NOUVEL_ESSAI if erreurs else prochaine_maj()
+
+
+def _gestionnaire(agregat: Agregat):
+    from http.server import BaseHTTPRequestHandler
+
+    class Gestionnaire(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _envoyer(self, code: int, corps: bytes, type_contenu: str, entetes: dict | None = None):
+            self.send_response(code)
+            self.send_header("Content-Type", type_contenu)
+            self.send_header("Content-Length", str(len(corps)))
+            for k, v in (entetes or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(corps)
+
+        def do_GET(self):
+            chemin = self.path.split("?", 1)[0]
+            if chemin in ("/", "/index.html"):
+                try:
+                    with open(FICHIER_DASHBOARD, "rb") as f:
+                        page = f.read()
+                except OSError:
+                    self._envoyer(404, b"index.html introuvable", "text/plain; charset=utf-8")
+                    return
+                self._envoyer(200, page, "text/html; charset=utf-8")
+            elif chemin == "/api/meteo":
+                try:
+                    agregat.actualiser()
+                except Exception as e:
+                    if not agregat.corps:
+                        self._envoyer(502, str(e).encode(), "text/plain; charset=utf-8")
+                        return
+                entetes = {
+                    "ETag": agregat.etag,
+                    "Cache-Control": "no-cache",
+                    "Vary": "Accept-Encoding",
+                    "Access-Control-Allow-Origin": "*",
+                }
+                if agregat.etag in self.headers.get("If-None-Match", ""):
+                    self._envoyer(304, b"", "application/json", entetes)
+                elif "gzip" in self.headers.get("Accept-Encoding", ""):
+                    entetes["Content-Encoding"] = "gzip"
+                    self._envoyer(200, agregat.corps_gzip, "application/json", entetes)
+                else:
+                    self._envoyer(200, agregat.corps, "application/json", entetes)
+            else:
+                self._envoyer(404, b"introuvable", "text/plain; charset=utf-8")
+
+        do_HEAD = do_GET
+
+    return Gestionnaire
+
+
+def serveur(villes: list[dict], hote: str = "127.0.0.1", port: int = PORT_SERVEUR):
+    """Sert index.html et /api/meteo (toutes les villes en une reponse)."""
+    from http.server import ThreadingHTTPServer
+    httpd = ThreadingHTTPServer((hote, port), _gestionnaire(Agregat(villes)))
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=httpd.shutdown).start())
+    _journal(f"Serveur sur http://{hote}:{httpd.server_address[1]}/ ({len(villes)} villes)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+    _journal("Arret du serveur")
+
+
+# ── Mode demon ────────────────────────────────────────────────────────────────
+
+INTERVALLE_RAFRAICHISSEMENT = 900
+GIGUE_RAFRAICHISSEMENT = 60
+DELAI_NOUVEL_ESSAI = 60
+
+
+def _journal(message: str):
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {message}", flush=True)
+
+
+def _journal_echecs(flux: Iterable[tuple[dict, object]]) -> Iterator[tuple[dict, object]]:
+    for ville, data in flux:
+        if isinstance(data, Exception):
+            _journal(f"{ville['nom']} : ERREUR {data}")
+        yield ville, data
+
+
+def demon(villes: list[dict], intervalle: float = INTERVALLE_RAFRAICHISSEMENT,
+          gigue: float = GIGUE_RAFRAICHISSEMENT, arret: threading.Event | None = None):
+    """Rafraichit les villes en continu et regenere le bulletin quand elles changent.
+
+    Chaque ville a sa propre echeance (intervalle +/- gigue, pour etaler les
+    requetes) ; les villes arrivees a echeance en meme temps partent dans un
+    seul appel a fetch_villes. La session HTTP, le cache de rendu et les
+    previsions restent en memoire d'un cycle a l'autre. Une ville en echec
+    garde sa derniere prevision, ou passe par le repli de villes_avec_repli
+    (cache perime, sinon indisponible) : le bulletin reste regenere. Les villes modifiees
+    sont comparees a leur instantane (alertes et changements, voir
+    SuiviChangements). S'arrete proprement quand `arret` est positionne
+    (SIGTERM / SIGINT).
+    """
+    arret = arret or threading.Event()
+    echeances = [(0.0, k) for k in range(len(villes))]
+    heapq.heapify(echeances)
+    previsions: dict[int, Prevision | VilleIndisponible] = {}
+    rendus = CacheRendu()
+
+    while not arret.is_set():
+        maintenant = time.monotonic()
+        dues = []
+        while echeances and echeances[0][0] <= maintenant:
+            dues.append(heapq.heappop(echeances)[1])
+        change = False
+        suivi = SuiviChangements(INSTANTANES)
+        if dues:
+            flux = fetch_villes([villes[k] for k in dues])
+            for k, (ville, data) in zip(dues, villes_avec_repli(_journal_echecs(flux))):
+                ancienne = previsions.get(k)
+                if isinstance(data, VilleIndisponible) or data.perimee is not None:
+                    # Une prevision deja en memoire vaut mieux que le repli
+                    if ancienne is None or (isinstance(ancienne, VilleIndisponible)
+                                            and isinstance(data, Prevision)):
+                        previsions[k] = data
+                        change = True
+                    prochaine = DELAI_NOUVEL_ESSAI
+                else:
+                    if not isinstance(ancienne, Prevision) or ancienne.empreinte() != data.empreinte():
+                        previsions[k] = data
+                        archiver(ville, data, DOSSIER_ARCHIVE)
+                        suivi.observer(ville, data)
+                        change = True
+                    prochaine = intervalle + random.uniform(-gigue, gigue)
+                heapq.heappush(echeances, (time.monotonic() + max(1.0, prochaine), k))
+
+        if change:
+            evenements = suivi.evaluer()
+            publier_evenements(evenements, FICHIER_ALERTES)
+            INSTANTANES.sauver()
+            for ligne in _lignes_evenements(evenements):
+                _journal(ligne.strip())
+
+        # Bulletin partiel comme executer() : villes en cache perime ou
+        # indisponibles a leur place, tant qu'au moins une a des donnees
+        if change and len(previsions) == len(villes):
+            manquantes = sum(isinstance(p, VilleIndisponible) for p in previsions.values())
+            perimees = sum(isinstance(p, Prevision) and p.perimee is not None for p in previsions.values())
+            if manquantes < len(villes):
+                with EcritureAtomique(FICHIER_SORTIE) as f:
+                    for morceau in generer_bulletin(((villes[k], previsions[k]) for k in range(len(villes))),
+                                                    villes, rendus=rendus):
+                        f.write(morceau)
+                partiel = (f", partiel : {perimees} en cache perime, {manquantes} indisponible(s)"
+                           if perimees or manquantes else "")
+                _journal(f"Bulletin regenere ({len(dues)} ville(s) rafraichie(s){partiel})")
+                MESURES.exporter()
+
+        arret.wait(max(0.0, echeances[0][0] - time.monotonic()) if echeances else None)
+    _journal("Arret du demon")
+
+
+# ── Main ──────────────────────────────────────────────────────────────────────
+
+def sans_affichage() -> bool:
+    """Vrai hors session graphique (cron, SSH, conteneur) : rien a ouvrir."""
+    if sys.platform in ("win32", "darwin"):
+        return False
+    return not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def ouvrir_fichier(chemin: str) -> bool:
+    """Ouvre le fichier avec l'application par defaut du systeme.
+
+    Renvoie False si aucune n'a pu l'ouvrir ; le bulletin est deja ecrit,
+    l'echec reste donc silencieux.
+    """
+    if sys.platform == "win32":
+        try:
+            os.startfile(chemin)
+        except OSError:
+            return False
+        return True
+    import subprocess
+    commande = ["open" if sys.platform == "darwin" else "xdg-open", chemin]
+    try:
+        return subprocess.run(commande, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+    except OSError:
+        return False
+
+
+def executer(villes: list[dict] | None = None, ouvrir: bool = True, profil: int = 0,
+             processus: int = 0, par: str = "region", si_changement: bool = False):
+    """Genere un bulletin unique en l'affichant au fil de l'eau.
+
+    `villes` vaut par defaut tout le registre ; `profil` > 0 affiche ensuite les etapes les plus lentes (MESURES doit
+    etre actif). Avec `processus`, le rendu est reparti en bulletins par
+    region (ou par ville) et le bulletin principal n'en garde que le
+    comparatif et le classement (voir generer_reparti).
+
+    Chaque execution compare les villes a leur instantane precedent et ajoute
+    alertes et changements notables a FICHIER_ALERTES. Avec `si_changement`,
+    le bulletin n'est regenere (ni ouvert) que s'il y en a.
+
+    Renvoie False si aucune ville n'a pu etre recuperee (bulletin conserve).
+    """
+    print("Recuperation des donnees meteo...")
     print()
-    print(bulletin)
+    if villes is None:
+        villes = list(REGISTRE)
+    bilan = {}
+    suivi = SuiviChangements(INSTANTANES)
+    flux = suivi.flux(flux_archive(villes_avec_repli(fetch_villes(villes), bilan)))
+    evenements = None
+    if si_changement:
+        # Tout est recupere avant de decider s'il faut regenerer le bulletin
+        flux = list(flux)
+        with MESURES.etape("alertes"):
+            evenements = suivi.evaluer()
+        if not evenements and (bilan["fraiches"] or bilan["perimees"]):
+            INSTANTANES.sauver()
+            print("Aucune alerte ni changement notable : bulletin conserve.")
+            MESURES.exporter()
+            return True
+    try:
+        with MESURES.etape("bulletin"), EcritureAtomique(FICHIER_SORTIE) as f:
+            morceaux = (generer_reparti(flux, processus, par, DOSSIER_BULLETINS) if processus
+                        else generer_bulletin(flux, villes))
+            for morceau in morceaux:
+                with MESURES.etape("ecriture"):
+                    f.write(morceau)
+                    print(morceau, end="", flush=True)
+            if not bilan["fraiches"] and not bilan["perimees"]:
+                # Bulletin vide de donnees : l'ancien fichier est conserve
+                raise ErreurMeteo("aucune ville n'a pu etre recuperee")
+    except ErreurMeteo as e:
+        print(f"ERREUR : {e}")
+        return False
+
+    if evenements is None:
+        with MESURES.etape("alertes"):
+            evenements = suivi.evaluer()
+    publier_evenements(evenements, FICHIER_ALERTES)
+    INSTANTANES.sauver()
+    if evenements:
+        print(f"  {len(evenements)} alerte(s) / changement(s), ajoute(s) a {FICHIER_ALERTES} :")
+        print("\n".join(_lignes_evenements(evenements)))
+
+    if bilan["perimees"] or bilan["indisponibles"]:
+        print(f"  Bulletin partiel : {bilan['perimees']} ville(s) en cache perime, "
+              f"{bilan['indisponibles']} indisponible(s)")
+
+    economie = STATS_GRILLE["villes"] - STATS_GRILLE["points"]
+    print(f"  {STATS_GRILLE['villes']} villes, {STATS_GRILLE['points']} point(s) de grille "
+          f"({economie} requete(s) economisee(s))")
+    print(f"Bulletin sauvegarde dans : {FICHIER_SORTIE}")
+
+    MESURES.exporter()
+    if profil:
+        print()
+        print("\n".join(MESURES.resume(profil)))
 
     # Ouvre le fichier txt automatiquement
-    if sys.platform == "win32":
-        os.startfile(FICHIER_SORTIE)
-    elif sys.platform == "darwin":
-        subprocess.run(["open", FICHIER_SORTIE])
-    else:
-        subprocess.run(["xdg-open", FICHIER_SORTIE])
+    if ouvrir:
+        ouvrir_fichier(FICHIER_SORTIE)
+    return True
+
+
+def _jours(valeur: str) -> int:
+    jours = int(valeur)
+    if not 1 <= jours <= JOURS_PREVISION_MAX:
+        raise argparse.ArgumentTypeError(f"entre 1 et {JOURS_PREVISION_MAX} jours")
+    return jours
+
+
+def _autour(valeur: str) -> tuple[float, float, int]:
+    morceaux = valeur.split(",")
+    try:
+        if len(morceaux) not in (2, 3):
+            raise ValueError
+        return float(morceaux[0]), float(morceaux[1]), int(morceaux[2]) if len(morceaux) == 3 else 1
+    except ValueError:
+        raise argparse.ArgumentTypeError("attendu LAT,LON ou LAT,LON,N") from None
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Point d'entree en ligne de commande ; renvoie le code de sortie."""
+    global JOURS_PREVISION, API_URL, API_QUALITE_AIR_URL, ENREGISTREUR, CACHE, HORS_LIGNE
+    parser = argparse.ArgumentParser(description="Bulletin meteo Open-Meteo.")
+    parser.add_argument("--no-open", "--headless", dest="no_open", action="store_true",
+                        help="ne pas ouvrir le bulletin a la fin (implicite sans session graphique)")
+    parser.add_argument("--hors-ligne", action="store_true",
+                        help="servir le bulletin depuis le cache, meme perime, sans aucune requete")
+    parser.add_argument("--profile", nargs="?", type=int, const=10, default=0, metavar="N",
+                        help="afficher les N etapes les plus lentes apres le bulletin (10 par defaut)")
+    parser.add_argument("--trace", metavar="FICHIER.json",
+                        help="ecrire la trace des etapes (format Trace Event, chrome://tracing)")
+    parser.add_argument("--metriques", metavar="FICHIER.prom",
+                        help="ecrire les compteurs au format texte Prometheus")
+    parser.add_argument("--registre", default=FICHIER_VILLES, metavar="FICHIER",
+                        help="liste des villes, JSON ou CSV (villes.json par defaut)")
+    parser.add_argument("--ville", action="append", default=[], metavar="NOM",
+                        help="ville du registre a inclure (repetable)")
+    parser.add_argument("--region", action="append", default=[],
+                        help="inclure les villes de cette region (repetable)")
+    parser.add_argument("--autour", type=_autour, metavar="LAT,LON[,N]",
+                        help="inclure les N villes les plus proches de ce point (1 par defaut)")
+    parser.add_argument("--processus", nargs="?", type=int, const=os.cpu_count() or 1, default=0,
+                        metavar="N", help="rendre un bulletin par region sur N processus (tous les coeurs "
+                                          "par defaut) ; le bulletin principal garde comparatif et classement")
+    parser.add_argument("--par", choices=("region", "ville"), default="region",
+                        help="decoupage des bulletins avec --processus")
+    parser.add_argument("--si-changement", action="store_true",
+                        help="ne regenerer le bulletin qu'en cas d'alerte ou de changement notable")
+    parser.add_argument("--jours", type=_jours, default=JOURS_PREVISION,
+                        help=f"jours de prevision (1 a {JOURS_PREVISION_MAX}), tendance si > 1")
+    parser.add_argument("--daemon", action="store_true",
+                        help="rester actif et regenerer le bulletin quand les donnees changent")
+    parser.add_argument("--intervalle", type=float, default=INTERVALLE_RAFRAICHISSEMENT,
+                        help="secondes entre deux rafraichissements d'une ville (mode demon)")
+    parser.add_argument("--gigue", type=float, default=GIGUE_RAFRAICHISSEMENT,
+                        help="variation aleatoire de l'intervalle, en secondes (mode demon)")
+    parser.add_argument("--serveur", nargs="?", type=int, const=PORT_SERVEUR, metavar="PORT",
+                        help=f"servir le dashboard et /api/meteo (port {PORT_SERVEUR} par defaut)")
+    parser.add_argument("--hote", default="127.0.0.1", help="adresse d'ecoute du serveur")
+    parser.add_argument("--backfill", type=date.fromisoformat, metavar="AAAA-MM-JJ",
+                        help="remplir l'archive depuis cette date (API archive), puis quitter")
+    parser.add_argument("--fin", type=date.fromisoformat, metavar="AAAA-MM-JJ",
+                        help=f"derniere date du backfill (par defaut il y a {RETARD_ARCHIVE} jours)")
+    parser.add_argument("--archive-url", default=API_ARCHIVE_URL,
+                        help="URL de l'API archive (serveur local de test, miroir...)")
+    parser.add_argument("--api-url", default=API_URL,
+                        help="URL de l'API de prevision (serveur de rejeu de bench_meteo.py...)")
+    parser.add_argument("--api-qualite-air-url", default=API_QUALITE_AIR_URL,
+                        help="URL de l'API de qualite de l'air (mode serveur, meme usage que --api-url)")
+    parser.add_argument("--enregistrer", metavar="DOSSIER",
+                        help="enregistrer les reponses HTTP comme fixtures (sans relire le cache)")
+    args = parser.parse_args(argv)
+    JOURS_PREVISION = args.jours
+    API_URL = args.api_url
+    API_QUALITE_AIR_URL = args.api_qualite_air_url
+    HORS_LIGNE = args.hors_ligne
+    if args.enregistrer:
+        ENREGISTREUR = Enregistreur(args.enregistrer)
+        CACHE = None
+    if args.profile or args.trace or args.metriques:
+        MESURES.activer(trace=args.trace, prometheus=args.metriques)
+    registre = REGISTRE if args.registre == FICHIER_VILLES else RegistreVilles(args.registre)
+    try:
+        villes = registre.selectionner(args.ville, args.region, args.autour)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    if args.backfill is not None:
+        bilan = backfill(villes, args.backfill, args.fin, url=args.archive_url,
+                         dossier=DOSSIER_ARCHIVE)
+        _journal(f"Backfill termine : {bilan['journees']} journees en {bilan['tranches']} tranche(s), "
+                 f"{bilan['sautees']} deja faite(s), {bilan['echecs']} echec(s)")
+        return 1 if bilan["echecs"] else 0
+    if args.serveur is not None:
+        serveur(villes, args.hote, args.serveur)
+        return 0
+    if not args.daemon:
+        ok = executer(villes, ouvrir=not (args.no_open or sans_affichage()), profil=args.profile,
+                      processus=args.processus, par=args.par, si_changement=args.si_changement)
+        return 0 if ok else 1
+
+    arret = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: arret.set())
+    _journal(f"Demon demarre : {len(villes)} villes, toutes les {args.intervalle:.0f} s")
+    demon(villes, args.intervalle, args.gigue, arret)
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())